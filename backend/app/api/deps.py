@@ -1,29 +1,53 @@
 from fastapi import Depends, Request, HTTPException
-from app.utils.auth import has_correct_hash, parse_telegram_init_data
+from app.core.config import settings
+from app.utils.auth import verify_init_data
+import hmac
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def verify_authorization(request: Request):
-    if request.method == "OPTIONS":
-        logger.info("Skipping authorization for OPTIONS request")
-        return {}
-    auth_header = request.headers.get("Authorization")
-    logger.info(f"Received Authorization header: {auth_header}")
+def authenticate(auth_header: str) -> dict:
+    """Checks a 'tma <initData>' credential and returns the user data; raises HTTPException otherwise."""
     if not auth_header or not auth_header.startswith("tma "):
         logger.error("Invalid Authorization header")
         raise HTTPException(status_code=400, detail="Invalid Authorization header. Use 'tma <initData>'")
     init_data = auth_header.split(" ")[1]
-    logger.info(f"Extracted init_data: {init_data[:50]}...")
     if not init_data:
         logger.error("Missing initData")
         raise HTTPException(status_code=400, detail="initData is required")
-    if not has_correct_hash(init_data=init_data):
+    identity = verify_init_data(init_data=init_data)
+    if identity is None:
         logger.error("Authentication failed due to incorrect hash")
         raise HTTPException(status_code=400, detail="Authentication failed")
-    user_data = parse_telegram_init_data(init_data=init_data)
-    logger.info(f"Parsed user_data: {user_data}")
-    if not user_data or not user_data.get("user_id"):
-        logger.error(f"Invalid or missing Telegram data: {user_data}")
+    user_data = identity.as_dict()
+    if not user_data.get("user_id"):
+        # initData в лог не пишем — он действует как токен доступа
+        logger.error("Invalid or missing Telegram data")
         raise HTTPException(status_code=400, detail="Invalid Telegram data")
-    return user_data
\ No newline at end of file
+    return user_data
+
+async def verify_authorization(request: Request):
+    if request.method == "OPTIONS":
+        logger.debug("Skipping authorization for OPTIONS request")
+        return {}
+    return authenticate(request.headers.get("Authorization"))
+
+async def verify_admin(request: Request):
+    token = request.headers.get("X-Admin-Token")
+    if not settings.ADMIN_TOKEN or not token or not hmac.compare_digest(token, settings.ADMIN_TOKEN):
+        logger.warning("Rejected admin request")
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+async def verify_metrics(request: Request):
+    # Нужен заголовок Authorization: Bearer <METRICS_TOKEN>; без METRICS_TOKEN /metrics закрыт
+    auth_header = request.headers.get("Authorization", "")
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(auth_header, f"Bearer {settings.METRICS_TOKEN}"):
+        logger.warning("Rejected metrics request")
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+async def verify_telegram_secret(request: Request):
+    # Telegram присылает секрет, заданный в setWebhook; без BOT_WEBHOOK_SECRET вебхук отключён
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+    if not settings.BOT_WEBHOOK_SECRET or not token or not hmac.compare_digest(token, settings.BOT_WEBHOOK_SECRET):
+        logger.warning("Rejected Telegram webhook request")
+        raise HTTPException(status_code=403, detail="Forbidden")
\ No newline at end of file
@@ -0,0 +1,19 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by pydantic-core's serializer instead of json.dumps.
+
+    Same compact UTF-8 output as Starlette's JSONResponse; it also accepts
+    datetimes and other values pydantic knows how to dump.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def dumps(content: Any) -> str:
+    """Compact JSON text for WebSocket frames, via the same serializer."""
+    return to_json(content).decode()
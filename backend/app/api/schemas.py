@@ -0,0 +1,197 @@
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel
+
+
+# Тела запросов
+
+class WalletConnectRequest(BaseModel):
+    wallet: str = "mock_wallet"
+
+
+class RegisterReferralRequest(BaseModel):
+    referrer_id: Union[int, str, None] = None
+
+
+class AddPointsRequest(BaseModel):
+    """Body of /api/v1/add; the frontend sends one, but the amount is fixed on the server."""
+
+
+# Ответы
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+class LoginUser(BaseModel):
+    user_id: int
+    username: str
+    first_name: str
+    photo_url: str
+    start_param: str
+
+
+class LoginPoints(BaseModel):
+    points: int
+    tickets: int
+    hearts: int
+    energy: int
+
+
+class LoginResponse(BaseModel):
+    user: LoginUser
+    points: LoginPoints
+
+
+class WebhookResult(BaseModel):
+    status: str
+    points: Optional[int] = None
+    tickets: Optional[int] = None
+    message: Optional[str] = None
+    event_id: Optional[str] = None
+
+
+class WebhookBatchResponse(BaseModel):
+    results: List[WebhookResult]
+
+
+class TelegramWebhookResponse(BaseModel):
+    ok: bool
+
+
+class ClaimResponse(BaseModel):
+    message: str
+    tickets: int
+    streak: int
+
+
+class ClaimStatusResponse(BaseModel):
+    streak: int
+    nextClaimTimestamp: Optional[str]
+
+
+class WalletConnectResponse(BaseModel):
+    wallet_address: str
+    ton_balance: int
+    spermbank_balance: int
+
+
+class InviteLinkResponse(BaseModel):
+    url: str
+
+
+class Referral(BaseModel):
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    photo_url: Optional[str]
+
+
+class ReferralsResponse(BaseModel):
+    referrals: List[Referral]
+    next_cursor: Optional[int]
+
+
+class DeadLetter(BaseModel):
+    referrer_user_id: int
+    referral_id: int
+    user_id: int
+    attempts: int
+    error: Optional[str]
+
+
+class ReferralQueueStats(BaseModel):
+    depth: int
+    retrying: int
+    lag_seconds: float
+    last_lag_seconds: float
+    processed: int
+    retries: int
+    statuses: Dict[str, int]
+    dead_letter: int
+    dead_letters: List[DeadLetter]
+
+
+class Balance(BaseModel):
+    points: int
+    tickets: int
+
+
+class AddPointsResponse(BaseModel):
+    points: Balance
+
+
+class MiniTapResponse(BaseModel):
+    message: str
+    hearts: int
+    energy: int
+
+
+class LootboxReward(BaseModel):
+    id: str
+    rarity: str
+    points: int
+    tickets: int
+
+
+class LootboxOdds(LootboxReward):
+    chance: float
+
+
+class Lootbox(BaseModel):
+    id: str
+    title: str
+    price: int
+    rewards: List[LootboxOdds]
+
+
+class LootboxCatalogResponse(BaseModel):
+    lootboxes: List[Lootbox]
+
+
+class LootboxOpenResponse(BaseModel):
+    lootbox_id: str
+    rewards: List[LootboxReward]
+    points: int
+    tickets: int
+
+
+class RankEntry(BaseModel):
+    rank: int
+    user_id: int
+    score: int
+
+
+class LeaderboardResponse(BaseModel):
+    board: str
+    total: int
+    entries: List[RankEntry]
+
+
+class LeaderboardRankResponse(BaseModel):
+    board: str
+    total: int
+    rank: int
+    score: int
+    neighbours: List[RankEntry]
+
+
+class EnergyResponse(BaseModel):
+    energy: int
+
+
+class AdminEnergyResponse(BaseModel):
+    energy: Dict[int, int]
+
+
+class TaskStatus(BaseModel):
+    completed: bool
+    completed_at: Optional[str] = None
+
+
+class TasksStatusResponse(BaseModel):
+    tasks: Dict[str, TaskStatus]
+
+
+class CompleteTaskResponse(BaseModel):
+    message: str
+    points: int
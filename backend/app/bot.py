@@ -1,19 +1,188 @@
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.utils.cache import TTLCache
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    args = context.args
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class BotApiError(Exception):
+    pass
+
+
+class BotApi:
+    """Minimal async client for the Telegram Bot API."""
+
+    def __init__(self, base_url: str, token: str, *, timeout: float,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.base_url = base_url
+        self.token = token
+        self.timeout = timeout
+        self._transport = transport
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            # httpx загружается при первом обращении к Bot API, а не при старте приложения
+            import httpx
+            from app.core.http import InstrumentedTransport
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/bot{self.token}",
+                timeout=self.timeout,
+                transport=InstrumentedTransport(self._transport or httpx.AsyncHTTPTransport(), "telegram"),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def call(self, method: str, **params: Any) -> Any:
+        for attempt in range(2):
+            response = await self.client.post(f"/{method}", json=params)
+            data = response.json()
+            if data.get("ok"):
+                return data["result"]
+            # При 429 Telegram сообщает, через сколько секунд можно повторить
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if response.status_code == 429 and retry_after and attempt == 0:
+                await asyncio.sleep(retry_after)
+                continue
+            raise BotApiError(f"{method}: {response.status_code} - {data.get('description')}")
+
+    async def send_message(self, chat_id: int, text: str, reply_markup: Optional[dict] = None) -> dict:
+        params = {"chat_id": chat_id, "text": text}
+        if reply_markup:
+            params["reply_markup"] = reply_markup
+        return await self.call("sendMessage", **params)
+
+    async def set_webhook(self, url: str, secret_token: str, max_connections: int) -> bool:
+        return await self.call("setWebhook", url=url, secret_token=secret_token, max_connections=max_connections,
+                               allowed_updates=["message"])
+
+
+async def start(api: BotApi, message: dict, args: List[str]) -> None:
     referrer_id = None
     if args and args[0].startswith("ref_"):
         referrer_id = args[0].replace("ref_", "")
-    user_id = update.message.from_user.id
-    web_app_url = f"https://laboratory-front.vercel.app"  # Базовый URL Mini App
-    await update.message.reply_text(
+    await api.send_message(
+        message["chat"]["id"],
         "Welcome! Click below to join:",
-        reply_markup={"inline_keyboard": [[{"text": "Open App", "web_app": {"url": web_app_url}}]]}
+        reply_markup={"inline_keyboard": [[{"text": "Open App", "web_app": {"url": settings.MINI_APP_URL}}]]}
     )
     # Если есть referrer_id, он уже передан через startapp, так что бот просто открывает Mini App
 
-application = Application.builder().token("YOUR_BOT_TOKEN").build()
-application.add_handler(CommandHandler("start", start))
-application.run_polling()
\ No newline at end of file
+
+CommandHandler = Callable[[BotApi, dict, List[str]], Awaitable[None]]
+
+
+class BotDispatcher:
+    """Handles webhook updates on a bounded pool of workers.
+
+    The webhook route only enqueues an update and answers Telegram right
+    away; ``workers`` tasks run the command handlers concurrently. When the
+    queue is full, ``submit`` returns False so the route can answer with an
+    error and Telegram redelivers the update later. Redeliveries of an
+    update that was already accepted are dropped by update_id.
+    """
+
+    def __init__(self, api: BotApi, workers: int, queue_size: int):
+        self.api = api
+        self.workers = workers
+        self.commands: Dict[str, CommandHandler] = {"start": start}
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._seen: TTLCache[bool] = TTLCache(queue_size * 10, 3600.0)
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # Дожидаемся уже принятых обновлений, затем останавливаем воркеры
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), settings.BOT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Bot stopped with {self._queue.qsize()} updates unprocessed")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.api.aclose()
+
+    async def submit(self, update: dict) -> bool:
+        update_id = update.get("update_id")
+        if update_id is not None and self._seen.peek(update_id):
+            return True
+        if not self._tasks:
+            # Без запущенных воркеров (lifespan не выполнялся) обрабатываем в запросе
+            await self.handle(update)
+        else:
+            try:
+                self._queue.put_nowait(update)
+            except asyncio.QueueFull:
+                self.rejected += 1
+                return False
+        if update_id is not None:
+            self._seen.set(update_id, True)
+        return True
+
+    async def handle(self, update: dict) -> None:
+        message = update.get("message") or {}
+        text = message.get("text") or ""
+        if not text.startswith("/"):
+            return
+        command, *args = text.split()
+        handler = self.commands.get(command[1:].split("@", 1)[0])
+        if handler is None:
+            return
+        try:
+            await handler(self.api, message, args)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error in bot command {command}: {str(e)}")
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.handle(update)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+bot_api = BotApi(settings.TELEGRAM_API_URL, settings.BOT_TOKEN, timeout=settings.BOT_TIMEOUT)
+bot_dispatcher = BotDispatcher(bot_api, workers=settings.BOT_WORKERS, queue_size=settings.BOT_QUEUE_SIZE)
+
+
+async def set_webhook() -> None:
+    """Points the bot at BOT_WEBHOOK_URL; run once per deployment: python -m app.bot"""
+    if not settings.BOT_WEBHOOK_URL or not settings.BOT_WEBHOOK_SECRET:
+        raise SystemExit("BOT_WEBHOOK_URL and BOT_WEBHOOK_SECRET must be set")
+    await bot_api.set_webhook(settings.BOT_WEBHOOK_URL, settings.BOT_WEBHOOK_SECRET, settings.BOT_WORKERS)
+    await bot_api.aclose()
+    logger.info("Webhook set to %s", settings.BOT_WEBHOOK_URL)
+
+
+if __name__ == "__main__":
+    asyncio.run(set_webhook())
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,7 +11,125 @@ class Settings(BaseSettings):
     TON_API_KEY: str
     BOT_NAME: str 
     SUPABASE_SERVICE_KEY: str
-    
+    # Токен для служебных эндпоинтов (заголовок X-Admin-Token); пустой — эндпоинты отключены
+    ADMIN_TOKEN: str = ""
+
+    # Пул соединений к Supabase (PostgREST)
+    DB_POOL_SIZE: int = 100
+    DB_POOL_KEEPALIVE: int = 20
+    DB_KEEPALIVE_EXPIRY: float = 30.0
+    DB_TIMEOUT: float = 10.0
+    DB_IN_CHUNK: int = 200  # id в одном фильтре in.(...), чтобы не упереться в длину URL
+
+    # toncenter
+    TONCENTER_URL: str = "https://toncenter.com/api/v2"
+    TON_TIMEOUT: float = 5.0
+    TON_CACHE_TTL: float = 30.0
+    TON_BATCH_CONCURRENCY: int = 8
+    TON_BREAKER_THRESHOLD: int = 5
+    TON_BREAKER_COOLDOWN: float = 30.0
+
+    # Кэш строк offchain_points
+    POINTS_CACHE_SIZE: int = 50000
+    POINTS_CACHE_TTL: float = 120.0
+
+    # Список рефералов
+    REFERRALS_PAGE_SIZE: int = 50
+    REFERRALS_CACHE_SIZE: int = 10000
+    REFERRALS_CACHE_TTL: float = 60.0
+
+    # Выполненные задания
+    TASKS_CACHE_SIZE: int = 50000
+    TASKS_CACHE_TTL: float = 300.0
+
+    # Логирование: очередь и поток записи, доля логируемых запросов по префиксу пути
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "/api/v1/mini_tap": 0.01,
+        "/api/v1/update_energy/": 0.05,
+        "/api/v1/claim_daily_points/": 0.1,
+    }
+
+    # Метрики: /metrics отдаётся с заголовком Authorization: Bearer <METRICS_TOKEN>; пустой — эндпоинт отключён
+    METRICS_TOKEN: str = ""
+    SERVER_TIMING_ENABLED: bool = False
+
+    # Условные GET (ETag/304): версии состояния пользователя. Версия живёт не дольше
+    # ETAG_TTL — так ограничено устаревание, если запись прошла через другой инстанс
+    ETAG_CACHE_SIZE: int = 100000
+    ETAG_TTL: float = 300.0
+    INVITE_LINK_MAX_AGE: int = 86400
+
+    # Idempotency-Key для изменяющих запросов: сколько ответов хранить, как долго и
+    # до какого размера тела (ответы больше не сохраняются)
+    IDEMPOTENCY_CACHE_SIZE: int = 50000
+    IDEMPOTENCY_TTL: float = 3600.0
+    IDEMPOTENCY_MAX_BODY: int = 16384
+
+    # Push-канал (WebSocket /api/v1/ws): лимиты соединений на воркер и на пользователя,
+    # время на первое сообщение с initData
+    PUSH_MAX_CONNECTIONS: int = 50000
+    PUSH_MAX_PER_USER: int = 5
+    PUSH_AUTH_TIMEOUT: float = 10.0
+
+    # Лутбоксы: путь к таблицам наград (пусто — app/data/lootboxes.json), лимит открытий
+    # за запрос; LOOTBOX_SEED делает выпадения воспроизводимыми (только для тестов)
+    LOOTBOX_CATALOG_PATH: str = ""
+    LOOTBOX_MAX_BATCH: int = 100
+    LOOTBOX_SEED: Optional[int] = None
+
+    # Telegram-бот в режиме вебхука (POST /telegram/webhook). Без BOT_WEBHOOK_SECRET маршрут
+    # отключён; Telegram передаёт секрет в заголовке X-Telegram-Bot-Api-Secret-Token
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    BOT_WEBHOOK_SECRET: str = ""
+    BOT_WEBHOOK_URL: str = ""
+    BOT_WORKERS: int = 16
+    BOT_QUEUE_SIZE: int = 1000
+    BOT_TIMEOUT: float = 10.0
+    MINI_APP_URL: str = "https://laboratory-front.vercel.app"
+
+    # Пакетный вебхук
+    WEBHOOK_MAX_EVENTS: int = 10000
+    WEBHOOK_DEDUP_WINDOW: float = 600.0
+    WEBHOOK_DEDUP_SIZE: int = 100000
+
+    # Снимок для аирдропа (python -m app.services.airdrop): строк на страницу чтения и в одном
+    # файле-части, минимум очков и сколько минимальных единиц токена даёт одно очко
+    AIRDROP_PAGE_SIZE: int = 1000
+    AIRDROP_CHUNK_ROWS: int = 100000
+    AIRDROP_MIN_POINTS: int = 1
+    AIRDROP_UNITS_PER_POINT: int = 1
+
+    # Таблица лидеров
+    LEADERBOARD_ENABLED: bool = True
+    LEADERBOARD_LOAD_PAGE: int = 1000
+    LEADERBOARD_RECONCILE_INTERVAL: float = 600.0
+    LEADERBOARD_MAX_LIMIT: int = 100
+
+    # Фоновая очередь начисления рефералов
+    REFERRAL_WORKERS: int = 2
+    REFERRAL_BATCH_SIZE: int = 100
+    REFERRAL_BATCH_WAIT: float = 0.05
+    REFERRAL_MAX_ATTEMPTS: int = 5
+    REFERRAL_RETRY_DELAY: float = 1.0
+    REFERRAL_DEAD_LETTER_SIZE: int = 1000
+    REFERRAL_DRAIN_TIMEOUT: float = 10.0
+
+    # Проверка initData: кэш проверенных подписей и срок жизни auth_date (0 — без ограничения)
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 300.0
+    INIT_DATA_MAX_AGE: int = 86400
+
+    # +1 энергия каждые ENERGY_REGEN_SECONDS
+    ENERGY_REGEN_SECONDS: int = 300
+
+    # Отложенная запись тапов (mini_tap)
+    TAP_AGGREGATOR_ENABLED: bool = True
+    TAP_FLUSH_INTERVAL: float = 2.0
+    TAP_FLUSH_MAX_PENDING: int = 1000
+    TAP_STATE_TTL: float = 300.0
 
     class Config:
         env_file = ".env"
@@ -1,13 +1,49 @@
-from supabase import create_client, Client
+import sys
+from typing import Any, Callable, Optional
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)  # Для SELECT
+
+class LazyClient:
+    """Builds the PostgREST client on first attribute access.
+
+    Importing the app then does not load httpx/postgrest or open a
+    connection pool, which keeps serverless cold starts short.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client: Optional[Any] = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+def _create_client(key: str) -> Any:
+    from app.core.http import create_postgrest_client
+    return create_postgrest_client(key)
+
+
+supabase = LazyClient(lambda: _create_client(settings.SUPABASE_ANON_KEY))  # Для SELECT
 
 if settings.SUPABASE_SERVICE_KEY:
-    supabase_service: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)  # Для INSERT/UPDATE
+    supabase_service = LazyClient(lambda: _create_client(settings.SUPABASE_SERVICE_KEY))  # Для INSERT/UPDATE
 else:
     logger.warning("SUPABASE_SERVICE_KEY not found. Using supabase for all operations.")
-    supabase_service = supabase  # Фallback на supabase, если service_key отсутствует
\ No newline at end of file
+    supabase_service = supabase  # Фallback на supabase, если service_key отсутствует
+
+
+async def close_database() -> None:
+    """Close pooled connections; called on application shutdown."""
+    # Если к БД ни разу не обращались, закрывать нечего
+    http = sys.modules.get("app.core.http")
+    if http is not None:
+        await http.close_transport()
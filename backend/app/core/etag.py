@@ -0,0 +1,77 @@
+import itertools
+import secrets
+from typing import Hashable, Tuple
+from fastapi import Request, Response
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+# Ответ можно закэшировать только у клиента и нужно перепроверять при каждом запросе
+REVALIDATE = "private, no-cache"
+
+
+def if_none_match(request: Request, tag: str) -> bool:
+    """Weak comparison of ``tag`` against the request's If-None-Match header."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def not_modified(tag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": cache_control})
+
+
+class VersionStore:
+    """Per-user versions of read endpoints' state, used as ETags.
+
+    A version is assigned on the first read and dropped by ``bump`` on every
+    write, so the next read gets a fresh number and the client's old ETag no
+    longer matches. Numbers are never reused within a process and ETags carry
+    a per-process epoch, so a tag can only match on the instance that issued
+    it, for the state it was issued for.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.versions: TTLCache[int] = TTLCache(max_size, ttl)
+        self.epoch = secrets.token_hex(4)
+        self._counter = itertools.count(1)
+        self.not_modified = 0
+
+    def check(self, request: Request, scope: str, user_id: int, variant: str = "") -> Tuple[str, bool]:
+        """Returns the current ETag and whether the client already has it.
+
+        Call it before reading the state: a write that lands during the read
+        bumps the version, so the tag returned here never describes newer data
+        than the response carries.
+        """
+        key = (scope, user_id)
+        version = self.versions.get(key)
+        if version is None:
+            version = next(self._counter)
+            self.versions.set(key, version)
+        tag = f'W/"{self.epoch}.{version}{"." + variant if variant else ""}"'
+        matched = if_none_match(request, tag)
+        if matched:
+            self.not_modified += 1
+        return tag, matched
+
+    def expire_in(self, scope: str, user_id: int, seconds: float) -> None:
+        """Forget the version after ``seconds``, for state that changes with time rather than writes."""
+        key = (scope, user_id)
+        version = self.versions.peek(key)
+        if version is not None and seconds < self.versions.ttl:
+            self.versions.set(key, version, expires_at=self.versions.clock() + max(seconds, 0.0))
+
+    def bump(self, scope: str, user_id: Hashable) -> None:
+        self.versions.pop((scope, user_id))
+
+    def stats(self) -> dict:
+        return {**self.versions.stats(), "not_modified": self.not_modified}
+
+
+etags = VersionStore(settings.ETAG_CACHE_SIZE, settings.ETAG_TTL)
@@ -0,0 +1,97 @@
+"""HTTP clients for Supabase and toncenter.
+
+Imports httpx and postgrest, so it is only loaded on the first outbound
+call (see app/core/database.py and app/utils/ton_api.py), not at cold start.
+"""
+import time
+from typing import Dict, Optional, Union
+import httpx
+from httpx import Timeout
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from app.core import metrics
+from app.core.config import settings
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times every request sent through ``inner`` and charges it to the current request."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, service: str):
+        self.inner = inner
+        self.service = service
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        target = metrics.upstream_target(self.service, request.url.path)
+        start = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception:
+            metrics.upstream_errors.inc((self.service, target))
+            raise
+        finally:
+            metrics.record_upstream(self.service, target, request.method, time.perf_counter() - start)
+        if response.status_code >= 500:
+            metrics.upstream_errors.inc((self.service, target))
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+_transport: Optional[InstrumentedTransport] = None
+
+
+def supabase_transport() -> InstrumentedTransport:
+    # Общий keep-alive пул соединений для всех клиентов PostgREST (anon и service);
+    # каждый запрос учитывается в метриках
+    global _transport
+    if _transport is None:
+        _transport = InstrumentedTransport(httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=1,
+            limits=httpx.Limits(
+                max_connections=settings.DB_POOL_SIZE,
+                max_keepalive_connections=settings.DB_POOL_KEEPALIVE,
+                keepalive_expiry=settings.DB_KEEPALIVE_EXPIRY,
+            ),
+        ), "supabase")
+    return _transport
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client that sends requests through the shared transport."""
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, Timeout],
+        verify: bool = True,
+    ) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=supabase_transport(),
+            follow_redirects=True,
+        )
+
+
+def create_postgrest_client(key: str) -> PooledPostgrestClient:
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apiKey": key,
+        "Authorization": f"Bearer {key}",
+    }
+    return PooledPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers=headers,
+        timeout=settings.DB_TIMEOUT,
+    )
+
+
+async def close_transport() -> None:
+    global _transport
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
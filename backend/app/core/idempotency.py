@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.utils.auth import verify_init_data
+from app.utils.cache import TTLCache
+
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MAX_KEY_LENGTH = 255
+
+StoreKey = Tuple[int, str]
+
+
+@dataclass(slots=True)
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class IdempotencyStore:
+    """Responses of mutating requests by (user_id, Idempotency-Key).
+
+    ``responses`` is a bounded TTL cache of finished responses; ``in_flight``
+    holds a future per request that is still running, so a retry that
+    arrives before the first attempt has answered waits for it instead of
+    running the handler a second time.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_body: int):
+        self.max_body = max_body
+        self.responses: TTLCache[StoredResponse] = TTLCache(max_size, ttl)
+        self.in_flight: Dict[StoreKey, Tuple[str, asyncio.Future]] = {}
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+
+    def stats(self) -> dict:
+        duplicates = self.replayed + self.coalesced
+        total = duplicates + self.executed
+        return {
+            "entries": len(self.responses),
+            "in_flight": len(self.in_flight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts,
+            "hit_rate": duplicates / total if total else 0.0,
+        }
+
+
+def _user_id(authorization: Optional[str]) -> Optional[int]:
+    # Та же проверка initData, что и в verify_authorization; подпись берётся из кэша
+    if not authorization or not authorization.startswith("tma "):
+        return None
+    identity = verify_init_data(init_data=authorization[4:])
+    return identity.user_id if identity else None
+
+
+async def _read_body(receive: Receive) -> Tuple[bytes, Receive]:
+    """Reads the whole request body and returns it with a receive callable that hands it to the app again."""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    pending = True
+
+    async def replay() -> Message:
+        nonlocal pending
+        if pending:
+            pending = False
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
+
+
+async def _send_json(send: Send, status: int, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Answers retried mutating requests from the IdempotencyStore.
+
+    Applies to authenticated POST/PUT/PATCH/DELETE requests with an
+    Idempotency-Key header. The first request runs as usual and its
+    response (unless a 5xx or larger than ``max_body``) is stored; a repeat
+    with the same key gets the stored response with an
+    ``Idempotent-Replayed: true`` header and never reaches the handler, and
+    a repeat that arrives while the first is running waits for it. Reusing
+    a key for a different method, path or body is answered with 422.
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, b'{"detail":"Invalid Idempotency-Key header"}')
+            return
+        user_id = _user_id(headers.get("authorization"))
+        if user_id is None:
+            # Ошибку авторизации вернёт сам эндпоинт
+            await self.app(scope, receive, send)
+            return
+
+        body, receive = await _read_body(receive)
+        digest = hashlib.sha256(body)
+        digest.update(f"{scope['method']} {scope['path']}?".encode() + scope.get("query_string", b""))
+        fingerprint = digest.hexdigest()
+        store_key = (user_id, key)
+
+        store = self.store
+        waited = False
+        while True:
+            stored = store.responses.get(store_key)
+            if stored is not None:
+                await self._replay(stored, fingerprint, waited, send)
+                return
+            running = store.in_flight.get(store_key)
+            if running is None:
+                break
+            if running[0] != fingerprint:
+                store.conflicts += 1
+                await _send_json(send, 422, b'{"detail":"Idempotency-Key was used for a different request"}')
+                return
+            # Первая попытка ещё выполняется — ждём её ответа; если он не сохранится, выполним запрос сами
+            waited = True
+            await asyncio.shield(running[1])
+
+        future = asyncio.get_running_loop().create_future()
+        store.in_flight[store_key] = (fingerprint, future)
+        store.executed += 1
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= store.max_body:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+                if not message.get("more_body", False) and size <= store.max_body and start["status"] < 500:
+                    store.responses.set(store_key, StoredResponse(fingerprint, start["status"],
+                                                                  list(start.get("headers", [])), b"".join(chunks)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            del store.in_flight[store_key]
+            future.set_result(None)
+
+    async def _replay(self, stored: StoredResponse, fingerprint: str, waited: bool, send: Send) -> None:
+        store = self.store
+        if stored.fingerprint != fingerprint:
+            store.conflicts += 1
+            await _send_json(send, 422, b'{"detail":"Idempotency-Key was used for a different request"}')
+            return
+        if waited:
+            store.coalesced += 1
+        else:
+            store.replayed += 1
+        await send({"type": "http.response.start", "status": stored.status,
+                    "headers": [*stored.headers, (b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": stored.body})
+
+
+idempotency_store = IdempotencyStore(
+    max_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_TTL,
+    max_body=settings.IDEMPOTENCY_MAX_BODY,
+)
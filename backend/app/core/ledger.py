@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from app.core.database import supabase_service
+from app.core.etag import etags
+from app.core.repository import points_repo, referrals_repo, tasks_repo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Функции описаны в supabase/migrations/*_ledger_functions.sql; каждая проверяет
+# и изменяет баланс в одной транзакции и возвращает новое состояние строки.
+
+
+@dataclass(slots=True)
+class Balance:
+    points: int
+    tickets: int
+
+
+@dataclass(slots=True)
+class ClaimResult:
+    claimed: bool
+    tickets: int
+    claim_streak: int
+    last_claim_date: str
+
+
+@dataclass(slots=True)
+class TaskResult:
+    completed: bool
+    points: int
+    completed_at: Optional[str]
+
+
+@dataclass(slots=True)
+class TapResult:
+    applied: int
+    hearts: int
+    energy: int
+    last_energy_update: str
+
+
+@dataclass(slots=True)
+class ReferralCredit:
+    referrer_user_id: int
+    referral_id: int
+    status: str
+    tickets: Optional[int]  # итог реферера после зачисления; None, если пара не зачислена
+    referral_count: Optional[int]
+
+
+@dataclass(slots=True)
+class LootboxSpend:
+    opened: bool
+    points: int
+    tickets: int
+
+
+class Ledger:
+    async def _rpc(self, fn: str, params: dict) -> list:
+        response = await supabase_service.rpc(fn, params).execute()
+        return response.data or []
+
+    async def increment(self, user_id: int, points: int = 0, tickets: int = 0) -> Optional[Balance]:
+        """Adds to the balance; None if the user has no offchain_points row."""
+        rows = await self._rpc("increment_balance", {"p_user_id": user_id, "p_points": points, "p_tickets": tickets})
+        if not rows:
+            return None
+        balance = Balance(points=rows[0]["points"], tickets=rows[0]["tickets"])
+        points_repo.apply(user_id, {"points": balance.points, "tickets": balance.tickets})
+        return balance
+
+    async def claim_daily(self, user_id: int, max_streak: int = 7) -> Optional[ClaimResult]:
+        rows = await self._rpc("claim_daily_tickets", {"p_user_id": user_id, "p_max_streak": max_streak})
+        if not rows:
+            return None
+        result = ClaimResult(**rows[0])
+        if result.claimed:
+            points_repo.apply(user_id, {
+                "tickets": result.tickets,
+                "claim_streak": result.claim_streak,
+                "last_claim_date": result.last_claim_date
+            })
+            etags.bump("claim", user_id)
+        return result
+
+    async def complete_task(self, user_id: int, task_id: str, points: int) -> Optional[TaskResult]:
+        rows = await self._rpc("complete_task", {"p_user_id": user_id, "p_task_id": task_id, "p_points": points})
+        if not rows:
+            return None
+        result = TaskResult(**rows[0])
+        if result.completed:
+            points_repo.apply(user_id, {"points": result.points})
+        if result.completed_at:
+            tasks_repo.mark_completed(user_id, task_id, result.completed_at)
+        return result
+
+    async def apply_taps(self, user_id: int, taps: int, regen_seconds: int) -> Optional[TapResult]:
+        """Adds up to ``taps`` hearts, as many as the stored energy allows; None if the user has no row."""
+        rows = await self._rpc("apply_taps", {"p_user_id": user_id, "p_taps": taps, "p_regen_seconds": regen_seconds})
+        if not rows:
+            return None
+        result = TapResult(**rows[0])
+        points_repo.apply(user_id, {
+            "hearts": result.hearts,
+            "energy": result.energy,
+            "last_energy_update": result.last_energy_update
+        })
+        return result
+
+    async def open_lootboxes(self, user_id: int, lootbox_id: str, cost: int, points: int, tickets: int,
+                             rewards: Dict[str, int]) -> Optional[LootboxSpend]:
+        """Spends ``cost`` tickets and credits the drawn rewards; opened is False if tickets are short."""
+        rows = await self._rpc("open_lootboxes", {
+            "p_user_id": user_id,
+            "p_lootbox_id": lootbox_id,
+            "p_cost": cost,
+            "p_points": points,
+            "p_tickets": tickets,
+            "p_rewards": rewards
+        })
+        if not rows:
+            return None
+        result = LootboxSpend(**rows[0])
+        if result.opened:
+            points_repo.apply(user_id, {"points": result.points, "tickets": result.tickets})
+        return result
+
+    async def credit_referrals(self, items: List[Tuple[int, int]], reward: int,
+                               max_referrals: int) -> List[ReferralCredit]:
+        """Credits (referrer_user_id, referral_id) pairs in order; each status is one of credited,
+        already_referred, invalid_referrer, referrer_without_points, limit_reached."""
+        rows = await self._rpc("credit_referrals", {
+            "p_items": [{"referrer_user_id": r, "referral_id": f} for r, f in items],
+            "p_reward": reward,
+            "p_max_referrals": max_referrals
+        })
+        results = [ReferralCredit(**row) for row in rows]
+        for result in results:
+            if result.status == "credited":
+                points_repo.apply(result.referrer_user_id, {"tickets": result.tickets})
+                referrals_repo.invalidate(result.referrer_user_id)
+                etags.bump("referrals", result.referrer_user_id)
+        return results
+
+
+ledger = Ledger()
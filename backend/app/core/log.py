@@ -0,0 +1,154 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+
+# Отбирается ли текущий запрос в лог; выставляется middleware на каждый запрос
+request_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("request_sampled", default=True)
+
+_REDACT_PATTERNS = [
+    (re.compile(r"(tma )\S+"), r"\1[REDACTED]"),
+    (re.compile(r"((?:^|[?&\s'\"])(?:hash|signature|query_id|user)=)[^&\s'\"]+"), r"\1[REDACTED]"),
+]
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact(text: str) -> str:
+    """Masks initData (Authorization values, hash and user fields) in a log line."""
+    for pattern, replacement in _REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class SamplingFilter(logging.Filter):
+    """Drops DEBUG/INFO records of requests that were not sampled; warnings and errors always pass."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or request_sampled.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, redacted message and any ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them.
+
+    Only the message text is fixed in the calling thread, since the args
+    may change after the logging call returns; the stock QueueHandler also
+    runs the formatter here, while formatting, redaction and I/O happen in
+    the listener. When the queue is full the record is dropped and counted
+    instead of blocking the loop.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RouteSampler:
+    """Sampling rates by path prefix for request logs; unlisted paths are always logged."""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.set_rates(rates)
+
+    def set_rates(self, rates: Dict[str, float]) -> None:
+        # Меняем правила у существующего объекта: на него уже ссылается middleware
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def rate(self, path: str) -> float:
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def sample(self, path: str) -> bool:
+        rate = self.rate(path)
+        return rate >= 1.0 or random.random() < rate
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+sampler = RouteSampler(settings.LOG_SAMPLE_RATES)
+
+
+def setup_logging(stream=None) -> None:
+    """Routes the root logger through a bounded queue to a listener thread. Safe to call twice."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    _handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Stops the listener after it has written everything queued so far."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _listener = None
+    _handler = None
+
+
+def stats() -> dict:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
+
+
+def access_log(logger: logging.Logger, method: str, path: str, status: int, started: float) -> None:
+    duration_ms = (time.perf_counter() - started) * 1000
+    logger.info("%s %s %s %.1fms", method, path, status, duration_ms,
+                extra={"method": method, "path": path, "status": status, "duration_ms": round(duration_ms, 2)})
@@ -0,0 +1,165 @@
+import contextvars
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Метрики в формате Prometheus без внешних зависимостей: всё считается в процессе
+# и отдаётся целиком на /metrics.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALLS_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Для каждой серии: счётчики по корзинам (последняя — +Inf), сумма, количество
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._series.get(labels)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), series):
+                cumulative += hits
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {int(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, List[Sample]]]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, str, List[Sample]]]]):
+        """Registers a function yielding (name, help, samples) gauges, evaluated on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            for name, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route, method and status.", ("route", "method", "status"))
+http_db_calls = registry.histogram(
+    "http_request_db_calls", "Supabase round trips made while serving one request.", ("route",), CALLS_BUCKETS)
+upstream_requests = registry.histogram(
+    "upstream_request_duration_seconds", "Latency of calls to Supabase and toncenter.", ("service", "target", "method"))
+upstream_errors = registry.counter(
+    "upstream_request_errors_total", "Failed calls to Supabase and toncenter (transport errors and 5xx).",
+    ("service", "target"))
+
+
+@dataclass(slots=True)
+class RequestStats:
+    """Upstream calls made on behalf of the current request."""
+    db_calls: int = 0
+    db_time: float = 0.0
+    ton_calls: int = 0
+    ton_time: float = 0.0
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+
+def upstream_target(service: str, path: str) -> str:
+    # /rest/v1/<table> или /rest/v1/rpc/<fn>; для toncenter и Bot API — метод API (без токена из пути)
+    if service == "supabase":
+        return path.removeprefix("/rest/v1/") or "/"
+    return path.rstrip("/").rsplit("/", 1)[-1] or "/"
+
+
+def record_upstream(service: str, target: str, method: str, elapsed: float) -> None:
+    """Records one Supabase/toncenter call and charges it to the current request."""
+    upstream_requests.observe((service, target, method), elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        if service == "supabase":
+            stats.db_calls += 1
+            stats.db_time += elapsed
+        elif service == "toncenter":
+            stats.ton_calls += 1
+            stats.ton_time += elapsed
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_calls} calls"']
+    if stats.ton_calls:
+        parts.append(f'ton;dur={stats.ton_time * 1000:.1f};desc="{stats.ton_calls} calls"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,268 @@
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from app.core.config import settings
+from app.core.database import supabase, supabase_service
+from app.utils.cache import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UserRow(TypedDict, total=False):
+    id: int
+    user_id: int
+    username: str
+    first_name: str
+    photo_url: str
+    wallet: Optional[str]
+
+
+class PointsRow(TypedDict, total=False):
+    user_id: int
+    user_id_fk: int
+    points: int
+    tickets: int
+    hearts: int
+    energy: int
+    max_energy: int
+    last_energy_update: Optional[str]
+    last_claim_date: Optional[str]
+    claim_streak: int
+
+
+class CompletedTaskRow(TypedDict, total=False):
+    user_id: int
+    task_id: str
+    completed_at: str
+
+
+def default_points_row(user_id: int, user_id_fk: int) -> PointsRow:
+    return {
+        "user_id": user_id,
+        "user_id_fk": user_id_fk,
+        "points": 0,
+        "tickets": 0,
+        "hearts": 0,
+        "energy": 100,
+        "max_energy": 100,
+        "last_energy_update": "now()",
+        "last_claim_date": None,
+        "claim_streak": 0
+    }
+
+
+class UsersRepository:
+    table = "users"
+
+    async def get_id(self, user_id: int) -> Optional[int]:
+        response = await supabase.table(self.table).select("id").eq("user_id", user_id).execute()
+        return response.data[0]["id"] if response.data else None
+
+    async def login(self, user: UserRow) -> Optional[PointsRow]:
+        """Creates the user and points rows if missing and returns the points row in one round trip."""
+        response = await supabase_service.rpc("login_user", {
+            "p_user_id": user["user_id"],
+            "p_username": user.get("username", ""),
+            "p_first_name": user.get("first_name", ""),
+            "p_photo_url": user.get("photo_url", "")
+        }).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        points_repo.prime(user["user_id"], row)
+        return dict(row)
+
+    async def set_wallet(self, user_id: int, wallet: str) -> None:
+        await supabase_service.table(self.table).update({"wallet": wallet}).eq("user_id", user_id).execute()
+
+    async def ids_for(self, user_ids: List[int]) -> Dict[int, int]:
+        """Maps Telegram user_id -> users.id for the users that exist."""
+        ids: Dict[int, int] = {}
+        for i in range(0, len(user_ids), settings.DB_IN_CHUNK):
+            response = await supabase.table(self.table).select("id, user_id").in_("user_id", user_ids[i:i + settings.DB_IN_CHUNK]).execute()
+            ids.update({row["user_id"]: row["id"] for row in response.data or []})
+        return ids
+
+
+class PointsRepository:
+    """offchain_points with a per-user read-through cache.
+
+    Rows are cached on read; every write through this repository updates or
+    drops the cached row, so only writes from other processes can be stale,
+    and only for POINTS_CACHE_TTL seconds.
+    """
+    table = "offchain_points"
+
+    def __init__(self):
+        self.cache: TTLCache[PointsRow] = TTLCache(settings.POINTS_CACHE_SIZE, settings.POINTS_CACHE_TTL)
+        self._writes = 0
+
+    async def get(self, user_id: int) -> Optional[PointsRow]:
+        row = self.cache.get(user_id)
+        if row is None:
+            writes = self._writes
+            response = await supabase.table(self.table).select("*").eq("user_id", user_id).execute()
+            if not response.data:
+                return None
+            row = response.data[0]
+            # Если во время чтения была запись, строка могла устареть — не кэшируем
+            if writes == self._writes:
+                self.cache.set(user_id, row)
+        return dict(row)
+
+    async def get_many(self, user_ids: List[int]) -> Dict[int, PointsRow]:
+        """Rows for several users: cached ones as is, the rest with one query per DB_IN_CHUNK ids."""
+        rows: Dict[int, PointsRow] = {}
+        missing = []
+        for user_id in user_ids:
+            row = self.cache.get(user_id)
+            if row is None:
+                missing.append(user_id)
+            else:
+                rows[user_id] = dict(row)
+        writes = self._writes
+        for i in range(0, len(missing), settings.DB_IN_CHUNK):
+            response = await supabase.table(self.table).select("*").in_("user_id", missing[i:i + settings.DB_IN_CHUNK]).execute()
+            for row in response.data or []:
+                rows[row["user_id"]] = dict(row)
+                if writes == self._writes:
+                    self.cache.set(row["user_id"], row)
+        return rows
+
+    async def create_defaults(self, user_ids_fk: Dict[int, int]) -> Dict[int, PointsRow]:
+        """Bulk-creates default rows for user_id -> users.id; existing rows are left untouched.
+
+        Returns the rows as stored, including ones another request created first.
+        """
+        self._writes += 1
+        user_ids = list(user_ids_fk)
+        for user_id in user_ids:
+            self.cache.pop(user_id)
+        response = await supabase_service.table(self.table).upsert(
+            [default_points_row(user_id, fk) for user_id, fk in user_ids_fk.items()],
+            ignore_duplicates=True,
+            on_conflict="user_id"
+        ).execute()
+        rows = {row["user_id"]: row for row in response.data or []}
+        # Строки, которые уже существовали, upsert не возвращает — дочитываем их
+        existing = [u for u in user_ids if u not in rows]
+        if existing:
+            rows.update(await self.get_many(existing))
+        for user_id, row in rows.items():
+            self.prime(user_id, row)
+        return {user_id: dict(row) for user_id, row in rows.items()}
+
+    async def scan_scores(self, after: Optional[int], limit: int) -> List[PointsRow]:
+        """A page of (user_id, points, hearts) ordered by user_id, for bulk loads."""
+        query = supabase_service.table(self.table).select("user_id, points, hearts")
+        if after is not None:
+            query = query.gt("user_id", after)
+        response = await query.order("user_id").limit(limit).execute()
+        return response.data or []
+
+    async def take_airdrop_snapshot(self, min_points: int) -> dict:
+        """Copies holders with a wallet and at least ``min_points`` into a new snapshot; returns its id and totals."""
+        response = await supabase_service.rpc("take_airdrop_snapshot", {"p_min_points": min_points}).execute()
+        return response.data[0]
+
+    async def scan_snapshot(self, snapshot_id: int, after: Optional[int], limit: int) -> List[dict]:
+        """A page of (user_id, wallet, points) of an airdrop snapshot, ordered by user_id."""
+        query = supabase_service.table("airdrop_snapshot_rows").select("user_id, wallet, points").eq(
+            "snapshot_id", snapshot_id)
+        if after is not None:
+            query = query.gt("user_id", after)
+        response = await query.order("user_id").limit(limit).execute()
+        return response.data or []
+
+    def prime(self, user_id: int, row: PointsRow) -> None:
+        """Caches a full row returned by the database (e.g. from an RPC)."""
+        self._writes += 1
+        self.cache.set(user_id, row)
+
+    def apply(self, user_id: int, fields: Dict[str, Any]) -> None:
+        """Merges fields already written by the database (e.g. an RPC) into the cached row."""
+        self._writes += 1
+        row = self.cache.peek(user_id)
+        if row is not None:
+            row.update(fields)
+
+    def invalidate(self, user_id: int) -> None:
+        self._writes += 1
+        self.cache.pop(user_id)
+
+
+class ReferralsRepository:
+    table = "referrals"
+
+    def __init__(self):
+        # Первая страница списка рефералов — её запрашивают чаще всего
+        self.first_page_cache: TTLCache[Tuple[List[UserRow], Optional[int]]] = TTLCache(
+            settings.REFERRALS_CACHE_SIZE, settings.REFERRALS_CACHE_TTL)
+
+    async def list_page(self, referrer_user_id: int, limit: int,
+                        after: Optional[int] = None) -> Tuple[List[UserRow], Optional[int]]:
+        """One page of a referrer's referrals ordered by referral id; returns rows and the next cursor."""
+        first_page = after is None and limit == settings.REFERRALS_PAGE_SIZE
+        if first_page:
+            cached = self.first_page_cache.get(referrer_user_id)
+            if cached is not None:
+                return cached
+        query = supabase.table("referral_list").select("referral_id, user_id, username, first_name, photo_url").eq("referrer_user_id", referrer_user_id)
+        if after is not None:
+            query = query.gt("referral_id", after)
+        response = await query.order("referral_id").limit(limit + 1).execute()
+        rows = response.data or []
+        next_cursor = rows[limit - 1]["referral_id"] if len(rows) > limit else None
+        page = ([{k: v for k, v in row.items() if k != "referral_id"} for row in rows[:limit]], next_cursor)
+        if first_page:
+            self.first_page_cache.set(referrer_user_id, page)
+        return page
+
+    def invalidate(self, referrer_user_id: int) -> None:
+        self.first_page_cache.pop(referrer_user_id)
+
+
+class CompletedTasksRepository:
+    """completed_tasks with a cached per-user map of task_id -> completed_at.
+
+    The whole set is read in one query and kept until TASKS_CACHE_TTL;
+    completions made through this process are added to the cached map.
+    """
+    table = "completed_tasks"
+
+    def __init__(self):
+        self.cache: TTLCache[Dict[str, str]] = TTLCache(settings.TASKS_CACHE_SIZE, settings.TASKS_CACHE_TTL)
+        self._writes = 0
+
+    async def completed(self, user_id: int) -> Dict[str, str]:
+        tasks = self.cache.get(user_id)
+        if tasks is None:
+            writes = self._writes
+            response = await supabase.table(self.table).select("task_id, completed_at").eq("user_id", user_id).execute()
+            tasks = {row["task_id"]: row["completed_at"] for row in response.data or []}
+            # Если во время чтения было выполнено задание, набор мог устареть — не кэшируем
+            if writes == self._writes:
+                self.cache.set(user_id, tasks)
+        return dict(tasks)
+
+    async def get(self, user_id: int, task_id: str) -> Optional[CompletedTaskRow]:
+        completed_at = (await self.completed(user_id)).get(task_id)
+        if completed_at is None:
+            return None
+        return {"user_id": user_id, "task_id": task_id, "completed_at": completed_at}
+
+    def known_completed(self, user_id: int, task_id: str) -> bool:
+        """True if the cached set already has the task; never queries the database."""
+        tasks = self.cache.peek(user_id)
+        return tasks is not None and task_id in tasks
+
+    def mark_completed(self, user_id: int, task_id: str, completed_at: str) -> None:
+        self._writes += 1
+        tasks = self.cache.peek(user_id)
+        if tasks is not None:
+            tasks[task_id] = completed_at
+
+
+users_repo = UsersRepository()
+points_repo = PointsRepository()
+referrals_repo = ReferralsRepository()
+tasks_repo = CompletedTasksRepository()
@@ -1,13 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.deps import verify_authorization
+from fastapi.responses import PlainTextResponse
+from app.api.deps import authenticate, verify_authorization, verify_admin, verify_metrics, verify_telegram_secret
+from app.api.responses import FastJSONResponse, dumps
+from app.api.schemas import (
+    AddPointsRequest, AddPointsResponse, AdminEnergyResponse, ClaimResponse, ClaimStatusResponse,
+    CompleteTaskResponse, EnergyResponse, InviteLinkResponse, LeaderboardRankResponse, LeaderboardResponse,
+    LootboxCatalogResponse, LootboxOpenResponse, LoginResponse, MessageResponse, MiniTapResponse,
+    ReferralQueueStats, ReferralsResponse, RegisterReferralRequest, TaskStatus, TasksStatusResponse,
+    TelegramWebhookResponse, WalletConnectRequest, WalletConnectResponse, WebhookBatchResponse, WebhookResult
+)
+from app.bot import bot_dispatcher
 from app.core.config import settings
-from app.core.database import supabase, supabase_service
+from app.core.database import close_database
+from app.core.etag import REVALIDATE, etags, if_none_match, not_modified
+from app.core.idempotency import IdempotencyMiddleware, idempotency_store
+from app.core.ledger import ledger
+from app.core import log, metrics
+from app.core.log import access_log, request_sampled, sampler, setup_logging, shutdown_logging
+from app.core.repository import users_repo, points_repo, referrals_repo, tasks_repo
+from app.services.leaderboard import BOARDS, leaderboard
+from app.services.lootbox import lootbox_engine
+from app.services.push import push_hub
+from app.services.referral_queue import referral_queue
+from app.services.tap_aggregator import tap_aggregator
+from app.services.webhook import WebhookBatchTooLarge, parse_events, webhook_processor
+from app.utils.auth import identity_cache
+from app.utils.energy import current_energy_batch, parse_energy_timestamp, row_energy
+from app.utils.ton_api import ton_client, TonApiError
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
+from typing import List, Literal, Optional, Union
+import asyncio
+import hashlib
 import logging
-import requests
-
-app = FastAPI()
+import time
+
+setup_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await tap_aggregator.start()
+    await referral_queue.start()
+    await leaderboard.start()
+    await push_hub.start()
+    await bot_dispatcher.start()
+    yield
+    await bot_dispatcher.stop()
+    await push_hub.stop()
+    await leaderboard.stop()
+    await referral_queue.stop()
+    await tap_aggregator.stop()
+    await ton_client.aclose()
+    await close_database()
+    shutdown_logging()
+
+# Ответы сериализуются по response_model и рендерятся pydantic-core, без jsonable_encoder и json.dumps
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Повторы изменяющих запросов с тем же Idempotency-Key получают сохранённый ответ.
+# Добавлен первым, поэтому работает внутри CORS и журнала запросов
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
 
 # Настройка CORS
 app.add_middleware(
@@ -20,162 +73,147 @@ app.add_middleware(
 
 logger = logging.getLogger(__name__)
 
+_route_paths = {}
+
+def route_template(request: Request) -> str:
+    # Метки метрик — шаблон маршрута, а не путь с user_id
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if not _route_paths:
+        _route_paths.update({r.endpoint: r.path for r in app.routes if hasattr(r, "endpoint")})
+    return _route_paths.get(endpoint, "unmatched")
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
-    return response
-
-@app.get("/")
+    # Одна запись на запрос; горячие маршруты логируются выборочно (LOG_SAMPLE_RATES)
+    started = time.perf_counter()
+    path = request.url.path
+    sampled = sampler.sample(path)
+    token = request_sampled.set(sampled)
+    stats = metrics.RequestStats()
+    stats_token = metrics.current_request.set(stats)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if status >= 500:
+            request_sampled.set(True)
+        access_log(logger, request.method, path, status, started)
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = metrics.server_timing(stats, time.perf_counter() - started)
+        return response
+    finally:
+        route = route_template(request)
+        metrics.http_requests.observe((route, request.method, str(status)), time.perf_counter() - started)
+        metrics.http_db_calls.observe((route,), stats.db_calls)
+        metrics.current_request.reset(stats_token)
+        request_sampled.reset(token)
+
+@app.get("/", response_model=MessageResponse)
 async def root():
     return {"message": "Welcome to Sbank API"}
 
-def get_ton_balance(wallet_address: str):
-    url = f"https://toncenter.com/api/v2/getAddressBalance"
-    params = {"address": wallet_address, "api_key": settings.TON_API_KEY}
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        return response.json().get("result", 0)
-    logger.error(f"Failed to get TON balance for {wallet_address}: {response.status_code} - {response.text}")
-    raise HTTPException(status_code=503, detail="Failed to fetch TON balance")
-
-@app.post("/api/v1/auth/login")
+@app.post("/api/v1/auth/login", response_model=LoginResponse)
 async def login(user_data: dict = Depends(verify_authorization)):
     user_id = user_data["user_id"]
-    logger.info(f"Authenticating user_id: {user_id}")
+    logger.info("Authenticating user_id: %s", user_id)
 
     try:
-        user_response = supabase.table("users").select("*").eq("user_id", user_id).execute()
-        user_id_fk = None
-        if not user_response.data:
-            new_user = {
-                "user_id": user_id,
-                "username": user_data.get("username", ""),
-                "first_name": user_data.get("first_name", ""),
-                "photo_url": user_data.get("photo_url", "")
-            }
-            insert_result = supabase_service.table("users").insert(new_user).execute()
-            user_id_fk = insert_result.data[0]["id"]
-            supabase_service.table("offchain_points").insert({
-                "user_id": user_id,
-                "user_id_fk": user_id_fk,
-                "points": 0,
-                "tickets": 0,
-                "hearts": 0,
-                "energy": 100,
-                "max_energy": 100,
-                "last_energy_update": "now()",
-                "last_claim_date": None,
-                "claim_streak": 0
-            }).execute()
-        else:
-            user_id_fk = user_response.data[0]["id"]
-
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
+        # Создание пользователя (если нужно) и чтение баланса — один запрос
+        user_points = await users_repo.login({
+            "user_id": user_id,
+            "username": user_data.get("username", ""),
+            "first_name": user_data.get("first_name", ""),
+            "photo_url": user_data.get("photo_url", "")
+        })
+        if not user_points:
             raise HTTPException(status_code=500, detail="Failed to initialize user points")
-        
-        user_points = points_response.data[0]
+        user_id_fk = user_points["user_id_fk"]
+
         start_param = user_data.get("start_param", "")
-        logger.info(f"Received start_param: {start_param}")
+        logger.info("Received start_param: %s", start_param)
         if start_param and start_param.startswith("ref_"):
             referrer_id = start_param.replace("ref_", "")
             await register_referral_logic(user_id, referrer_id, user_data, user_id_fk)
 
-        logger.info(f"Login successful for user_id: {user_id}")
+        # Ещё не записанные тапы берём из памяти
+        current_time = datetime.now(timezone.utc)
+        tap_state = tap_aggregator.cached(user_id)
+        hearts = tap_state.hearts if tap_state else user_points["hearts"]
+        energy = tap_state.energy_at(current_time) if tap_state else row_energy(user_points, current_time)
+        leaderboard.update(user_id, points=user_points["points"], hearts=hearts)
+
+        logger.info("Login successful for user_id: %s", user_id)
         return {
             "user": user_data,
             "points": {
                 "points": user_points["points"],
                 "tickets": user_points["tickets"],
-                "hearts": user_points["hearts"],
-                "energy": user_points["energy"]
+                "hearts": hearts,
+                "energy": energy
             }
         }
     except Exception as e:
         logger.error(f"Error in login: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/webhook")
+@app.post("/webhook", response_model=Union[WebhookResult, WebhookBatchResponse], response_model_exclude_none=True)
 async def webhook(request: Request):
-    data = await request.json()
-    logger.info(f"Received webhook data: {data}")
-    user_id = data.get("user_id")
-    if not user_id:
-        logger.error("Missing user_id in webhook data")
-        return {"status": "error", "message": "Missing user_id"}
+    """Accepts one event object, a JSON array of events or NDJSON (one event per line)."""
+    body = await request.body()
     try:
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
-            user = supabase.table("users").select("id").eq("user_id", user_id).execute()
-            user_id_fk = user.data[0]["id"] if user.data else None
-            if user_id_fk:
-                supabase_service.table("offchain_points").insert({
-                    "user_id": user_id,
-                    "user_id_fk": user_id_fk,
-                    "points": 0,
-                    "tickets": 0,
-                    "hearts": 0,
-                    "energy": 100,
-                    "max_energy": 100,
-                    "last_energy_update": "now()",
-                    "last_claim_date": None,
-                    "claim_streak": 0
-                }).execute()
-                points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        current_points = points_response.data[0]["points"]
-        current_tickets = points_response.data[0]["tickets"]
-        event = data.get("event")
-        if event == "login":
-            logger.info(f"Login event processed for user_id: {user_id}")
-        return {"status": "processed", "points": current_points, "tickets": current_tickets}
+        events = parse_events(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    try:
+        results = await webhook_processor.process(events)
+    except WebhookBatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error in webhook: {str(e)}")
         return {"status": "error", "message": str(e)}
-
-@app.post("/api/v1/claim_daily_points/{user_id}")
+    # Одиночное событие — прежний формат ответа
+    if body.lstrip()[:1] == b"{" and len(events) == 1:
+        return results[0]
+    return {"results": results}
+
+# Вебхук Telegram-бота: обновление ставится в очередь, Telegram получает ответ сразу
+@app.post("/telegram/webhook", response_model=TelegramWebhookResponse, dependencies=[Depends(verify_telegram_secret)])
+async def telegram_webhook(request: Request):
+    try:
+        update = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    # При ошибке Telegram повторит доставку позже
+    if not await bot_dispatcher.submit(update):
+        raise HTTPException(status_code=503, detail="Bot is busy")
+    return {"ok": True}
+
+@app.post("/api/v1/claim_daily_points/{user_id}", response_model=ClaimResponse)
 async def claim_daily_points(user_id: int, user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
     try:
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
+        # Проверка 24 часов, серия и начисление — одной транзакцией в БД
+        result = await ledger.claim_daily(user_id)
+        if result is None:
             raise HTTPException(status_code=404, detail="User points not found")
-        
-        user_points = points_response.data[0]
-        last_claim = user_points["last_claim_date"]
-        current_time = datetime.now(timezone.utc)
-        
-        if last_claim:
-            last_claim_time = datetime.fromisoformat(last_claim.replace("Z", "+00:00"))
-            if (current_time - last_claim_time).total_seconds() < 24 * 3600:
-                raise HTTPException(status_code=400, detail="Claim available only once every 24 hours")
-        
-        claim_streak = user_points["claim_streak"]
-        if last_claim and (current_time - last_claim_time).total_seconds() < 48 * 3600:
-            claim_streak = min(claim_streak + 1, 7)
-        else:
-            claim_streak = 1
-        
-        new_tickets = user_points["tickets"] + claim_streak
-        
-        try:
-            supabase_service.table("offchain_points").update({
-                "tickets": new_tickets,
-                "last_claim_date": current_time.isoformat(),
-                "claim_streak": claim_streak
-            }).eq("user_id", user_id).execute()
-        except Exception as e:
-            logger.error(f"Failed to update points: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to update user points")
-
-        logger.info(f"Claimed {claim_streak} tickets for user_id {user_id}, streak: {claim_streak}")
+        if not result.claimed:
+            raise HTTPException(status_code=400, detail="Claim available only once every 24 hours")
+
+        logger.info("Claimed %s tickets for user_id %s, streak: %s", result.claim_streak, user_id, result.claim_streak)
+        next_claim_time = next_claim_at(result.last_claim_date, datetime.now(timezone.utc))
+        push_hub.publish(user_id, "balance", {"tickets": result.tickets})
+        push_hub.publish(user_id, "claim", {
+            "streak": result.claim_streak,
+            "nextClaimTimestamp": next_claim_time.isoformat() if next_claim_time else None
+        })
         return {
             "message": "Daily claim successful",
-            "tickets": new_tickets,
-            "streak": claim_streak
+            "tickets": result.tickets,
+            "streak": result.claim_streak
         }
     except HTTPException as e:
         raise e
@@ -183,26 +221,37 @@ async def claim_daily_points(user_id: int, user_data: dict = Depends(verify_auth
         logger.error(f"Error in claim_daily_points: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.get("/api/v1/claim_daily_points/{user_id}")
-async def get_claim_status(user_id: int, user_data: dict = Depends(verify_authorization)):
+def next_claim_at(last_claim: Optional[str], now: datetime) -> Optional[datetime]:
+    """When the next daily claim opens; None if it is available now."""
+    if last_claim:
+        last_claim_time = datetime.fromisoformat(last_claim.replace("Z", "+00:00"))
+        if (now - last_claim_time).total_seconds() < 24 * 3600:
+            return last_claim_time + timedelta(hours=24)
+    return None
+
+@app.get("/api/v1/claim_daily_points/{user_id}", response_model=ClaimStatusResponse)
+async def get_claim_status(user_id: int, request: Request, response: Response,
+                           user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
+    # Фронтенд опрашивает статус каждую минуту; без изменений отвечаем 304 без обращения к БД
+    tag, matched = etags.check(request, "claim", user_id)
+    if matched:
+        return not_modified(tag)
     try:
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
+        user_points = await points_repo.get(user_id)
+        if not user_points:
             raise HTTPException(status_code=404, detail="User points not found")
         
-        user_points = points_response.data[0]
-        last_claim = user_points["last_claim_date"]
         current_time = datetime.now(timezone.utc)
-        next_claim_time = None
-        
-        if last_claim:
-            last_claim_time = datetime.fromisoformat(last_claim.replace("Z", "+00:00"))
-            if (current_time - last_claim_time).total_seconds() < 24 * 3600:
-                next_claim_time = last_claim_time + timedelta(hours=24)
+        next_claim_time = next_claim_at(user_points["last_claim_date"], current_time)
+        if next_claim_time:
+            # Когда наступит время следующего сбора, ответ изменится сам по себе
+            etags.expire_in("claim", user_id, (next_claim_time - current_time).total_seconds())
         
+        response.headers["ETag"] = tag
+        response.headers["Cache-Control"] = REVALIDATE
         return {
             "streak": user_points["claim_streak"],
             "nextClaimTimestamp": next_claim_time.isoformat() if next_claim_time else None
@@ -213,287 +262,394 @@ async def get_claim_status(user_id: int, user_data: dict = Depends(verify_author
         logger.error(f"Error in get_claim_status: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/api/v1/wallet/connect")
-async def wallet_connect(data: dict, user_data: dict = Depends(verify_authorization)):
-    logger.info(f"Connecting wallet for user_id: {user_data.get('user_id')}")
-    wallet_address = data.get("wallet", "mock_wallet")
+@app.post("/api/v1/wallet/connect", response_model=WalletConnectResponse)
+async def wallet_connect(data: WalletConnectRequest, user_data: dict = Depends(verify_authorization)):
+    logger.info("Connecting wallet for user_id: %s", user_data.get('user_id'))
+    wallet_address = data.wallet
     user_id = user_data["user_id"]
-    ton_balance = get_ton_balance(wallet_address) if wallet_address != "mock_wallet" else 0
+    ton_balance = 0
+    if wallet_address != "mock_wallet":
+        try:
+            ton_balance = await ton_client.get_balance(wallet_address)
+        except TonApiError as e:
+            logger.error(f"Failed to get TON balance for {wallet_address}: {str(e)}")
+            raise HTTPException(status_code=503, detail="Failed to fetch TON balance")
     try:
-        supabase_service.table("users").update({"wallet": wallet_address}).eq("user_id", user_id).execute()
+        await users_repo.set_wallet(user_id, wallet_address)
     except Exception as e:
         logger.error(f"Failed to update wallet: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update wallet")
     return {"wallet_address": wallet_address, "ton_balance": ton_balance, "spermbank_balance": 0}
 
-@app.get("/api/v1/referrals/invite-link")
-async def get_invite_link(user_id: int, user_data: dict = Depends(verify_authorization)):
+@app.get("/api/v1/referrals/invite-link", response_model=InviteLinkResponse)
+async def get_invite_link(user_id: int, request: Request, response: Response,
+                          user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     bot_name = settings.BOT_NAME
     invite_link = f"https://t.me/{bot_name}/lab?startapp=ref_{user_id}"
-    logger.info(f"Generated invite link for user_id {user_id}: {invite_link}")
+    # Ссылка меняется только вместе с BOT_NAME
+    tag = f'W/"{hashlib.sha1(invite_link.encode()).hexdigest()[:16]}"'
+    cache_control = f"private, max-age={settings.INVITE_LINK_MAX_AGE}"
+    if if_none_match(request, tag):
+        return not_modified(tag, cache_control)
+    logger.info("Generated invite link for user_id %s: %s", user_id, invite_link)
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = cache_control
     return {"url": invite_link}
 
 async def register_referral_logic(user_id: int, referrer_id: str, user_data: dict, user_id_fk: int):
-    logger.info(f"Registering referral: user_id={user_id}, referrer_id={referrer_id}")
+    logger.info("Registering referral: user_id=%s, referrer_id=%s", user_id, referrer_id)
 
     try:
-        referral_check = supabase.table("referrals").select("*").eq("referral_id", user_id_fk).execute()
-        if referral_check.data:
-            logger.info(f"User {user_id} already has a referrer")
-            return {"message": "User already has a referrer"}
-
         referrer_id_int = int(referrer_id)
-        if referrer_id_int == user_id:
-            logger.warning(f"User {user_id} cannot refer themselves")
-            return {"message": "Cannot refer yourself"}
-
-        referrer_user = supabase.table("users").select("id").eq("user_id", referrer_id_int).execute()
-        if not referrer_user.data:
-            logger.warning(f"Referrer {referrer_id} not found")
-            return {"message": "Invalid referrer"}
-
-        referrals_count = supabase.table("referrals").select("*").eq("referrer_id", referrer_user.data[0]["id"]).execute()
-        if len(referrals_count.data) >= 10:
-            logger.warning(f"Referrer {referrer_id} has reached max referrals (10)")
-            return {"message": "Referrer has reached maximum referral limit"}
-
-        referrer_response = supabase.table("offchain_points").select("*").eq("user_id", referrer_id_int).execute()
-        if referrer_response.data:
-            current_tickets = referrer_response.data[0]["tickets"]
-            try:
-                supabase_service.table("offchain_points").update({
-                    "tickets": current_tickets + 10
-                }).eq("user_id", referrer_id_int).execute()
-            except Exception as e:
-                logger.error(f"Failed to update referrer tickets: {str(e)}")
-                raise HTTPException(status_code=500, detail="Failed to update referrer points")
-
-            referrer_user_id = referrer_user.data[0]["id"]
-            try:
-                supabase_service.table("referrals").insert({
-                    "referrer_id": referrer_user_id,
-                    "referral_id": user_id_fk
-                }).execute()
-            except Exception as e:
-                logger.error(f"Failed to insert referral: {str(e)}")
-                raise HTTPException(status_code=500, detail="Failed to register referral")
-            logger.info(f"Added 10 tickets to referrer {referrer_id}")
-        else:
-            logger.warning(f"Referrer {referrer_id} not found")
-
-        logger.info(f"Referral registered successfully for user_id {user_id}")
-        return {"message": "Referral registered successfully"}
-    except Exception as e:
-        logger.error(f"Error in register_referral_logic: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-
-@app.post("/api/v1/referrals/register")
-async def register_referral(data: dict, user_data: dict = Depends(verify_authorization)):
+    except (TypeError, ValueError):
+        logger.warning(f"Referrer {referrer_id} not found")
+        return {"message": "Invalid referrer"}
+    if referrer_id_int == user_id:
+        logger.warning(f"User {user_id} cannot refer themselves")
+        return {"message": "Cannot refer yourself"}
+
+    # Проверки и начисление выполняет фоновая очередь (без lifespan — сразу в запросе)
+    if not await referral_queue.submit(user_id, referrer_id_int, user_id_fk):
+        logger.info("Referral for user_id %s is already registered", user_id)
+        return {"message": "Referral already registered"}
+    return {"message": "Referral registration queued"}
+
+@app.post("/api/v1/referrals/register", response_model=MessageResponse)
+async def register_referral(data: RegisterReferralRequest, user_data: dict = Depends(verify_authorization)):
     user_id = user_data["user_id"]
-    referrer_id = data.get("referrer_id")
+    referrer_id = data.referrer_id
     
-    user_response = supabase.table("users").select("id").eq("user_id", user_id).execute()
-    if not user_response.data:
+    user_id_fk = await users_repo.get_id(user_id)
+    if not user_id_fk:
         raise HTTPException(status_code=404, detail="User not found")
-    user_id_fk = user_response.data[0]["id"]
 
     return await register_referral_logic(user_id, referrer_id, user_data, user_id_fk)
 
-@app.get("/api/v1/referrals")
-async def get_referrals(user_id: int, user_data: dict = Depends(verify_authorization)):
+@app.get("/api/v1/admin/referrals/queue", response_model=ReferralQueueStats, dependencies=[Depends(verify_admin)])
+async def get_referral_queue_stats():
+    return {**referral_queue.stats(), "dead_letters": referral_queue.dead_letters()}
+
+# Текущая энергия нескольких пользователей одним проходом (поддержка, разбор жалоб)
+@app.get("/api/v1/admin/energy", response_model=AdminEnergyResponse, dependencies=[Depends(verify_admin)])
+async def get_energy_batch(user_id: List[int] = Query([], max_length=settings.LEADERBOARD_MAX_LIMIT)):
+    current_time = datetime.now(timezone.utc)
+    energy = {}
+    missing = []
+    for uid in dict.fromkeys(user_id):
+        state = tap_aggregator.cached(uid)
+        if state is not None:
+            energy[uid] = state.energy_at(current_time)
+        else:
+            missing.append(uid)
+    rows = list((await points_repo.get_many(missing)).values()) if missing else []
+    energy.update(zip((row["user_id"] for row in rows), current_energy_batch(rows, current_time)))
+    return {"energy": energy}
+
+@metrics.registry.collector
+def collect_runtime_stats():
+    caches = {"points": points_repo.cache, "tasks": tasks_repo.cache,
+              "referrals": referrals_repo.first_page_cache, "auth": identity_cache, "etag": etags.versions,
+              "idempotency": idempotency_store.responses}
+    yield "cache_entries", "Entries held by in-process caches.", [({"cache": n}, len(c)) for n, c in caches.items()]
+    yield "cache_hits", "Cache hits since start.", [({"cache": n}, c.hits) for n, c in caches.items()]
+    yield "cache_misses", "Cache misses since start.", [({"cache": n}, c.misses) for n, c in caches.items()]
+    queue = referral_queue.stats()
+    yield "referral_queue_depth", "Referral jobs waiting to be credited.", [({}, queue["depth"])]
+    yield "referral_queue_lag_seconds", "Age of the oldest queued referral job.", [({}, queue["lag_seconds"])]
+    yield "referral_queue_dead_letters", "Referral jobs that exhausted their retries.", [({}, queue["dead_letter"])]
+    yield "tap_pending_users", "Users with taps not yet written to the database.", [({}, len(tap_aggregator.pending_hearts()))]
+    yield "leaderboard_users", "Users ranked on the in-memory leaderboard.", [({}, len(leaderboard.boards["points"]))]
+    yield "push_connections", "Open push channel connections.", [({}, push_hub.stats()["connections"])]
+    idempotency = idempotency_store.stats()
+    yield "idempotency_requests", "Mutating requests with an Idempotency-Key by outcome.", [
+        ({"result": r}, idempotency[r]) for r in ("executed", "replayed", "coalesced", "conflicts")]
+    yield "idempotency_hit_rate", "Share of keyed requests answered without running the handler.", [
+        ({}, idempotency["hit_rate"])]
+    yield "bot_queue_depth", "Telegram updates waiting for a bot worker.", [({}, bot_dispatcher.stats()["depth"])]
+    yield "log_records_dropped", "Log records dropped because the log queue was full.", [({}, log.stats()["dropped"])]
+
+@app.get("/metrics", dependencies=[Depends(verify_metrics)])
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/referrals", response_model=ReferralsResponse)
+async def get_referrals(user_id: int, request: Request, response: Response, cursor: Optional[int] = None,
+                        limit: int = Query(settings.REFERRALS_PAGE_SIZE, ge=1, le=100),
+                        user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
+    tag, matched = etags.check(request, "referrals", user_id, variant=f"{cursor or 0}.{limit}")
+    if matched:
+        return not_modified(tag)
     try:
-        referrer = supabase.table("users").select("id").eq("user_id", user_id).execute()
-        if not referrer.data:
-            return {"referrals": []}
-        referrer_id = referrer.data[0]["id"]
-
-        referrals_response = supabase.table("referrals").select("referral_id").eq("referrer_id", referrer_id).execute()
-        if not referrals_response.data:
-            return {"referrals": []}
-
-        referral_ids = [r["referral_id"] for r in referrals_response.data]
-        users_response = supabase.table("users").select("user_id, username, first_name, photo_url").in_("id", referral_ids).execute()
-        
-        logger.info(f"Retrieved {len(users_response.data)} referrals for user_id {user_id}")
-        return {"referrals": users_response.data if users_response.data else []}
+        # Один запрос к представлению referral_list вместо трёх последовательных
+        referrals, next_cursor = await referrals_repo.list_page(user_id, limit, after=cursor)
+
+        logger.info("Retrieved %s referrals for user_id %s", len(referrals), user_id)
+        # Имена и аватарки рефералов меняются без начисления — не дольше срока кэша списка
+        etags.expire_in("referrals", user_id, settings.REFERRALS_CACHE_TTL)
+        response.headers["ETag"] = tag
+        response.headers["Cache-Control"] = REVALIDATE
+        return {"referrals": referrals, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Error in get_referrals: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/api/v1/add")
-async def add_points(data: dict, user_data: dict = Depends(verify_authorization)):
+@app.post("/api/v1/add", response_model=AddPointsResponse)
+async def add_points(data: AddPointsRequest, user_data: dict = Depends(verify_authorization)):
     user_id = user_data["user_id"]
-    points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-    if not points_response.data:
-        raise HTTPException(status_code=404, detail="User points not found")
-    current_points = points_response.data[0]["points"]
-    current_tickets = points_response.data[0]["tickets"]
     try:
-        supabase_service.table("offchain_points").update({
-            "points": current_points + 1000
-        }).eq("user_id", user_id).execute()
+        balance = await ledger.increment(user_id, points=1000)
     except Exception as e:
         logger.error(f"Failed to update points: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update points")
-    return {"points": {"points": current_points + 1000, "tickets": current_tickets}}
+    if balance is None:
+        raise HTTPException(status_code=404, detail="User points not found")
+    leaderboard.update(user_id, points=balance.points)
+    return {"points": {"points": balance.points, "tickets": balance.tickets}}
 
-@app.post("/api/v1/mini_tap")
+@app.post("/api/v1/mini_tap", response_model=MiniTapResponse)
 async def mini_tap(user_data: dict = Depends(verify_authorization)):
     user_id = user_data["user_id"]
-    logger.info(f"Processing mini tap for user_id: {user_id}")
+    logger.info("Processing mini tap for user_id: %s", user_id)
 
     try:
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
-            raise HTTPException(status_code=404, detail="User points not found")
-        
-        user_points = points_response.data[0]
-        current_energy = user_points["energy"]
-        current_hearts = user_points["hearts"]
-        max_energy = user_points["max_energy"]
-        last_update = user_points["last_energy_update"]
-
-        # Проверяем и корректируем last_energy_update, если он некорректен
-        if not last_update or last_update == "now()":
-            last_update = datetime.now(timezone.utc).isoformat()
-            supabase_service.table("offchain_points").update({
-                "last_energy_update": last_update
-            }).eq("user_id", user_id).execute()
-            logger.warning(f"Corrected invalid last_energy_update for user_id: {user_id}")
-
-        # Преобразуем last_update в datetime
-        try:
-            last_update_time = datetime.fromisoformat(last_update.replace("Z", "+00:00"))
-        except ValueError:
-            last_update_time = datetime.now(timezone.utc) - timedelta(minutes=5)  # Даём 5 минут энергии
-            last_update = last_update_time.isoformat()
-            supabase_service.table("offchain_points").update({
-                "last_energy_update": last_update
-            }).eq("user_id", user_id).execute()
-            logger.warning(f"Invalid last_energy_update format corrected for user_id: {user_id}")
-
-        # Расчёт восстановления энергии
-        current_time = datetime.now(timezone.utc)
-        elapsed_minutes = (current_time - last_update_time).total_seconds() / 60
-        energy_to_restore = int(elapsed_minutes / 5)  # +1 энергия каждые 5 минут
-        restored_energy = min(max_energy, current_energy + energy_to_restore)
-
-        # Проверяем энергию перед тапом
-        if restored_energy < 1:
-            raise HTTPException(status_code=400, detail="Not enough energy")
-
-        # Выполняем тап
-        new_energy = restored_energy - 1
-        new_hearts = current_hearts + 1
-
-        # Обновляем данные
-        supabase_service.table("offchain_points").update({
-            "hearts": new_hearts,
-            "energy": new_energy,
-            "last_energy_update": current_time.isoformat()
-        }).eq("user_id", user_id).execute()
-        
-        logger.info(f"Mini tap: user_id={user_id}, hearts={new_hearts}, energy={new_energy}, restored={restored_energy}")
+        # Тап применяется к кэшированному состоянию, запись в БД — отложенная
+        state = await tap_aggregator.tap(user_id)
+        leaderboard.update(user_id, hearts=state.hearts)
+        push_hub.publish(user_id, "balance", {"hearts": state.hearts})
+        push_hub.publish_energy(user_id, state.energy, state.max_energy, state.last_energy_update)
+
+        logger.info("Mini tap: user_id=%s, hearts=%s, energy=%s", user_id, state.hearts, state.energy)
         return {
             "message": "Mini tap successful",
-            "hearts": new_hearts,
-            "energy": new_energy
+            "hearts": state.hearts,
+            "energy": state.energy
         }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error in mini_tap: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Push-канал вместо опроса: первое сообщение клиента — "tma <initData>", после него сервер
+# присылает снимок состояния и дальше события balance, energy, claim, tasks, referrals
+@app.websocket("/api/v1/ws")
+async def push_channel(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        credential = await asyncio.wait_for(websocket.receive_text(), settings.PUSH_AUTH_TIMEOUT)
+        user_id = authenticate(credential)["user_id"]
+    except HTTPException as e:
+        await websocket.close(code=4401, reason=e.detail)
+        return
+    except (asyncio.TimeoutError, WebSocketDisconnect):
+        await websocket.close(code=4408)
+        return
+
+    # Подписываемся до чтения снимка, чтобы не пропустить изменения во время чтения
+    subscriber = push_hub.subscribe(user_id)
+    if subscriber is None:
+        await websocket.close(code=1013, reason="Too many connections")
+        return
+    sender = None
+    try:
+        user_points = await points_repo.get(user_id)
+        if not user_points:
+            await websocket.close(code=4404, reason="User points not found")
+            return
+        now = datetime.now(timezone.utc)
+        next_claim_time = next_claim_at(user_points["last_claim_date"], now)
+        state = tap_aggregator.cached(user_id)
+        await websocket.send_text(dumps({
+            "type": "state",
+            "points": user_points["points"],
+            "tickets": user_points["tickets"],
+            "hearts": state.hearts if state else user_points["hearts"],
+            "streak": user_points["claim_streak"],
+            "nextClaimTimestamp": next_claim_time.isoformat() if next_claim_time else None
+        }))
+        if state is not None:
+            push_hub.publish_energy(user_id, state.energy, state.max_energy, state.last_energy_update)
+        else:
+            last_update, _ = parse_energy_timestamp(user_points["last_energy_update"], now)
+            push_hub.publish_energy(user_id, user_points["energy"], user_points["max_energy"], last_update)
+
+        sender = asyncio.create_task(send_push_events(websocket, subscriber))
+        while True:
+            # Клиент может присылать "ping" для проверки соединения
+            if await websocket.receive_text() == "ping":
+                subscriber.push("pong", {})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in push_channel: {str(e)}")
+        await websocket.close(code=1011)
+    finally:
+        if sender is not None:
+            sender.cancel()
+            # Забираем результат: ошибка отправки в закрытый сокет не должна всплыть как "never retrieved"
+            await asyncio.gather(sender, return_exceptions=True)
+        push_hub.unsubscribe(subscriber)
+
+async def send_push_events(websocket: WebSocket, subscriber):
+    while True:
+        for event in await subscriber.next_events():
+            await websocket.send_text(dumps(event))
+
+# Лутбоксы: каталог с шансами и открытие за билеты (по одному или пачкой)
+@app.get("/api/v1/lootboxes", response_model=LootboxCatalogResponse)
+async def get_lootboxes():
+    return {"lootboxes": [
+        {"id": box.id, "title": box.title, "price": box.price, "rewards": box.odds()}
+        for box in lootbox_engine.catalog.values()
+    ]}
+
+@app.post("/api/v1/lootboxes/{lootbox_id}/open", response_model=LootboxOpenResponse)
+async def open_lootbox(lootbox_id: str, count: int = Query(1, ge=1, le=settings.LOOTBOX_MAX_BATCH),
+                       user_data: dict = Depends(verify_authorization)):
+    user_id = user_data["user_id"]
+    try:
+        result = await lootbox_engine.open(user_id, lootbox_id, count)
+        leaderboard.update(user_id, points=result.points)
+        push_hub.publish(user_id, "balance", {"points": result.points, "tickets": result.tickets})
+
+        logger.info("Opened %s x %s for user_id %s", count, lootbox_id, user_id)
+        return {
+            "lootbox_id": lootbox_id,
+            "rewards": [reward.as_dict() for reward in result.rewards],
+            "points": result.points,
+            "tickets": result.tickets
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error in open_lootbox: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Таблица лидеров по очкам или сердцам
+@app.get("/api/v1/leaderboard/{board}", response_model=LeaderboardResponse)
+async def get_leaderboard(board: Literal[BOARDS], offset: int = Query(0, ge=0),
+                          limit: int = Query(10, ge=1, le=settings.LEADERBOARD_MAX_LIMIT),
+                          user_data: dict = Depends(verify_authorization)):
+    if not leaderboard.ready:
+        raise HTTPException(status_code=503, detail="Leaderboard is loading")
+    entries = leaderboard.top(board, limit, offset)
+    return {
+        "board": board,
+        "total": len(leaderboard.boards[board]),
+        "entries": [{"rank": e.rank, "user_id": e.user_id, "score": e.score} for e in entries]
+    }
+
+@app.get("/api/v1/leaderboard/{board}/rank/{user_id}", response_model=LeaderboardRankResponse)
+async def get_leaderboard_rank(board: Literal[BOARDS], user_id: int, around: int = Query(5, ge=0, le=50),
+                               user_data: dict = Depends(verify_authorization)):
+    if user_id != user_data["user_id"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if not leaderboard.ready:
+        raise HTTPException(status_code=503, detail="Leaderboard is loading")
+    neighbours = leaderboard.around(board, user_id, around)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="User is not ranked")
+    entry = leaderboard.boards[board].rank(user_id)
+    return {
+        "board": board,
+        "total": len(leaderboard.boards[board]),
+        "rank": entry.rank,
+        "score": entry.score,
+        "neighbours": [{"rank": e.rank, "user_id": e.user_id, "score": e.score} for e in neighbours]
+    }
+
 # Обновление энергии
-@app.get("/api/v1/update_energy/{user_id}")
+@app.get("/api/v1/update_energy/{user_id}", response_model=EnergyResponse)
 async def update_energy(user_id: int, user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
     try:
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
-            raise HTTPException(status_code=404, detail="User points not found")
-        
-        user_points = points_response.data[0]
-        current_energy = user_points["energy"]
-        max_energy = user_points["max_energy"]
-        last_update = user_points["last_energy_update"]
-
         current_time = datetime.now(timezone.utc)
-        last_update_time = datetime.fromisoformat(last_update.replace("Z", "+00:00"))
-        elapsed_minutes = (current_time - last_update_time).total_seconds() / 60
-        energy_to_restore = int(elapsed_minutes / 5)
-        new_energy = min(max_energy, current_energy + energy_to_restore)
-
-        supabase_service.table("offchain_points").update({
-            "energy": new_energy,
-            "last_energy_update": current_time.isoformat()
-        }).eq("user_id", user_id).execute()
-
-        logger.info(f"Energy updated for user_id={user_id}, new_energy={new_energy}")
-        return {"energy": new_energy}
+        state = tap_aggregator.cached(user_id)
+        if state is not None:
+            # Пользователь недавно тапал: состояние в памяти свежее, чем в БД
+            energy = state.energy_at(current_time)
+        else:
+            user_points = await points_repo.get(user_id)
+            if not user_points:
+                raise HTTPException(status_code=404, detail="User points not found")
+            energy = row_energy(user_points, current_time)
+
+        # Энергия вычисляется при чтении — в БД ничего не пишем
+        return {"energy": energy}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error in update_energy: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Проверка статуса задания
-@app.get("/api/v1/task_status/{user_id}/{task_id}")
+@app.get("/api/v1/task_status/{user_id}/{task_id}", response_model=TaskStatus, response_model_exclude_none=True)
 async def get_task_status(user_id: int, task_id: str, user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     try:
-        task_response = supabase.table("completed_tasks").select("*").eq("user_id", user_id).eq("task_id", task_id).execute()
-        if task_response.data:
-            return {"completed": True, "completed_at": task_response.data[0]["completed_at"]}
+        completed_task = await tasks_repo.get(user_id, task_id)
+        if completed_task:
+            return {"completed": True, "completed_at": completed_task["completed_at"]}
         return {"completed": False}
     except Exception as e:
         logger.error(f"Error in get_task_status: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Статус всех заданий пользователя одним запросом
+@app.get("/api/v1/task_status/{user_id}", response_model=TasksStatusResponse, response_model_exclude_none=True)
+async def get_tasks_status(user_id: int, task_id: Optional[List[str]] = Query(None),
+                           user_data: dict = Depends(verify_authorization)):
+    if user_id != user_data["user_id"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    try:
+        completed = await tasks_repo.completed(user_id)
+        # Без task_id возвращаем все выполненные задания
+        task_ids = task_id if task_id is not None else list(completed)
+        return {"tasks": {
+            t: {"completed": True, "completed_at": completed[t]} if t in completed else {"completed": False}
+            for t in task_ids
+        }}
+    except Exception as e:
+        logger.error(f"Error in get_tasks_status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 # Выполнение задания и начисление очков
-@app.post("/api/v1/complete_task/{user_id}/{task_id}")
+@app.post("/api/v1/complete_task/{user_id}/{task_id}", response_model=CompleteTaskResponse)
 async def complete_task(user_id: int, task_id: str, user_data: dict = Depends(verify_authorization)):
     if user_id != user_data["user_id"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     try:
-        # Проверяем, выполнил ли пользователь задание
-        task_response = supabase.table("completed_tasks").select("*").eq("user_id", user_id).eq("task_id", task_id).execute()
-        if task_response.data:
+        # Уже выполненное задание отклоняем по кэшу, без обращения к БД
+        if tasks_repo.known_completed(user_id, task_id):
             raise HTTPException(status_code=400, detail="Task already completed")
 
-        # Получаем текущие очки пользователя
-        points_response = supabase.table("offchain_points").select("*").eq("user_id", user_id).execute()
-        if not points_response.data:
+        # Отмечаем задание и начисляем 1000 $LABS (Airdrop Points) одной транзакцией
+        result = await ledger.complete_task(user_id, task_id, points=1000)
+        if result is None:
             raise HTTPException(status_code=404, detail="User points not found")
+        if not result.completed:
+            raise HTTPException(status_code=400, detail="Task already completed")
+        leaderboard.update(user_id, points=result.points)
+        push_hub.publish(user_id, "balance", {"points": result.points})
+        push_hub.publish(user_id, "tasks", {task_id: {"completed": True, "completed_at": result.completed_at}})
 
-        user_points = points_response.data[0]
-        current_points = user_points["points"]
-
-        # Начисляем 1000 $LABS (Airdrop Points)
-        new_points = current_points + 1000
-
-        # Обновляем очки
-        supabase_service.table("offchain_points").update({
-            "points": new_points
-        }).eq("user_id", user_id).execute()
-
-        # Отмечаем задание как выполненное
-        supabase_service.table("completed_tasks").insert({
-            "user_id": user_id,
-            "task_id": task_id
-        }).execute()
-
-        logger.info(f"Task {task_id} completed for user_id {user_id}, new points: {new_points}")
+        logger.info("Task %s completed for user_id %s, new points: %s", task_id, user_id, result.points)
         return {
             "message": "Task completed successfully",
-            "points": new_points
+            "points": result.points
         }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error in complete_task: {str(e)}")
         if "duplicate key" in str(e).lower():
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import close_database
+from app.core.repository import points_repo
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+COLUMNS = ("user_id", "wallet", "points", "amount")
+
+
+@dataclass(slots=True)
+class Allocation:
+    user_id: int
+    wallet: str
+    points: int
+    amount: int  # минимальные единицы токена
+
+
+async def allocations(snapshot_id: int, after: Optional[int] = None, *, page_size: int,
+                      units_per_point: int) -> AsyncIterator[Allocation]:
+    """Allocations of a snapshot's holders with user_id > ``after``, in user_id order, read one page at a time."""
+    while True:
+        rows = await points_repo.scan_snapshot(snapshot_id, after, page_size)
+        for row in rows:
+            yield Allocation(row["user_id"], row["wallet"], row["points"], row["points"] * units_per_point)
+        if len(rows) < page_size:
+            return
+        after = rows[-1]["user_id"]
+
+
+def _render_ndjson(batch: List[Allocation]) -> str:
+    return "".join(
+        json.dumps({"user_id": a.user_id, "wallet": a.wallet, "points": a.points, "amount": a.amount},
+                   separators=(",", ":")) + "\n"
+        for a in batch
+    )
+
+
+def _render_csv(batch: List[Allocation]) -> str:
+    # Адрес кошелька приходит от клиента — экранирование оставляем модулю csv
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows((a.user_id, a.wallet, a.points, a.amount) for a in batch)
+    return buffer.getvalue()
+
+
+# Формат: (заголовок каждого файла-части, отрисовка пачки строк)
+FORMATS: Dict[str, Tuple[str, Callable[[List[Allocation]], str]]] = {
+    "ndjson": ("", _render_ndjson),
+    "csv": (",".join(COLUMNS) + "\n", _render_csv),
+}
+
+
+class _Part:
+    __slots__ = ("name", "file", "digest", "rows", "points", "amount", "last_user_id")
+
+    def __init__(self, out_dir: str, name: str, header: str):
+        self.name = name
+        self.file: BinaryIO = open(os.path.join(out_dir, name), "wb")
+        self.digest = hashlib.sha256()
+        self.rows = self.points = self.amount = 0
+        self.last_user_id: Optional[int] = None
+        if header:
+            self._write(header)
+
+    def _write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.file.write(data)
+        self.digest.update(data)
+
+    def append(self, batch: List[Allocation], render: Callable[[List[Allocation]], str]) -> None:
+        self._write(render(batch))
+        self.rows += len(batch)
+        self.points += sum(a.points for a in batch)
+        self.amount += sum(a.amount for a in batch)
+        self.last_user_id = batch[-1].user_id
+
+    def close(self) -> dict:
+        self.file.close()
+        return {"file": self.name, "rows": self.rows, "points": self.points, "amount": self.amount,
+                "last_user_id": self.last_user_id, "sha256": self.digest.hexdigest()}
+
+
+class AirdropSnapshot:
+    """Streams the airdrop allocation into chunked files under ``out_dir``.
+
+    A run first freezes the balances with take_airdrop_snapshot, which
+    copies every eligible holder in one statement, and records the
+    snapshot's id and time in manifest.json; the allocation is therefore
+    consistent as of that moment however long the export takes. The copy
+    is read page by page with keyset pagination over user_id and written
+    as it arrives, so memory use does not grow with the number of users.
+    Every ``chunk_rows`` rows close a part (part-00000.ndjson, ...); its
+    totals, last user_id and SHA-256 are added to the manifest, which is
+    replaced atomically after each part. A run that stops midway resumes
+    the same snapshot from the manifest's cursor and rewrites only the
+    unfinished part. The snapshot checksum is the SHA-256 of the parts'
+    digests in order.
+    """
+
+    def __init__(self, out_dir: str, fmt: str = "ndjson", *, chunk_rows: int, page_size: int,
+                 min_points: int, units_per_point: int):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.page_size = page_size
+        self.min_points = min_points
+        self.units_per_point = units_per_point
+
+    def _params(self) -> dict:
+        return {"format": self.fmt, "chunk_rows": self.chunk_rows, "min_points": self.min_points,
+                "units_per_point": self.units_per_point}
+
+    def load_manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.out_dir, MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, manifest: dict) -> None:
+        path = os.path.join(self.out_dir, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _verify(self, manifest: dict) -> None:
+        for chunk in manifest["chunks"]:
+            digest = hashlib.sha256()
+            with open(os.path.join(self.out_dir, chunk["file"]), "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            if digest.hexdigest() != chunk["sha256"]:
+                raise ValueError(f"{chunk['file']} does not match its checksum in {MANIFEST}")
+
+    def _finish(self, manifest: dict, part: _Part) -> None:
+        chunk = part.close()
+        manifest["chunks"].append(chunk)
+        manifest["cursor"] = chunk["last_user_id"]
+        self._save(manifest)
+        logger.info("Airdrop snapshot: %s written, %s rows, cursor %s", chunk["file"], chunk["rows"], manifest["cursor"])
+
+    async def run(self, after: Optional[int] = None) -> dict:
+        """Writes the snapshot of holders with user_id > ``after``, or resumes the one in ``out_dir``."""
+        manifest = self.load_manifest()
+        if manifest is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            snapshot = await points_repo.take_airdrop_snapshot(self.min_points)
+            manifest = {**self._params(), "snapshot": snapshot, "after": after, "cursor": after, "chunks": [],
+                        "complete": False}
+            # Сразу в манифест: сбой до первой части возобновит этот же снимок, а не снимет новый
+            self._save(manifest)
+            logger.info("Airdrop snapshot %s taken at %s: %s holders", snapshot["snapshot_id"],
+                        snapshot["taken_at"], snapshot["holders"])
+        else:
+            if any(manifest.get(k) != v for k, v in self._params().items()):
+                raise ValueError(f"{self.out_dir} holds a snapshot with other parameters")
+            if manifest["complete"]:
+                return manifest
+            self._verify(manifest)
+            logger.info("Airdrop snapshot: resuming after user_id %s", manifest["cursor"])
+
+        header, render = FORMATS[self.fmt]
+        part: Optional[_Part] = None
+        batch: List[Allocation] = []
+        try:
+            async for allocation in allocations(manifest["snapshot"]["snapshot_id"], manifest["cursor"],
+                                                page_size=self.page_size, units_per_point=self.units_per_point):
+                if part is None:
+                    part = _Part(self.out_dir, f"part-{len(manifest['chunks']):05d}.{self.fmt}", header)
+                batch.append(allocation)
+                # Пачка не больше страницы и не переходит границу части
+                if len(batch) >= min(self.page_size, self.chunk_rows - part.rows):
+                    part.append(batch, render)
+                    batch = []
+                    if part.rows >= self.chunk_rows:
+                        self._finish(manifest, part)
+                        part = None
+            if batch:
+                part.append(batch, render)
+            if part is not None:
+                self._finish(manifest, part)
+                part = None
+        finally:
+            # Незаконченная часть не попадает в манифест и будет переписана при возобновлении
+            if part is not None:
+                part.file.close()
+
+        chunks = manifest["chunks"]
+        rows, points = sum(c["rows"] for c in chunks), sum(c["points"] for c in chunks)
+        snapshot = manifest["snapshot"]
+        if manifest["after"] is None and (rows, points) != (snapshot["holders"], snapshot["points"]):
+            raise ValueError(f"{self.out_dir} does not add up to airdrop snapshot {snapshot['snapshot_id']}")
+        manifest.update(
+            complete=True,
+            rows=rows,
+            points=points,
+            amount=sum(c["amount"] for c in chunks),
+            sha256=hashlib.sha256("".join(c["sha256"] for c in chunks).encode()).hexdigest()
+        )
+        self._save(manifest)
+        logger.info("Airdrop snapshot complete: %s rows in %s parts", manifest["rows"], len(chunks))
+        return manifest
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    """Exports the snapshot; run from backend/:  python -m app.services.airdrop OUT_DIR [--format csv]"""
+    parser = argparse.ArgumentParser(description="Export the airdrop allocation snapshot of offchain_points")
+    parser.add_argument("out_dir", help="directory for the parts and manifest.json; rerun with it to resume")
+    parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    parser.add_argument("--after", type=int, help="start after this user_id")
+    parser.add_argument("--chunk-rows", type=int, default=settings.AIRDROP_CHUNK_ROWS)
+    parser.add_argument("--page-size", type=int, default=settings.AIRDROP_PAGE_SIZE)
+    parser.add_argument("--min-points", type=int, default=settings.AIRDROP_MIN_POINTS)
+    parser.add_argument("--units-per-point", type=int, default=settings.AIRDROP_UNITS_PER_POINT)
+    args = parser.parse_args(argv)
+
+    snapshot = AirdropSnapshot(args.out_dir, args.format, chunk_rows=args.chunk_rows, page_size=args.page_size,
+                               min_points=args.min_points, units_per_point=args.units_per_point)
+    try:
+        manifest = await snapshot.run(args.after)
+    finally:
+        await close_database()
+    print(json.dumps({"snapshot_id": manifest["snapshot"]["snapshot_id"], "taken_at": manifest["snapshot"]["taken_at"],
+                      **{k: manifest[k] for k in ("rows", "points", "amount", "sha256")}}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
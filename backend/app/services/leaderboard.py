@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.repository import points_repo
+from app.services.tap_aggregator import tap_aggregator
+from app.utils.ranking import RankIndex, score_key, split_key
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("points", "hearts")
+
+
+@dataclass(slots=True)
+class RankEntry:
+    rank: int
+    user_id: int
+    score: int
+
+
+class Board:
+    """Scores of one leaderboard with an order-statistics index over them."""
+
+    def __init__(self, scores: Optional[Dict[int, int]] = None):
+        self.scores: Dict[int, int] = scores or {}
+        self.index = RankIndex(score_key(score, user_id) for user_id, score in self.scores.items())
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def set(self, user_id: int, score: int) -> None:
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self.index.remove(score_key(old, user_id))
+        self.scores[user_id] = score
+        self.index.add(score_key(score, user_id))
+
+    def rank(self, user_id: int) -> Optional[RankEntry]:
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return RankEntry(self.index.index(score_key(score, user_id)) + 1, user_id, score)
+
+    def entries(self, start: int, stop: int) -> List[RankEntry]:
+        """Entries at 0-based positions [start, stop)."""
+        start = max(start, 0)
+        return [RankEntry(start + i + 1, *split_key(key)) for i, key in enumerate(self.index.slice(start, stop))]
+
+
+class Leaderboard:
+    """In-memory ranks by points and hearts.
+
+    Boards are bulk-loaded from offchain_points on startup and rebuilt every
+    ``reconcile_interval`` seconds; between reloads the API handlers push
+    every balance change through ``update``, so ranks are current for
+    writes made by this process.
+    """
+
+    def __init__(self, page_size: int, reconcile_interval: float, enabled: bool = True):
+        self.page_size = page_size
+        self.reconcile_interval = reconcile_interval
+        self.enabled = enabled
+        self.boards: Dict[str, Board] = {name: Board() for name in BOARDS}
+        self.ready = False
+        self.loaded_at: Optional[float] = None
+        self._touched: Optional[Set[int]] = None
+        self._reload_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def update(self, user_id: int, points: Optional[int] = None, hearts: Optional[int] = None) -> None:
+        if points is not None:
+            self.boards["points"].set(user_id, points)
+        if hearts is not None:
+            self.boards["hearts"].set(user_id, hearts)
+        if self._touched is not None:
+            self._touched.add(user_id)
+
+    def top(self, board: str, limit: int, offset: int = 0) -> List[RankEntry]:
+        return self.boards[board].entries(offset, offset + limit)
+
+    def around(self, board: str, user_id: int, radius: int) -> Optional[List[RankEntry]]:
+        """The user's entry with up to ``radius`` neighbours on each side; None if the user is not ranked."""
+        entry = self.boards[board].rank(user_id)
+        if entry is None:
+            return None
+        return self.boards[board].entries(entry.rank - 1 - radius, entry.rank + radius)
+
+    async def reload(self) -> int:
+        """Rebuilds both boards from the database; returns the number of users loaded."""
+        async with self._reload_lock:
+            self._touched = set()
+            try:
+                scores: Dict[str, Dict[int, int]] = {name: {} for name in BOARDS}
+                after = None
+                while True:
+                    rows = await points_repo.scan_scores(after, self.page_size)
+                    for row in rows:
+                        scores["points"][row["user_id"]] = row["points"] or 0
+                        scores["hearts"][row["user_id"]] = row["hearts"] or 0
+                    if len(rows) < self.page_size:
+                        break
+                    after = rows[-1]["user_id"]
+
+                # Изменения во время загрузки и ещё не записанные тапы новее того, что прочитано из БД
+                for user_id in self._touched:
+                    for name in BOARDS:
+                        live = self.boards[name].scores.get(user_id)
+                        if live is not None:
+                            scores[name][user_id] = live
+                for user_id, hearts in tap_aggregator.pending_hearts().items():
+                    scores["hearts"][user_id] = hearts
+
+                self.boards = {name: Board(scores[name]) for name in BOARDS}
+            finally:
+                self._touched = None
+            self.ready = True
+            self.loaded_at = time.time()
+            logger.info("Leaderboard loaded %s users", len(self.boards["points"]))
+            return len(self.boards["points"])
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Error in leaderboard reload: {str(e)}")
+            await asyncio.sleep(self.reconcile_interval)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "users": len(self.boards["points"]),
+            "loaded_at": self.loaded_at,
+        }
+
+
+leaderboard = Leaderboard(
+    page_size=settings.LEADERBOARD_LOAD_PAGE,
+    reconcile_interval=settings.LEADERBOARD_RECONCILE_INTERVAL,
+    enabled=settings.LEADERBOARD_ENABLED,
+)
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.ledger import ledger
+from app.utils.alias import AliasTable
+
+logger = logging.getLogger(__name__)
+
+# Таблицы наград; id лутбоксов совпадают с frontend/lootboxes.json
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "lootboxes.json")
+
+
+@dataclass(slots=True, frozen=True)
+class Reward:
+    id: str
+    rarity: str
+    weight: int
+    points: int = 0
+    tickets: int = 0
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "rarity": self.rarity, "points": self.points, "tickets": self.tickets}
+
+
+@dataclass(slots=True)
+class Lootbox:
+    id: str
+    title: str
+    price: int
+    rewards: List[Reward]
+    table: AliasTable
+
+    def odds(self) -> List[dict]:
+        total = sum(r.weight for r in self.rewards)
+        return [{**r.as_dict(), "chance": r.weight / total} for r in self.rewards]
+
+
+@dataclass(slots=True)
+class OpenResult:
+    lootbox_id: str
+    rewards: List[Reward]
+    points: int
+    tickets: int
+
+
+def load_catalog(path: str) -> Dict[str, Lootbox]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    catalog = {}
+    for lootbox_id, spec in data.items():
+        rewards = [Reward(**reward) for reward in spec["rewards"]]
+        catalog[lootbox_id] = Lootbox(
+            id=lootbox_id,
+            title=spec["title"],
+            price=spec["price"],
+            rewards=rewards,
+            table=AliasTable([r.weight for r in rewards])
+        )
+    return catalog
+
+
+class LootboxEngine:
+    """Opens lootboxes on the server.
+
+    The catalog and an alias table per lootbox are built once, so a draw is
+    O(1) regardless of the number of rewards. Rewards are drawn first and
+    then spent and credited in one database call (see
+    supabase/migrations/*_lootboxes.sql): the price is only taken if the
+    user has enough tickets, and the outcome is recorded with it. Pass
+    ``seed`` for reproducible draws.
+    """
+
+    def __init__(self, catalog: Dict[str, Lootbox], max_batch: int, seed: Optional[int] = None):
+        self.catalog = catalog
+        self.max_batch = max_batch
+        self.rng = random.Random(seed)
+
+    def draw(self, lootbox: Lootbox, count: int = 1) -> List[Reward]:
+        rewards = lootbox.rewards
+        return [rewards[i] for i in lootbox.table.draw_many(self.rng, count)]
+
+    async def open(self, user_id: int, lootbox_id: str, count: int = 1) -> OpenResult:
+        lootbox = self.catalog.get(lootbox_id)
+        if lootbox is None:
+            raise HTTPException(status_code=404, detail="Lootbox not found")
+        if not 1 <= count <= self.max_batch:
+            raise HTTPException(status_code=400, detail=f"count must be between 1 and {self.max_batch}")
+
+        rewards = self.draw(lootbox, count)
+        drawn: Dict[str, int] = {}
+        for reward in rewards:
+            drawn[reward.id] = drawn.get(reward.id, 0) + 1
+        result = await ledger.open_lootboxes(
+            user_id,
+            lootbox_id,
+            cost=lootbox.price * count,
+            points=sum(r.points for r in rewards),
+            tickets=sum(r.tickets for r in rewards),
+            rewards=drawn
+        )
+        if result is None:
+            raise HTTPException(status_code=404, detail="User points not found")
+        if not result.opened:
+            raise HTTPException(status_code=400, detail="Not enough tickets")
+        return OpenResult(lootbox_id, rewards, result.points, result.tickets)
+
+
+lootbox_engine = LootboxEngine(
+    load_catalog(settings.LOOTBOX_CATALOG_PATH or DEFAULT_CATALOG_PATH),
+    max_batch=settings.LOOTBOX_MAX_BATCH,
+    seed=settings.LOOTBOX_SEED,
+)
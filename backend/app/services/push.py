@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One open push connection.
+
+    Events are state snapshots: a new event of a type is merged into the
+    pending one, so a slow or idle client holds at most one event per type
+    instead of a growing queue.
+    """
+
+    __slots__ = ("user_id", "pending", "ready")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.pending: Dict[str, dict] = {}
+        self.ready = asyncio.Event()
+
+    def push(self, event: str, payload: dict) -> None:
+        current = self.pending.get(event)
+        self.pending[event] = {**current, **payload} if current else payload
+        self.ready.set()
+
+    async def next_events(self) -> List[dict]:
+        await self.ready.wait()
+        self.ready.clear()
+        events = [{"type": event, **payload} for event, payload in self.pending.items()]
+        self.pending.clear()
+        return events
+
+
+@dataclass(slots=True)
+class EnergyAnchor:
+    energy: int
+    max_energy: int
+    last_update: float  # unix time
+    sent: int = -1
+
+    def at(self, now: float, regen_seconds: int) -> int:
+        if self.energy >= self.max_energy:
+            return self.energy
+        return min(self.max_energy, self.energy + max(0, int((now - self.last_update) // regen_seconds)))
+
+    def next_at(self, now: float, regen_seconds: int) -> Optional[float]:
+        if self.at(now, regen_seconds) >= self.max_energy:
+            return None
+        restored = max(0, int((now - self.last_update) // regen_seconds))
+        return self.last_update + (restored + 1) * regen_seconds
+
+
+class PushHub:
+    """Per-user event fan-out for push connections.
+
+    Handlers publish balance, claim and task changes through ``publish``;
+    users without an open connection cost one dict lookup. Energy is
+    regenerated server-side: one ticker keeps a heap of the next
+    regeneration moment of every connected user who is below max energy and
+    sends the new value when it comes, so idle connections need no timers
+    of their own.
+    """
+
+    def __init__(self, max_connections: int, max_per_user: int, regen_seconds: int, tick_batch: int = 1000):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.regen_seconds = regen_seconds
+        self.tick_batch = tick_batch
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._connections = 0
+        self._energy: Dict[int, EnergyAnchor] = {}
+        self._ticks: List[Tuple[float, int]] = []
+        self._next_tick: Dict[int, float] = {}
+        self._rescheduled = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, user_id: int) -> Optional[Subscriber]:
+        """Registers a connection; None when the worker or the user is at the connection limit."""
+        subscribers = self._subscribers.get(user_id)
+        if self._connections >= self.max_connections or (subscribers and len(subscribers) >= self.max_per_user):
+            return None
+        subscriber = Subscriber(user_id)
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+        self._connections += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if not subscribers or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        self._connections -= 1
+        if not subscribers:
+            del self._subscribers[subscriber.user_id]
+            self._energy.pop(subscriber.user_id, None)
+            self._next_tick.pop(subscriber.user_id, None)
+
+    def is_connected(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def publish(self, user_id: int, event: str, payload: dict) -> None:
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscriber in subscribers:
+            subscriber.push(event, payload)
+
+    def publish_energy(self, user_id: int, energy: int, max_energy: int, last_update: datetime) -> None:
+        """Stores the user's energy anchor, sends the current value and schedules the next regeneration tick."""
+        if user_id not in self._subscribers:
+            return
+        anchor = EnergyAnchor(energy, max_energy, last_update.timestamp())
+        self._energy[user_id] = anchor
+        self._send_energy(user_id, anchor, time.time())
+
+    def _send_energy(self, user_id: int, anchor: EnergyAnchor, now: float) -> None:
+        energy = anchor.at(now, self.regen_seconds)
+        next_at = anchor.next_at(now, self.regen_seconds)
+        if energy != anchor.sent:
+            anchor.sent = energy
+            self.publish(user_id, "energy", {
+                "energy": energy,
+                "max_energy": anchor.max_energy,
+                "next_energy_at": datetime.fromtimestamp(next_at, timezone.utc).isoformat() if next_at else None
+            })
+        if next_at is None:
+            self._next_tick.pop(user_id, None)
+        elif self._next_tick.get(user_id) != next_at:
+            self._next_tick[user_id] = next_at
+            if not self._ticks or next_at < self._ticks[0][0]:
+                self._rescheduled.set()
+            heapq.heappush(self._ticks, (next_at, user_id))
+
+    def _due(self, now: float, limit: int = 0) -> bool:
+        """Sends energy for ticks due by ``now``, at most ``limit`` of them (0 — all); True if more are due."""
+        sent = 0
+        while self._ticks and self._ticks[0][0] <= now:
+            if limit and sent >= limit:
+                return True
+            due, user_id = heapq.heappop(self._ticks)
+            # Устаревшие записи (переназначенный тик, отключившийся пользователь) пропускаем
+            if self._next_tick.get(user_id) != due:
+                continue
+            del self._next_tick[user_id]
+            self._send_energy(user_id, self._energy[user_id], now)
+            sent += 1
+        # Куча копит устаревшие записи — пересобираем, когда их становится больше живых
+        if len(self._ticks) > 2 * len(self._next_tick) + 1024:
+            self._ticks = [(due, user_id) for user_id, due in self._next_tick.items()]
+            heapq.heapify(self._ticks)
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self._rescheduled.clear()
+                # Порциями, чтобы одновременные тики тысяч пользователей не блокировали цикл событий
+                while self._due(time.time(), self.tick_batch):
+                    await asyncio.sleep(0)
+                timeout = self._ticks[0][0] - time.time() if self._ticks else None
+                try:
+                    await asyncio.wait_for(self._rescheduled.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in push ticker: {str(e)}")
+                await asyncio.sleep(1.0)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._connections,
+            "users": len(self._subscribers),
+            "scheduled_ticks": len(self._next_tick),
+            "published": self.published,
+        }
+
+
+push_hub = PushHub(
+    max_connections=settings.PUSH_MAX_CONNECTIONS,
+    max_per_user=settings.PUSH_MAX_PER_USER,
+    regen_seconds=settings.ENERGY_REGEN_SECONDS,
+)
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.ledger import ledger
+from app.services.push import push_hub
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+REFERRAL_REWARD = 10
+MAX_REFERRALS = 10
+
+
+@dataclass(slots=True)
+class ReferralJob:
+    referrer_user_id: int
+    referral_id: int  # users.id приглашённого
+    user_id: int
+    enqueued_at: float
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.referrer_user_id, self.referral_id
+
+
+class ReferralQueue:
+    """In-process queue that credits referrals off the request path.
+
+    Workers take up to ``batch_size`` jobs at a time and apply them with one
+    credit_referrals RPC. Failed batches are retried with exponential
+    backoff; jobs that exhaust ``max_attempts`` go to the dead-letter list.
+    A (referrer, referral) pair is accepted once while pending or recently
+    done, and the database ignores repeats anyway. Without started workers
+    (lifespan not run) a job is credited inside the request instead. On
+    stop, jobs waiting out a backoff are queued again and drained with the
+    rest; whatever is still not credited goes to the dead-letter list.
+    """
+
+    def __init__(self, workers: int, batch_size: int, batch_wait: float, max_attempts: int, retry_delay: float,
+                 dead_letter_size: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: "asyncio.Queue[ReferralJob]" = asyncio.Queue()
+        self._pending: Set[Tuple[int, int]] = set()
+        self._done: TTLCache[str] = TTLCache(100_000, 3600.0)
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks: Dict[asyncio.Task, ReferralJob] = {}
+        self.dead_letter: Deque[ReferralJob] = deque(maxlen=dead_letter_size)
+        self.processed = 0
+        self.retries = 0
+        self.statuses: Dict[str, int] = {}
+        self.last_lag = 0.0
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # Повторы не ждут паузы: их задания возвращаются в очередь и дорабатываются вместе с остальными
+        for job in self._cancel_retries():
+            if self._tasks:
+                self._queue.put_nowait(job)
+            else:
+                self._dead_letter(job, "queue stopped during retry backoff")
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=settings.REFERRAL_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Referral queue stopped with {self._queue.qsize()} jobs left")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        # Принятое, но не зачисленное не теряется молча: в dead-letter и в лог
+        for job in self._cancel_retries():
+            self._dead_letter(job, "queue stopped during retry backoff")
+        while not self._queue.empty():
+            self._dead_letter(self._queue.get_nowait(), "queue stopped before the job ran")
+            self._queue.task_done()
+
+    def _cancel_retries(self) -> List[ReferralJob]:
+        # Задача, уже вернувшая задание в очередь, завершена — её задание не берём второй раз
+        jobs = [job for task, job in self._retry_tasks.items() if not task.done()]
+        for task in self._retry_tasks:
+            task.cancel()
+        self._retry_tasks.clear()
+        return jobs
+
+    async def submit(self, user_id: int, referrer_user_id: int, referral_id: int) -> bool:
+        """Returns False if this pair is already pending or was recently processed."""
+        key = (referrer_user_id, referral_id)
+        if key in self._pending or self._done.peek(key) is not None:
+            return False
+        self._pending.add(key)
+        job = ReferralJob(referrer_user_id, referral_id, user_id, time.time())
+        if not self._tasks:
+            # Без запущенных воркеров (lifespan не выполнялся) зачисляем в запросе
+            await self._process([job])
+        else:
+            self._queue.put_nowait(job)
+        return True
+
+    async def _next_batch(self) -> List[ReferralJob]:
+        batch = [await self._queue.get()]
+        if self._queue.empty() and self.batch_wait:
+            # Короткое окно, чтобы собрать всплеск заявок в один запрос
+            try:
+                await asyncio.sleep(self.batch_wait)
+            except asyncio.CancelledError:
+                # Взятое задание возвращаем в очередь, чтобы stop() его не потерял
+                self._queue.put_nowait(batch[0])
+                self._queue.task_done()
+                raise
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process(batch)
+            except asyncio.CancelledError:
+                # Остановлены посреди записи; БД игнорирует повторы, так что повторить их безопасно
+                for job in batch:
+                    self._dead_letter(job, "queue stopped while the job ran")
+                raise
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: List[ReferralJob]) -> None:
+        try:
+            results = await ledger.credit_referrals([job.key for job in batch], REFERRAL_REWARD, MAX_REFERRALS)
+        except Exception as e:
+            logger.error(f"Failed to credit {len(batch)} referrals: {str(e)}")
+            for job in batch:
+                self._retry(job, str(e))
+            return
+
+        now = time.time()
+        credits = {(result.referrer_user_id, result.referral_id): result for result in results}
+        for job in batch:
+            result = credits.get(job.key)
+            if result is None:
+                # Функция вернула не все пары — повторяем пропущенные, иначе они зависнут в _pending
+                self._retry(job, "no result from credit_referrals")
+                continue
+            status = result.status
+            self._pending.discard(job.key)
+            self._done.set(job.key, status)
+            self.processed += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.last_lag = now - job.enqueued_at
+            if status == "credited":
+                logger.info("Added %s tickets to referrer %s for user_id %s", REFERRAL_REWARD, job.referrer_user_id, job.user_id)
+                # Снимок, а не приращение: события одного типа у подписчика сливаются
+                push_hub.publish(job.referrer_user_id, "referrals",
+                                 {"tickets": result.tickets, "referral_count": result.referral_count})
+            else:
+                logger.info("Referral for user_id %s not credited: %s", job.user_id, status)
+
+    def _retry(self, job: ReferralJob, error: str) -> None:
+        job.attempts += 1
+        job.error = error
+        if job.attempts >= self.max_attempts:
+            self._dead_letter(job, error)
+            return
+        self.retries += 1
+        task = asyncio.create_task(self._requeue(job, self.retry_delay * 2 ** (job.attempts - 1)))
+        self._retry_tasks[task] = job
+        task.add_done_callback(lambda t: self._retry_tasks.pop(t, None))
+
+    def _dead_letter(self, job: ReferralJob, error: str) -> None:
+        job.error = error
+        self._pending.discard(job.key)
+        self.dead_letter.append(job)
+        logger.error(f"Referral {job.key} of user_id {job.user_id} moved to dead-letter list "
+                     f"after {job.attempts} attempts: {error}")
+
+    async def _requeue(self, job: ReferralJob, delay: float) -> None:
+        await asyncio.sleep(delay)
+        if self._tasks:
+            self._queue.put_nowait(job)
+        else:
+            await self._process([job])
+
+    def stats(self) -> dict:
+        oldest = min((job.enqueued_at for job in self._queue._queue), default=None)
+        return {
+            "depth": self._queue.qsize(),
+            "retrying": len(self._retry_tasks),
+            "lag_seconds": time.time() - oldest if oldest is not None else 0.0,
+            "last_lag_seconds": self.last_lag,
+            "processed": self.processed,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "dead_letter": len(self.dead_letter),
+        }
+
+    def dead_letters(self) -> List[dict]:
+        return [{
+            "referrer_user_id": job.referrer_user_id,
+            "referral_id": job.referral_id,
+            "user_id": job.user_id,
+            "attempts": job.attempts,
+            "error": job.error
+        } for job in self.dead_letter]
+
+
+referral_queue = ReferralQueue(
+    workers=settings.REFERRAL_WORKERS,
+    batch_size=settings.REFERRAL_BATCH_SIZE,
+    batch_wait=settings.REFERRAL_BATCH_WAIT,
+    max_attempts=settings.REFERRAL_MAX_ATTEMPTS,
+    retry_delay=settings.REFERRAL_RETRY_DELAY,
+    dead_letter_size=settings.REFERRAL_DEAD_LETTER_SIZE,
+)
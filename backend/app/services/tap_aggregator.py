@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.ledger import ledger
+from app.core.repository import points_repo
+from app.utils.energy import current_energy, parse_energy_timestamp, spend_energy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class TapState:
+    user_id: int
+    hearts: int
+    energy: int
+    max_energy: int
+    last_energy_update: datetime
+    touched: float = 0.0
+    pending: int = 0  # тапы, ещё не записанные в БД
+
+    def energy_at(self, now: datetime) -> int:
+        return current_energy(self.energy, self.last_energy_update, self.max_energy, now)
+
+
+class TapAggregator:
+    """Write-behind accumulator for mini taps.
+
+    Taps are applied to a cached per-user state and answered immediately;
+    dirty users are written to offchain_points once per flush window, or
+    sooner when the number of pending users reaches ``max_pending``. Only
+    the number of pending taps is written (the apply_taps RPC adds it and
+    re-checks energy in the database), so several workers or serverless
+    instances add up instead of overwriting each other. Without the
+    background flush task (lifespan not run, or the aggregator disabled)
+    every tap is written before it is answered.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int, state_ttl: float, enabled: bool = True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.state_ttl = state_ttl
+        self.enabled = enabled
+        self._states: Dict[int, TapState] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._dirty: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._early_flush: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Не отменяем цикл посреди сброса: он допишет текущий сброс и выйдет
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._early_flush is not None:
+            await self._early_flush
+            self._early_flush = None
+        await self.flush()
+
+    def cached(self, user_id: int) -> Optional[TapState]:
+        return self._states.get(user_id)
+
+    def pending_hearts(self) -> Dict[int, int]:
+        """Hearts of users whose taps are not written yet."""
+        return {u: self._states[u].hearts for u in self._dirty if u in self._states}
+
+    def mark_dirty(self, state: TapState) -> None:
+        state.touched = time.monotonic()
+        self._dirty.add(state.user_id)
+        # Досрочный сброс только один: пока он идёт, следующие тапы попадут в него или в очередной
+        if (len(self._dirty) >= self.max_pending and self._task is not None
+                and (self._early_flush is None or self._early_flush.done())):
+            self._early_flush = asyncio.create_task(self.flush())
+
+    async def _load(self, user_id: int) -> TapState:
+        state = self._states.get(user_id)
+        if state is not None:
+            return state
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            user_points = await points_repo.get(user_id)
+            if not user_points:
+                raise HTTPException(status_code=404, detail="User points not found")
+            last_update, malformed = parse_energy_timestamp(user_points["last_energy_update"], datetime.now(timezone.utc))
+            if malformed:
+                # Исправленное значение запишется вместе с первым тапом
+                logger.warning(f"Invalid last_energy_update for user_id: {user_id}")
+            state = TapState(
+                user_id=user_id,
+                hearts=user_points["hearts"],
+                energy=user_points["energy"],
+                max_energy=user_points["max_energy"],
+                last_energy_update=last_update,
+                touched=time.monotonic(),
+            )
+            self._states[user_id] = state
+            future.set_result(state)
+            return state
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # помечаем исключение как полученное
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def tap(self, user_id: int) -> TapState:
+        state = await self._load(user_id)
+        spent = spend_energy(state.energy, state.last_energy_update, state.max_energy, datetime.now(timezone.utc))
+
+        # Проверяем энергию перед тапом
+        if spent is None:
+            raise HTTPException(status_code=400, detail="Not enough energy")
+
+        state.energy, state.last_energy_update = spent
+        state.hearts += 1
+        state.pending += 1
+        self.mark_dirty(state)
+        if self._task is None:
+            await self.flush()
+        return state
+
+    async def _write(self, state: TapState) -> bool:
+        taps, state.pending = state.pending, 0
+        try:
+            result = await ledger.apply_taps(state.user_id, taps, settings.ENERGY_REGEN_SECONDS)
+        except BaseException as e:
+            # Тапы возвращаем и при отмене, иначе их не запишет ни один следующий сброс
+            state.pending += taps
+            self._dirty.add(state.user_id)
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Failed to flush taps for user_id {state.user_id}: {str(e)}")
+            return False
+        if result is None:
+            logger.warning(f"Dropped {taps} taps of user_id {state.user_id}: no offchain_points row")
+            self._states.pop(state.user_id, None)
+            return False
+        if result.applied < taps:
+            logger.warning(f"Database applied {result.applied} of {taps} taps for user_id {state.user_id}")
+        # Строку могли изменить другие экземпляры — берём её состояние плюс тапы, пришедшие во время записи
+        state.hearts = result.hearts + state.pending
+        if not state.pending:
+            state.energy = result.energy
+            state.last_energy_update = parse_energy_timestamp(result.last_energy_update, datetime.now(timezone.utc))[0]
+        return True
+
+    async def flush(self) -> int:
+        """Writes every dirty user once; returns the number of rows written."""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            states = [self._states[u] for u in dirty if u in self._states]
+            written = 0
+            for i in range(0, len(states), settings.DB_POOL_SIZE):
+                try:
+                    results = await asyncio.gather(*(self._write(s) for s in states[i:i + settings.DB_POOL_SIZE]))
+                except BaseException:
+                    # Отмена: записи, которые не успели начаться, тоже остаются грязными
+                    self._dirty.update(s.user_id for s in states[i:] if s.pending)
+                    raise
+                written += sum(results)
+            self._evict_idle()
+            if written:
+                logger.info("Flushed taps for %s users", written)
+            return written
+
+    def _evict_idle(self) -> None:
+        deadline = time.monotonic() - self.state_ttl
+        for user_id in [u for u, s in self._states.items() if s.touched < deadline and u not in self._dirty]:
+            del self._states[user_id]
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in tap aggregator flush: {str(e)}")
+
+
+tap_aggregator = TapAggregator(
+    flush_interval=settings.TAP_FLUSH_INTERVAL,
+    max_pending=settings.TAP_FLUSH_MAX_PENDING,
+    state_ttl=settings.TAP_STATE_TTL,
+    enabled=settings.TAP_AGGREGATOR_ENABLED,
+)
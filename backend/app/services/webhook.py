@@ -0,0 +1,119 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.repository import points_repo, users_repo
+from app.services.leaderboard import leaderboard
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookBatchTooLarge(Exception):
+    pass
+
+
+def parse_events(body: bytes) -> List[Any]:
+    """Accepts a JSON object, a JSON array or NDJSON (one event per line)."""
+    text = body.strip()
+    if not text:
+        return []
+    if text[:1] in (b"[", b"{"):
+        try:
+            data = json.loads(text)
+            return data if isinstance(data, list) else [data]
+        except json.JSONDecodeError:
+            if text[:1] == b"[":
+                raise
+    # NDJSON: несколько объектов, по одному на строку
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class WebhookProcessor:
+    """Applies webhook events in batches.
+
+    Events are deduplicated by ``event_id`` (or ``id``) within ``dedup_window``
+    seconds; a repeat is answered with the result of the first delivery and
+    status "duplicate". Points
+    rows for all users in the batch are read with one query, and missing
+    rows are created with one bulk upsert.
+    """
+
+    def __init__(self, max_events: int, dedup_size: int, dedup_window: float):
+        self.max_events = max_events
+        self.seen: TTLCache[dict] = TTLCache(dedup_size, dedup_window)
+        self.duplicates = 0
+
+    @staticmethod
+    def _event_id(event: dict) -> Optional[str]:
+        event_id = event.get("event_id", event.get("id"))
+        return str(event_id) if event_id is not None else None
+
+    async def process(self, events: List[Any]) -> List[dict]:
+        if len(events) > self.max_events:
+            raise WebhookBatchTooLarge(f"At most {self.max_events} events per request")
+
+        results: List[Optional[dict]] = [None] * len(events)
+        pending: Dict[int, List[int]] = {}  # user_id -> индексы событий
+        first: Dict[str, int] = {}  # event_id -> индекс первой доставки в пачке
+        repeats: List[tuple] = []
+        for i, event in enumerate(events):
+            if not isinstance(event, dict):
+                results[i] = {"status": "error", "message": "Event must be an object"}
+                continue
+            event_id = self._event_id(event)
+            if event_id is not None:
+                previous = self.seen.get(event_id)
+                if previous is not None:
+                    results[i] = {**previous, "status": "duplicate"}
+                    continue
+                if event_id in first:
+                    repeats.append((i, first[event_id]))
+                    continue
+                first[event_id] = i
+            user_id = event.get("user_id")
+            if not user_id or not isinstance(user_id, int) or isinstance(user_id, bool):
+                results[i] = {"status": "error", "message": "Missing user_id"}
+                continue
+            pending.setdefault(user_id, []).append(i)
+
+        if pending:
+            rows = await points_repo.get_many(list(pending))
+            missing = [u for u in pending if u not in rows]
+            created = set()
+            if missing:
+                user_ids_fk = await users_repo.ids_for(missing)
+                if user_ids_fk:
+                    new_rows = await points_repo.create_defaults(user_ids_fk)
+                    rows.update(new_rows)
+                    created.update(new_rows)
+            for user_id, indexes in pending.items():
+                row = rows.get(user_id)
+                for i in indexes:
+                    if row is None:
+                        results[i] = {"status": "error", "message": "Unknown user"}
+                    else:
+                        results[i] = {"status": "processed", "points": row["points"], "tickets": row["tickets"]}
+                if row is not None and user_id in created:
+                    leaderboard.update(user_id, points=row["points"], hearts=row["hearts"])
+
+        for event_id, i in first.items():
+            results[i]["event_id"] = event_id
+            # Ошибки не запоминаем: повторная доставка может пройти
+            if results[i]["status"] == "processed":
+                self.seen.set(event_id, results[i])
+        for i, original in repeats:
+            results[i] = {**results[original], "status": "duplicate"}
+        self.duplicates += sum(1 for r in results if r["status"] == "duplicate")
+        logger.info("Webhook batch: %s events, %s users", len(events), len(pending))
+        return results
+
+    def stats(self) -> dict:
+        return {"remembered": len(self.seen), "duplicates": self.duplicates}
+
+
+webhook_processor = WebhookProcessor(
+    max_events=settings.WEBHOOK_MAX_EVENTS,
+    dedup_size=settings.WEBHOOK_DEDUP_SIZE,
+    dedup_window=settings.WEBHOOK_DEDUP_WINDOW,
+)
@@ -1,43 +1,80 @@
+import asyncio
 import json
 import os
-from asyncio import Lock
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from typing import Optional, Dict
-import aiofiles
 from tonutils.tonconnect import IStorage
 
-class FileStorage(IStorage):
-    def __init__(self, file_path: str):
-        self.file_path = file_path
+
+class SQLiteStorage(IStorage):
+    """TonConnect session storage backed by SQLite.
+
+    All items are kept in memory for O(1) reads; every write is committed to
+    SQLite (WAL journal, synchronous=FULL) before the call returns, so it
+    survives a crash or power loss. Writes run on a single writer thread in
+    call order, keeping the event loop free and the file in step with memory.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        self.db_path = db_path
         self.lock = Lock()
+        # Один поток записи: set/remove одного ключа попадают в SQLite в том же порядке, что и в память
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-storage")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+        self._data: Dict[str, str] = dict(self._conn.execute("SELECT key, value FROM items"))
+
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._migrate_json(legacy_json_path)
 
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w') as f:
-                json.dump({}, f)
+    def _migrate_json(self, json_path: str) -> None:
+        # Одноразовый перенос данных из старого FileStorage
+        with open(json_path, 'r') as f:
+            content = f.read()
+        legacy = json.loads(content) if content else {}
+        with self.lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO items (key, value) VALUES (?, ?)", legacy.items())
+            self._conn.execute("COMMIT")
+        for key, value in legacy.items():
+            self._data.setdefault(key, value)
+        os.replace(json_path, json_path + ".migrated")
 
-    async def _read_data(self) -> Dict[str, str]:
-        async with self.lock:
-            async with aiofiles.open(self.file_path, 'r') as f:
-                content = await f.read()
-                if content:
-                    return json.loads(content)
-                return {}
+    def _execute(self, sql: str, params: tuple) -> None:
+        with self.lock:
+            self._conn.execute(sql, params)
 
-    async def _write_data(self, data: Dict[str, str]) -> None:
-        async with self.lock:
-            async with aiofiles.open(self.file_path, 'w') as f:
-                await f.write(json.dumps(data, indent=4))
+    def _write(self, sql: str, params: tuple) -> asyncio.Future:
+        return asyncio.get_running_loop().run_in_executor(self._writer, self._execute, sql, params)
 
     async def set_item(self, key: str, value: str) -> None:
-        data = await self._read_data()
-        data[key] = value
-        await self._write_data(data)
+        self._data[key] = value
+        await self._write("INSERT OR REPLACE INTO items (key, value) VALUES (?, ?)", (key, value))
 
     async def get_item(self, key: str, default_value: Optional[str] = None) -> Optional[str]:
-        data = await self._read_data()
-        return data.get(key, default_value)
+        return self._data.get(key, default_value)
 
     async def remove_item(self, key: str) -> None:
-        data = await self._read_data()
-        if key in data:
-            del data[key]
-            await self._write_data(data)
\ No newline at end of file
+        if self._data.pop(key, None) is not None:
+            await self._write("DELETE FROM items WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        self._writer.shutdown(wait=True)
+        with self.lock:
+            self._conn.close()
+
+
+class FileStorage(SQLiteStorage):
+    """Drop-in replacement for the former JSON FileStorage.
+
+    Data lives next to ``file_path`` in a ``.sqlite3`` file; an existing JSON
+    file is imported on first start and renamed to ``<file_path>.migrated``.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        super().__init__(os.path.splitext(file_path)[0] + ".sqlite3", legacy_json_path=file_path)
@@ -0,0 +1,58 @@
+import random
+from typing import List, Sequence
+
+
+class AliasTable:
+    """Weighted sampling with Vose's alias method.
+
+    Building the table is O(n); every draw then costs one random number and
+    one comparison, however many outcomes there are and however skewed the
+    weights. A single uniform is split into the column (integer part) and
+    the coin flip inside the column (fractional part).
+    """
+
+    __slots__ = ("n", "prob", "alias")
+
+    def __init__(self, weights: Sequence[float]):
+        if not weights or any(w < 0 for w in weights) or sum(weights) <= 0:
+            raise ValueError("weights must be non-negative with a positive sum")
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.n = n
+        self.prob: List[float] = [1.0] * n
+        self.alias: List[int] = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Остатки из-за погрешности округления — столбцы с вероятностью 1
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng: random.Random) -> int:
+        u = rng.random() * self.n
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def draw_many(self, rng: random.Random, count: int) -> List[int]:
+        n, prob, alias, rand = self.n, self.prob, self.alias, rng.random
+        result = []
+        append = result.append
+        for _ in range(count):
+            u = rand() * n
+            i = int(u)
+            append(i if u - i < prob[i] else alias[i])
+        return result
+
+    def counts(self, rng: random.Random, count: int) -> List[int]:
+        """How many times each outcome came up in ``count`` draws."""
+        totals = [0] * self.n
+        for i in self.draw_many(rng, count):
+            totals[i] += 1
+        return totals
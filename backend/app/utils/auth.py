@@ -1,65 +1,103 @@
 import hashlib
 import hmac
-from urllib.parse import unquote
 import json
 import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import unquote
 
 logger = logging.getLogger(__name__)
 from app.core.config import settings
+from app.utils.cache import TTLCache
+
+# Секретный ключ WebAppData зависит только от BOT_TOKEN — считаем один раз при старте
+_secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode("utf-8"), hashlib.sha256).digest() if settings.BOT_TOKEN else None
+
+
+@dataclass(frozen=True, slots=True)
+class TelegramIdentity:
+    user_id: int
+    username: str
+    first_name: str
+    photo_url: str
+    start_param: str
+    auth_date: int
+
+    def as_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "username": self.username,
+            "first_name": self.first_name,
+            "photo_url": self.photo_url,
+            "start_param": self.start_param
+        }
+
+
+# Ключ — сама строка initData: она содержит свой hash, поэтому при попадании разбор
+# и HMAC не нужны, а подменённые данные никогда не совпадут с записью
+identity_cache: TTLCache[TelegramIdentity] = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL, clock=time.time)
+
 
-def has_correct_hash(*, init_data: str) -> bool:
+def _split_init_data(init_data: str) -> Dict[str, str]:
+    params = {}
+    for pair in init_data.split('&'):
+        key, sep, value = pair.partition('=')
+        if sep:
+            params[unquote(key)] = unquote(value)
+    return params
+
+
+def _check_hash(params: Dict[str, str], received_hash: str) -> bool:
+    # Удаляем hash из параметров и сортируем остальные
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(params.items()) if k != "hash")
+    calculated_hash = hmac.new(_secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(calculated_hash, received_hash)
+
+
+def verify_init_data(*, init_data: str, now: Optional[float] = None) -> Optional[TelegramIdentity]:
+    """Verifies Telegram WebApp initData in a single pass.
+
+    Returns the verified identity, or None if the hash is missing or wrong,
+    the data is older than INIT_DATA_MAX_AGE, or the user blob is invalid.
+    """
+    now = time.time() if now is None else now
+    identity = identity_cache.get(init_data, now)
+    if identity is not None:
+        return identity
     try:
-        decoded_init_data = unquote(init_data)
-        logger.debug(f"Raw decoded_init_data: {decoded_init_data}")
-        params = {}
-        for pair in decoded_init_data.split('&'):
-            if '=' in pair:
-                key, value = pair.split('=', 1)
-                params[key] = value
-        logger.debug(f"Parsed params: {params}")
-        
+        params = _split_init_data(init_data)
         received_hash = params.get("hash")  # Telegram использует "hash", а не "signature"
         if not received_hash:
             logger.warning("No hash found in initData")
-            return False
-        
-        # Удаляем hash из параметров и сортируем остальные
-        data_check_pairs = [f"{k}={v}" for k, v in sorted(params.items()) if k != "hash"]
-        data_check_string = "\n".join(data_check_pairs)
-        logger.debug(f"Data check string: {data_check_string}")
-        
-        if not settings.BOT_TOKEN:
+            return None
+
+        if _secret_key is None:
             logger.error("BOT_TOKEN is missing or empty")
-            return False
-        
-        # Создаём секретный ключ
-        secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode("utf-8"), hashlib.sha256).digest()
-        calculated_hash = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
-        logger.debug(f"Calculated hash: {calculated_hash}, Received hash: {received_hash}")
-        
-        # Сравниваем хэши
-        if calculated_hash != received_hash:
+            return None
+        if not _check_hash(params, received_hash):
             logger.error("Hashes do not match")
-            return False
-        
-        logger.info("Hash verification successful")
-        return True
-    except Exception as e:
-        logger.error(f"Error in has_correct_hash: {str(e)}")
-        return False
+            return None
+
+        auth_date = int(params.get("auth_date", 0))
+        expires_at = now + identity_cache.ttl
+        if settings.INIT_DATA_MAX_AGE:
+            if now - auth_date > settings.INIT_DATA_MAX_AGE:
+                logger.warning("initData has expired")
+                return None
+            expires_at = min(expires_at, auth_date + settings.INIT_DATA_MAX_AGE)
 
-def parse_telegram_init_data(*, init_data: str) -> dict:
-    try:
-        decoded_init_data = unquote(init_data)
-        params = {k: v for k, v in [pair.split('=', 1) for pair in decoded_init_data.split('&') if '=' in pair]}
         user_data = json.loads(params.get("user", "{}"))
-        return {
-            "user_id": user_data.get("id"),
-            "username": user_data.get("username", ""),
-            "first_name": user_data.get("first_name", ""),
-            "photo_url": user_data.get("photo_url", ""),
-            "start_param": params.get("start_param", "")  # Добавляем start_param
-        }
+        identity = TelegramIdentity(
+            user_id=user_data.get("id"),
+            username=user_data.get("username", ""),
+            first_name=user_data.get("first_name", ""),
+            photo_url=user_data.get("photo_url", ""),
+            start_param=params.get("start_param", ""),
+            auth_date=auth_date,
+        )
+        identity_cache.set(init_data, identity, expires_at)
+        return identity
     except Exception as e:
-        logger.error(f"Error in parse_telegram_init_data: {str(e)}")
-        return {}
\ No newline at end of file
+        logger.error(f"Error in verify_init_data: {str(e)}")
+        return None
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, List, Optional, Tuple
+from app.core.config import settings
+
+# Энергия хранится как пара (energy, last_energy_update) и вычисляется при чтении:
+# +1 энергия каждые ENERGY_REGEN_SECONDS, но не больше max_energy.
+
+
+def parse_energy_timestamp(value: Optional[str], now: datetime) -> Tuple[datetime, bool]:
+    """Parses last_energy_update; returns the timestamp and whether it was malformed."""
+    if not value or value == "now()":
+        return now, True
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")), False
+    except ValueError:
+        return now - timedelta(seconds=settings.ENERGY_REGEN_SECONDS), True  # Даём одну единицу энергии
+
+
+def current_energy(energy: int, last_update: datetime, max_energy: int, now: datetime,
+                   regen_seconds: int = settings.ENERGY_REGEN_SECONDS) -> int:
+    if energy >= max_energy:
+        return energy
+    elapsed = (now - last_update).total_seconds()
+    return min(max_energy, energy + max(0, int(elapsed // regen_seconds)))
+
+
+def spend_energy(energy: int, last_update: datetime, max_energy: int, now: datetime, amount: int = 1,
+                 regen_seconds: int = settings.ENERGY_REGEN_SECONDS) -> Optional[Tuple[int, datetime]]:
+    """Returns the new stored (energy, last_update) pair, or None if there is not enough energy.
+
+    The timestamp only advances by whole regeneration periods, so partial
+    progress towards the next unit is kept; at full energy the clock restarts.
+    """
+    available = current_energy(energy, last_update, max_energy, now, regen_seconds)
+    if available < amount:
+        return None
+    if available >= max_energy:
+        anchor = now
+    else:
+        restored = available - energy
+        anchor = last_update + timedelta(seconds=restored * regen_seconds)
+    return available - amount, anchor
+
+
+def current_energy_batch(rows: Iterable[dict], now: Optional[datetime] = None,
+                         regen_seconds: int = settings.ENERGY_REGEN_SECONDS) -> List[int]:
+    """Computes current energy for many offchain_points rows in one pass."""
+    now = now or datetime.now(timezone.utc)
+    now_ts = now.timestamp()
+    parsed = {}
+    result = []
+    for row in rows:
+        energy = row["energy"]
+        max_energy = row["max_energy"]
+        if energy >= max_energy:
+            result.append(energy)
+            continue
+        value = row.get("last_energy_update")
+        ts = parsed.get(value)
+        if ts is None:
+            ts = parse_energy_timestamp(value, now)[0].timestamp()
+            parsed[value] = ts
+        restored = int((now_ts - ts) // regen_seconds)
+        result.append(min(max_energy, energy + max(0, restored)))
+    return result
+
+
+def row_energy(row: dict, now: datetime) -> int:
+    """Current energy of a single offchain_points row."""
+    last_update, _ = parse_energy_timestamp(row.get("last_energy_update"), now)
+    return current_energy(row["energy"], last_update, row["max_energy"], now)
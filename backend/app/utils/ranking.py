@@ -0,0 +1,149 @@
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional, Tuple
+
+# Ключ рейтинга — одно целое: сначала больший счёт, при равенстве меньший user_id.
+# Под user_id отведено 64 бита — любой неотрицательный bigint (у Telegram сейчас до 52 значащих бит).
+_USER_BITS = 64
+_USER_MASK = (1 << _USER_BITS) - 1
+
+
+def score_key(score: int, user_id: int) -> int:
+    return (-score << _USER_BITS) + user_id
+
+
+def split_key(key: int) -> Tuple[int, int]:
+    """Returns (user_id, score) for a key built by score_key."""
+    return key & _USER_MASK, -(key >> _USER_BITS)
+
+
+class RankIndex:
+    """Sorted set of ints with O(log n) rank and position lookups.
+
+    Keys live in sorted buckets of ``load``..``2 * load`` items; a Fenwick
+    tree over bucket sizes turns a bucket number into a global position, so
+    neither a rank query nor an update has to walk the whole set.
+    """
+
+    def __init__(self, keys: Iterable[int] = (), load: int = 1000):
+        self._load = load
+        ordered = sorted(keys)
+        self._lists: List[List[int]] = [ordered[i:i + load] for i in range(0, len(ordered), load)]
+        self._maxes: List[int] = [bucket[-1] for bucket in self._lists]
+        self._len = len(ordered)
+        self._rebuild_tree()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, key: int) -> bool:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        bucket = self._lists[i]
+        j = bisect_left(bucket, key)
+        return j < len(bucket) and bucket[j] == key
+
+    def _rebuild_tree(self) -> None:
+        tree = [0] + [len(bucket) for bucket in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, bucket: int, delta: int) -> None:
+        tree = self._tree
+        i = bucket + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        # Число ключей в корзинах [0, bucket)
+        tree = self._tree
+        total = 0
+        while bucket:
+            total += tree[bucket]
+            bucket -= bucket & -bucket
+        return total
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def add(self, key: int) -> None:
+        if not self._maxes:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuild_tree()
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            self._lists[i].append(key)
+            self._maxes[i] = key
+        else:
+            insort(self._lists[i], key)
+        self._len += 1
+        bucket = self._lists[i]
+        if len(bucket) > 2 * self._load:
+            half = bucket[self._load:]
+            del bucket[self._load:]
+            self._lists.insert(i + 1, half)
+            self._maxes[i] = bucket[-1]
+            self._maxes.insert(i + 1, half[-1])
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, key: int) -> None:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            raise KeyError(key)
+        bucket = self._lists[i]
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            raise KeyError(key)
+        del bucket[j]
+        self._len -= 1
+        if not bucket:
+            del self._lists[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+
+    def index(self, key: int) -> int:
+        """Number of keys smaller than ``key``."""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self._len
+        return self._prefix(i) + bisect_left(self._lists[i], key)
+
+    def slice(self, start: int, stop: int) -> List[int]:
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        i, j = self._locate(start)
+        result: List[int] = []
+        while len(result) < stop - start:
+            bucket = self._lists[i]
+            result.extend(bucket[j:j + stop - start - len(result)])
+            i, j = i + 1, 0
+        return result
+
+    def at(self, index: int) -> Optional[int]:
+        if not 0 <= index < self._len:
+            return None
+        i, j = self._locate(index)
+        return self._lists[i][j]
@@ -1,14 +1,148 @@
-import requests
+import asyncio
 import logging
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 from app.core.config import settings
 
-def get_ton_balance(wallet_address: str):
-    url = f"https://toncenter.com/api/v2/getAddressBalance"
-    params = {"address": wallet_address, "api_key": settings.TON_API_KEY}
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        return response.json().get("result", 0)
-    logger.error(f"Failed to get TON balance: {response.text}")
-    return 0
\ No newline at end of file
+if TYPE_CHECKING:
+    import httpx
+
+
+class TonApiError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and rejects calls for ``cooldown`` seconds.
+
+    After the cooldown exactly one probe call is let through (half-open);
+    the rest are rejected until it succeeds and closes the breaker or
+    fails and opens it again.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # Half-open: пропускаем один пробный запрос и снова отсчитываем паузу, пока он не завершится;
+        # если проба зависнет или будет отменена, через cooldown пройдёт следующая
+        self.opened_at = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"toncenter circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+
+class TonClient:
+    def __init__(self, base_url: str, api_key: str, *, timeout: float, cache_ttl: float, concurrency: int,
+                 breaker: CircuitBreaker, transport: Optional["httpx.AsyncBaseTransport"] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self._transport = transport
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._cache: Dict[str, Tuple[int, float]] = {}
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            # httpx загружается при первом запросе к toncenter, а не при старте приложения
+            import httpx
+            from app.core.http import InstrumentedTransport
+            transport = self._transport or httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency),
+            )
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                transport=InstrumentedTransport(transport, "toncenter"),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_balance(self, wallet_address: str) -> int:
+        """Balance in nanotons; raises TonApiError if toncenter is unavailable."""
+        now = time.monotonic()
+        cached = self._cache.get(wallet_address)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        if not self.breaker.allow():
+            raise TonApiError("toncenter circuit is open")
+        params = {"address": wallet_address}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        client = self.client
+        import httpx
+        try:
+            response = await client.get("/getAddressBalance", params=params)
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise TonApiError(f"toncenter request failed: {str(e)}") from e
+        if response.status_code != 200:
+            # 4xx по самому адресу не означает, что toncenter недоступен
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            raise TonApiError(f"{response.status_code} - {response.text}")
+        self.breaker.record_success()
+
+        balance = int(response.json().get("result", 0))
+        self._cache[wallet_address] = (balance, now + self.cache_ttl)
+        if len(self._cache) > 10 * 1024:
+            self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+        return balance
+
+    async def get_balances(self, wallet_addresses: Iterable[str]) -> Dict[str, Optional[int]]:
+        """Resolves many addresses concurrently; failed lookups map to None."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(address: str) -> Optional[int]:
+            async with semaphore:
+                try:
+                    return await self.get_balance(address)
+                except TonApiError as e:
+                    logger.error(f"Failed to get TON balance for {address}: {str(e)}")
+                    return None
+
+        addresses = list(dict.fromkeys(wallet_addresses))
+        balances = await asyncio.gather(*(fetch(a) for a in addresses))
+        return dict(zip(addresses, balances))
+
+
+ton_client = TonClient(
+    settings.TONCENTER_URL,
+    settings.TON_API_KEY,
+    timeout=settings.TON_TIMEOUT,
+    cache_ttl=settings.TON_CACHE_TTL,
+    concurrency=settings.TON_BATCH_CONCURRENCY,
+    breaker=CircuitBreaker(settings.TON_BREAKER_THRESHOLD, settings.TON_BREAKER_COOLDOWN),
+)
+
+
+async def get_ton_balance(wallet_address: str) -> int:
+    return await ton_client.get_balance(wallet_address)
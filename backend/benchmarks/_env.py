@@ -0,0 +1,10 @@
+import os
+
+# Бенчмарки работают офлайн: подставляем фиктивные настройки, если .env не задан
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "service-key")
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark-token")
+os.environ.setdefault("TON_API_KEY", "ton-key")
+os.environ.setdefault("BOT_NAME", "benchmark_bot")
+os.environ.setdefault("BOT_WEBHOOK_SECRET", "benchmark-secret")
@@ -0,0 +1,120 @@
+"""Airdrop snapshot export: rows per second, peak memory and resume.
+
+Fills benchmarks.fake_supabase with --users holders (a share of them with a
+connected wallet), exports the snapshot with app.services.airdrop, then
+repeats the export with a failure injected midway, changes balances and
+resumes it; the resumed export reads the snapshot taken before the failure,
+so it must have the same checksum and totals. Peak traced memory
+of the export stays flat as --users grows.
+Run from backend/:  python -m benchmarks.bench_airdrop [--users N] [--format csv] [--out DIR]
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.fake_supabase import FakeSupabase, install
+from app.core.repository import points_repo
+from app.services.airdrop import FORMATS, AirdropSnapshot
+
+
+class Interrupted(Exception):
+    pass
+
+
+def fill(fake: FakeSupabase, users: int, wallet_share: float, seed: int) -> int:
+    rng = random.Random(seed)
+    expected = 0
+    for i in range(users):
+        user = fake.add_user(10_000 + i, points=rng.randrange(0, 100_000))
+        if rng.random() < wallet_share:
+            user["wallet"] = f"UQ{rng.getrandbits(256):064x}"[:48]
+            expected += fake._points_by_user[user["user_id"]]["points"] > 0
+        elif rng.random() < 0.1:
+            user["wallet"] = "mock_wallet"
+    return expected
+
+
+async def export(out_dir: str, args) -> dict:
+    snapshot = AirdropSnapshot(out_dir, args.format, chunk_rows=args.chunk_rows, page_size=args.page_size,
+                               min_points=1, units_per_point=1)
+    return await snapshot.run()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--wallet-share", type=float, default=0.5)
+    parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--chunk-rows", type=int, default=20_000)
+    parser.add_argument("--out", help="directory for the full export (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    install(fake)
+    expected = fill(fake, args.users, args.wallet_share, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        full = await export(args.out or f"{tmp}/full", args)
+        elapsed = time.perf_counter() - start
+        assert full["rows"] == expected, (full["rows"], expected)
+        total_pages = fake.calls["GET airdrop_snapshot_rows"]
+        print(f"{args.users:,} users, {full['rows']:,} rows in {len(full['chunks'])} parts, {total_pages} pages")
+        print(f"{'export':<24} {full['rows'] / elapsed:>12,.0f} rows/s")
+
+        # Отдельный прогон под tracemalloc: трассировка замедляет выгрузку в разы. Копию балансов
+        # хранит БД, а не выгрузка, поэтому снимок в заглушке снимается до начала трассировки
+        taken = await points_repo.take_airdrop_snapshot(1)
+        take = points_repo.take_airdrop_snapshot
+
+        async def taken_snapshot(min_points):
+            return taken
+
+        points_repo.take_airdrop_snapshot = taken_snapshot
+        tracemalloc.start()
+        try:
+            await export(f"{tmp}/traced", args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            points_repo.take_airdrop_snapshot = take
+        print(f"{'peak traced memory':<24} {peak / 1024:>12,.0f} KiB")
+
+        # Сбой на середине выгрузки, затем возобновление с курсора из манифеста
+        scan = points_repo.scan_snapshot
+        pages = 0
+
+        async def failing_scan(*a, **kw):
+            nonlocal pages
+            pages += 1
+            if pages > total_pages // 2:
+                raise Interrupted()
+            return await scan(*a, **kw)
+
+        points_repo.scan_snapshot = failing_scan
+        try:
+            await export(f"{tmp}/resumed", args)
+        except Interrupted:
+            pass
+        finally:
+            points_repo.scan_snapshot = scan
+        # Балансы меняются, пока выгрузка стоит; возобновление их не видит
+        for row in fake.tables["offchain_points"]:
+            row["points"] += 1
+        before = fake.calls["GET airdrop_snapshot_rows"]
+        start = time.perf_counter()
+        resumed = await export(f"{tmp}/resumed", args)
+        print(f"{'resume':<24} {time.perf_counter() - start:>12.2f} s       "
+              f"{fake.calls['GET airdrop_snapshot_rows'] - before} of {total_pages} pages read")
+        assert (resumed["sha256"], resumed["rows"], resumed["amount"]) == (full["sha256"], full["rows"], full["amount"])
+        print(f"{'sha256':<24} {full['sha256']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Verifications/sec of Telegram initData checks.
+
+Run from backend/:  python -m benchmarks.bench_auth [--iterations N] [--users N]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import unquote
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.initdata import make_init_data
+from app.core.config import settings
+from app.utils import auth
+
+
+def legacy_verify(init_data: str) -> dict:
+    # Прежний путь (до кэша initData): проверка подписи и разбор отдельно, два разбора и ключ на каждый вызов
+    decoded = unquote(init_data)
+    params = {}
+    for pair in decoded.split('&'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            params[key] = value
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(params.items()) if k != "hash")
+    secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode("utf-8"), hashlib.sha256).digest()
+    if hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest() != params.get("hash"):
+        return {}
+    decoded = unquote(init_data)
+    params = {k: v for k, v in [pair.split('=', 1) for pair in decoded.split('&') if '=' in pair]}
+    user_data = json.loads(params.get("user", "{}"))
+    return {"user_id": user_data.get("id")}
+
+
+def uncached_verify(init_data: str):
+    auth.identity_cache.clear()
+    return auth.verify_init_data(init_data=init_data)
+
+
+def cached_verify(init_data: str):
+    return auth.verify_init_data(init_data=init_data)
+
+
+def run(name, fn, samples, iterations):
+    assert fn(samples[0]), f"{name} rejected a valid initData"
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(samples[i % len(samples)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {iterations / elapsed:>12,.0f} verifications/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    args = parser.parse_args()
+
+    samples = [make_init_data(settings.BOT_TOKEN, 10_000 + i) for i in range(args.users)]
+    run("legacy two-pass", legacy_verify, samples, args.iterations)
+    run("single-pass, no cache", uncached_verify, samples, args.iterations)
+    auth.identity_cache.clear()
+    run("single-pass, cached", cached_verify, samples, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Leaderboard rank lookups and updates at scale.
+
+Builds a board of N users with random scores in memory (no database) and
+times rank, neighbour, top-N and score-update calls one by one.
+Run from backend/:  python -m benchmarks.bench_leaderboard [--users N] [--iterations N]
+"""
+import argparse
+import random
+import time
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.stats import report
+from app.services.leaderboard import Board
+
+
+def run(name, fn, args):
+    samples = []
+    start = time.perf_counter()
+    for arg in args:
+        t0 = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t0)
+    report(name, samples, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    user_ids = rng.sample(range(10**9, 10**10), args.users)
+    start = time.perf_counter()
+    board = Board({user_id: rng.randrange(1_000_000) for user_id in user_ids})
+    print(f"bulk load of {args.users:,} users: {time.perf_counter() - start:.2f} s")
+
+    lookups = [rng.choice(user_ids) for _ in range(args.iterations)]
+    run("rank", board.rank, lookups)
+    run("rank + 5 neighbours", lambda u: board.entries(board.rank(u).rank - 6, board.rank(u).rank + 5), lookups)
+    run("top 100", lambda offset: board.entries(offset, offset + 100), [0] * (args.iterations // 10))
+    updates = [(u, rng.randrange(1_000_000)) for u in lookups]
+    run("score update", lambda item: board.set(*item), updates)
+
+    # Сверка с полной сортировкой на выборке
+    ordered = sorted(board.scores.items(), key=lambda item: (-item[1], item[0]))
+    for position in rng.sample(range(args.users), 100):
+        assert board.rank(ordered[position][0]).rank == position + 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Request throughput with synchronous logging vs the queued, sampled pipeline.
+
+Drives /api/v1/mini_tap and /api/v1/leaderboard through the ASGI app against
+benchmarks.fake_supabase, writing logs to a file. ``--write-delay`` emulates a
+slow log sink (a blocked stdout pipe) per written line.
+Run from backend/:  python -m benchmarks.bench_logging [--requests N] [--write-delay MS]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.fake_supabase import FakeSupabase, install
+from benchmarks.initdata import make_init_data
+from benchmarks.stats import report
+from app.core import log
+from app.core.config import settings
+from app.main import app
+
+
+class SlowStream:
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text: str) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        self.lines += 1
+        self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def use_sync_logging(stream) -> logging.Handler:
+    # Прежний вариант: обработчик пишет прямо из event loop, выборки нет
+    log.shutdown_logging()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+    log.sampler.set_rates({})
+    return handler
+
+
+def use_queue_logging(stream) -> None:
+    log.shutdown_logging()
+    log.sampler.set_rates(settings.LOG_SAMPLE_RATES)
+    log.setup_logging(stream)
+
+
+async def run(name, client, users, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+    headers = [{"Authorization": f"tma {make_init_data(settings.BOT_TOKEN, u)}"} for u in users]
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            if i % 10:
+                response = await client.post("/api/v1/mini_tap", headers=headers[i % len(headers)])
+            else:
+                response = await client.get("/api/v1/leaderboard/points", headers=headers[i % len(headers)])
+            assert response.status_code in (200, 503), response.text
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    report(name, samples, time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--write-delay", type=float, default=0.05, help="emulated cost of one log write, ms")
+    args = parser.parse_args()
+
+    fake = FakeSupabase()
+    install(fake)
+    users = range(5_000_000, 5_000_000 + args.users)
+    for user_id in users:
+        fake.add_user(user_id, energy=10**9, max_energy=10**9)
+
+    with tempfile.TemporaryFile("w+") as sink:
+        stream = SlowStream(sink, args.write_delay / 1000)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            log.shutdown_logging()
+            logging.getLogger().setLevel(logging.WARNING)
+            await run("warm-up, no logging", client, users, args.requests // 5, args.concurrency)
+
+            handler = use_sync_logging(stream)
+            await run("sync handler, every request", client, users, args.requests, args.concurrency)
+            logging.getLogger().removeHandler(handler)
+            print(f"{'':<34} {stream.lines:,} lines written on the event loop")
+
+            lines = stream.lines
+            use_queue_logging(stream)
+            await run("queue handler, sampled", client, users, args.requests, args.concurrency)
+            dropped = log.stats()["dropped"]
+            log.shutdown_logging()
+            print(f"{'':<34} {stream.lines - lines:,} lines written by the listener thread, {dropped} dropped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""Login latency: the former multi-query sequence vs the login_user upsert RPC.
+
+Runs against benchmarks.fake_supabase with an emulated round-trip latency.
+Run from backend/:  python -m benchmarks.bench_login [--users N] [--latency MS]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.fake_supabase import FakeSupabase, install
+from benchmarks.stats import report
+from app.core.database import supabase, supabase_service
+from app.core.repository import default_points_row, points_repo, users_repo
+
+
+async def legacy_login(user: dict) -> dict:
+    # Прежний login: select users, insert users, insert offchain_points, select offchain_points
+    user_response = await supabase.table("users").select("*").eq("user_id", user["user_id"]).execute()
+    if not user_response.data:
+        insert_result = await supabase_service.table("users").insert(user).execute()
+        user_id_fk = insert_result.data[0]["id"]
+        await supabase_service.table("offchain_points").insert(default_points_row(user["user_id"], user_id_fk)).execute()
+    points_response = await supabase.table("offchain_points").select("*").eq("user_id", user["user_id"]).execute()
+    return points_response.data[0]
+
+
+async def run(name, fake, login, user_ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(user_id):
+        async with semaphore:
+            start = time.perf_counter()
+            await login({"user_id": user_id, "username": f"user{user_id}", "first_name": "Bench", "photo_url": ""})
+            samples.append(time.perf_counter() - start)
+
+    points_repo.cache.clear()
+    trips = fake.round_trips
+    start = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in user_ids))
+    elapsed = time.perf_counter() - start
+    report(name, samples, elapsed, f"   {(fake.round_trips - trips) / len(user_ids):.1f} round trips/login")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--latency", type=float, default=5.0, help="emulated Supabase round trip, ms")
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    fake = FakeSupabase(latency=args.latency / 1000)
+    install(fake)
+    legacy_ids = range(1_000_000, 1_000_000 + args.users)
+    new_ids = range(2_000_000, 2_000_000 + args.users)
+    await run("legacy, first login", fake, legacy_login, legacy_ids, args.concurrency)
+    await run("legacy, returning user", fake, legacy_login, legacy_ids, args.concurrency)
+    await run("login_user rpc, first login", fake, users_repo.login, new_ids, args.concurrency)
+    await run("login_user rpc, returning user", fake, users_repo.login, new_ids, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""Lootbox draws per second.
+
+Times single draws and batch opens on the alias tables built from
+app/data/lootboxes.json, against random.choices with the same weights
+(a cumulative-weight bisect per draw), and checks that the observed reward
+frequencies match the configured odds.
+Run from backend/:  python -m benchmarks.bench_lootbox [--draws N] [--batch N] [--outcomes N]
+"""
+import argparse
+import random
+import time
+
+from benchmarks import _env  # noqa: F401
+from app.services.lootbox import DEFAULT_CATALOG_PATH, load_catalog
+from app.utils.alias import AliasTable
+
+
+def rate(name: str, draws: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<44} {draws / elapsed:>14,.0f} draws/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--draws", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100, help="boxes per open in the batch run")
+    parser.add_argument("--outcomes", type=int, default=1_000, help="rewards in the synthetic wide table")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = load_catalog(DEFAULT_CATALOG_PATH)
+    wide = [rng.randrange(1, 1000) for _ in range(args.outcomes)]
+    tables = [(box.id, [r.weight for r in box.rewards]) for box in catalog.values()] + [(f"{args.outcomes} rewards", wide)]
+
+    for name, weights in tables:
+        table = AliasTable(weights)
+        population = range(len(weights))
+        print(f"== {name}")
+        rate("alias, one draw per call", args.draws, lambda: [table.draw(rng) for _ in range(args.draws)])
+        rate(f"alias, batch opens of {args.batch}", args.draws,
+             lambda: [table.draw_many(rng, args.batch) for _ in range(args.draws // args.batch)])
+        rate("random.choices, one draw per call", args.draws // 10,
+             lambda: [rng.choices(population, weights)[0] for _ in range(args.draws // 10)])
+        rate(f"random.choices, k={args.batch}", args.draws,
+             lambda: [rng.choices(population, weights, k=args.batch) for _ in range(args.draws // args.batch)])
+
+        # Частоты выпадений против заданных шансов
+        counts = table.counts(rng, args.draws)
+        total = sum(weights)
+        worst = max(abs(c / args.draws - w / total) for c, w in zip(counts, weights))
+        print(f"{'max |observed - expected| chance':<44} {worst:>14.5f}")
+        assert worst < 0.01
+
+
+if __name__ == "__main__":
+    main()
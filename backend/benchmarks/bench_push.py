@@ -0,0 +1,103 @@
+"""Push hub fan-out with many idle connections.
+
+Opens N subscribers on app.services.push.PushHub (no sockets), each with a
+task waiting for events as the WebSocket sender does, and reports memory
+per idle connection, publish cost to a connected user and end-to-end
+delivery latency, plus the ticker's cost when every user's energy
+regenerates at once. The ticker works in slices of tick_batch users; with
+tens of thousands of live tasks the longest slice usually includes a full
+garbage collection pass.
+Run from backend/:  python -m benchmarks.bench_push [--connections N] [--events N]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.stats import report
+from app.services.push import PushHub
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=50_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hub = PushHub(max_connections=args.connections, max_per_user=1, regen_seconds=300)
+    delivered = {}
+
+    async def consume(subscriber):
+        while True:
+            for event in await subscriber.next_events():
+                delivered[subscriber.user_id] = (event, time.perf_counter())
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscribers = [hub.subscribe(user_id) for user_id in range(args.connections)]
+    tasks = [asyncio.create_task(consume(s)) for s in subscribers]
+    await asyncio.sleep(0)
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / args.connections
+    tracemalloc.stop()
+    print(f"{args.connections:,} idle connections: {per_connection / 1024:.2f} KiB each (hub + waiting task)")
+
+    targets = [rng.randrange(args.connections) for _ in range(args.events)]
+    samples = []
+    start = time.perf_counter()
+    for user_id in targets:
+        t0 = time.perf_counter()
+        hub.publish(user_id, "balance", {"points": user_id})
+        samples.append(time.perf_counter() - t0)
+    report("publish (connected user)", samples, time.perf_counter() - start)
+
+    samples = []
+    start = time.perf_counter()
+    for user_id in range(args.connections, args.connections + args.events):
+        t0 = time.perf_counter()
+        hub.publish(user_id, "balance", {"points": user_id})
+        samples.append(time.perf_counter() - t0)
+    report("publish (no connection)", samples, time.perf_counter() - start)
+
+    # Доставка: публикация -> пробуждение ожидающей задачи
+    samples = []
+    start = time.perf_counter()
+    for user_id in targets[:10_000]:
+        t0 = time.perf_counter()
+        hub.publish(user_id, "balance", {"points": -user_id})
+        await asyncio.sleep(0)
+        samples.append(delivered[user_id][1] - t0)
+    report("publish -> delivered", samples, time.perf_counter() - start)
+
+    # Все пользователи восстанавливают единицу энергии в один момент (через 60 с)
+    last_update = datetime.now(timezone.utc) - timedelta(seconds=300 - 60)
+    for user_id in range(args.connections):
+        hub.publish_energy(user_id, 10, 100, last_update)
+    await asyncio.sleep(0)
+    published = hub.published
+    slices = []
+    start = time.perf_counter()
+    more = True
+    while more:
+        t0 = time.perf_counter()
+        more = hub._due(last_update.timestamp() + 300, hub.tick_batch)
+        slices.append(time.perf_counter() - t0)
+    ticked = time.perf_counter() - start
+    await asyncio.sleep(0)
+    delivered_in = time.perf_counter() - start - ticked
+    assert hub.published - published == args.connections
+    print(f"energy tick for {args.connections:,} users: {ticked * 1000:.1f} ms in {len(slices)} slices "
+          f"(median {statistics.median(slices) * 1000:.1f} ms, longest {max(slices) * 1000:.1f} ms), waking their senders {delivered_in * 1000:.1f} ms")
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Response serialization CPU per request on hot endpoints.
+
+Compares FastAPI's path for an untyped dict (jsonable_encoder + json.dumps
+in Starlette's JSONResponse) with the typed path the app now uses
+(validation and dump against the route's response_model in pydantic-core,
+rendered by FastJSONResponse), on the payloads of mini_tap, login and a
+full referrals page and leaderboard. Also reports the memory held per
+cached TapState with and without __slots__.
+Run from backend/:  python -m benchmarks.bench_serialization [--iterations N]
+"""
+import argparse
+import asyncio
+import dataclasses
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks import _env  # noqa: F401
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from app.api.responses import FastJSONResponse
+from app.main import app
+from app.services.tap_aggregator import TapState
+
+PAYLOADS = {
+    ("POST", "/api/v1/mini_tap"): {"message": "Mini tap successful", "hearts": 1234, "energy": 87},
+    ("POST", "/api/v1/auth/login"): {
+        "user": {"user_id": 123456789, "username": "user123", "first_name": "Bench", "photo_url": "", "start_param": ""},
+        "points": {"points": 150000, "tickets": 12, "hearts": 4321, "energy": 100}
+    },
+    ("GET", "/api/v1/referrals"): {
+        "referrals": [{"user_id": 10_000 + i, "username": f"user{i}", "first_name": "Bench",
+                       "photo_url": f"https://t.me/i/userpic/320/{i}.jpg"} for i in range(20)],
+        "next_cursor": 20
+    },
+    ("GET", "/api/v1/leaderboard/{board}"): {
+        "board": "points", "total": 100_000,
+        "entries": [{"rank": i + 1, "user_id": 10_000 + i, "score": 1_000_000 - i} for i in range(100)]
+    },
+}
+
+
+def find_route(method: str, path: str) -> APIRoute:
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+            return route
+    raise LookupError(path)
+
+
+async def untyped(route: APIRoute, payload: dict) -> bytes:
+    # Прежний путь: без response_model FastAPI обходит ответ jsonable_encoder, затем json.dumps
+    content = await serialize_response(response_content=payload)
+    return JSONResponse(content).body
+
+
+async def typed(route: APIRoute, payload: dict) -> bytes:
+    content = await serialize_response(field=route.response_field, response_content=payload,
+                                       exclude_none=route.response_model_exclude_none)
+    return FastJSONResponse(content).body
+
+
+async def per_call(fn, route, payload, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        await fn(route, payload)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def bytes_per_state(cls, count: int) -> float:
+    now = datetime.now(timezone.utc)
+    tracemalloc.start()
+    states = [cls(user_id=i, hearts=i, energy=100, max_energy=100, last_energy_update=now) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del states
+    return size / count
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10_000)
+    parser.add_argument("--states", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<32} {'untyped, us':>12} {'typed, us':>10} {'saved, us':>10}")
+    for (method, path), payload in PAYLOADS.items():
+        route = find_route(method, path)
+        assert await untyped(route, payload) == await typed(route, payload)
+        before = await per_call(untyped, route, payload, args.iterations)
+        after = await per_call(typed, route, payload, args.iterations)
+        print(f"{path:<32} {before:>12.2f} {after:>10.2f} {before - after:>10.2f}")
+
+    fields = [(f.name, f.type, f) for f in dataclasses.fields(TapState)]
+    legacy = dataclasses.make_dataclass("LegacyTapState", fields)
+    print(f"TapState, bytes each: with __dict__ {bytes_per_state(legacy, args.states):.0f}, "
+          f"slotted {bytes_per_state(TapState, args.states):.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Cold-start time of the serverless function (vercel.json deploys app/main.py).
+
+Each run is a fresh interpreter that measures:
+  import       `import app.main`
+  first        the first request that needs no database (GET /)
+  first_db     the first request that does (POST /api/v1/auth/login against
+               benchmarks.fake_supabase), which builds the PostgREST client
+It also checks that importing the app leaves the heavy, lazily imported
+dependencies unloaded.
+
+Cold-start budget (median of --runs, milliseconds):
+  import <= 1500, first <= 50, first_db <= 400
+The import figure is dominated by FastAPI/pydantic; anything the app adds
+on top should stay well inside it. The script exits with status 1 when a
+budget is exceeded or a deferred module was imported at startup.
+
+Run from backend/:  python -m benchmarks.bench_startup [--runs N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BUDGET_MS = {"import": 1500.0, "first": 50.0, "first_db": 400.0}
+
+# Загружаются только при первом обращении к Supabase/toncenter/боту
+DEFERRED_MODULES = ("httpx", "postgrest", "h2", "supabase", "requests", "tonutils", "aiofiles", "telegram")
+
+
+async def _call(app, method: str, path: str, headers=()) -> int:
+    # Запрос напрямую через ASGI, чтобы не загружать httpx до замера
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+             "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+    status = {}
+    done = asyncio.Event()
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    return status["code"]
+
+
+def child() -> None:
+    from benchmarks import _env  # noqa: F401
+
+    start = time.perf_counter()
+    from app.main import app
+    result = {"import": (time.perf_counter() - start) * 1000}
+    result["deferred_loaded"] = [m for m in DEFERRED_MODULES if m in sys.modules]
+
+    async def requests():
+        from app.core import log
+        log.shutdown_logging()
+        start = time.perf_counter()
+        assert await _call(app, "GET", "/") == 200
+        result["first"] = (time.perf_counter() - start) * 1000
+
+        from benchmarks.fake_supabase import FakeSupabase, install
+        from benchmarks.initdata import make_init_data
+        from app.core.config import settings
+        headers = [("Authorization", f"tma {make_init_data(settings.BOT_TOKEN, 1)}")]
+        fake = FakeSupabase()
+        start = time.perf_counter()
+        install(fake)
+        assert await _call(app, "POST", "/api/v1/auth/login", headers) == 200
+        result["first_db"] = (time.perf_counter() - start) * 1000
+
+    asyncio.run(requests())
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"], check=True,
+                                capture_output=True, text=True, env=os.environ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    failed = False
+    for name, budget in BUDGET_MS.items():
+        values = [run[name] for run in runs]
+        median = statistics.median(values)
+        ok = median <= budget
+        failed |= not ok
+        print(f"{name:<10} median {median:8.1f} ms   min {min(values):8.1f} ms   budget {budget:6.0f} ms   "
+              f"{'ok' if ok else 'OVER BUDGET'}")
+    loaded = sorted({m for run in runs for m in run["deferred_loaded"]})
+    if loaded:
+        failed = True
+        print(f"loaded at import: {', '.join(loaded)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""TonConnect session storage: legacy JSON FileStorage vs SQLiteStorage.
+
+Run from backend/:  python -m benchmarks.bench_storage [--sessions N] [--ops N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app.storage import SQLiteStorage
+
+
+class LegacyJsonStorage:
+    # Прежний FileStorage: полный json.loads на каждое чтение и перезапись файла на каждую запись
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def _read(self):
+        with open(self.file_path) as f:
+            return json.loads(f.read() or "{}")
+
+    def _write(self, data):
+        with open(self.file_path, "w") as f:
+            f.write(json.dumps(data, indent=4))
+
+    async def set_item(self, key, value):
+        data = self._read()
+        data[key] = value
+        self._write(data)
+
+    async def get_item(self, key, default_value=None):
+        return self._read().get(key, default_value)
+
+
+def session(i: int) -> str:
+    return json.dumps({"connection": {"wallet": f"EQ{i:046d}", "session_key": os.urandom(32).hex()}})
+
+
+async def measure(name, storage, sessions, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        await storage.get_item(f"session:{(i * 7919) % sessions}")
+    reads = ops / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for i in range(ops):
+        await storage.set_item(f"session:{(i * 104729) % sessions}", session(i))
+    writes = ops / (time.perf_counter() - start)
+    print(f"{name:<12} get_item {reads:>12,.0f} ops/sec   set_item {writes:>10,.0f} ops/sec")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=2_000)
+    parser.add_argument("--legacy-ops", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        items = {f"session:{i}": session(i) for i in range(args.sessions)}
+        legacy_path = os.path.join(tmp, "legacy.json")
+        with open(legacy_path, "w") as f:
+            json.dump(items, f, indent=4)
+        await measure("legacy json", LegacyJsonStorage(legacy_path), args.sessions, args.legacy_ops)
+
+        start = time.perf_counter()
+        storage = SQLiteStorage(os.path.join(tmp, "sessions.sqlite3"), legacy_json_path=legacy_path)
+        print(f"migrated {args.sessions:,} sessions from JSON in {time.perf_counter() - start:.2f}s")
+        await measure("sqlite", storage, args.sessions, args.ops)
+
+        start = time.perf_counter()
+        storage.close()
+        SQLiteStorage(os.path.join(tmp, "sessions.sqlite3")).close()
+        print(f"reopened store in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
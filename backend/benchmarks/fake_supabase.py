@@ -0,0 +1,332 @@
+"""In-memory stand-in for the PostgREST endpoints the backend calls.
+
+Implements the table reads/writes used by app/core/repository.py and the RPC
+functions from supabase/migrations, so benchmarks run fully offline. An
+optional ``latency`` emulates the network round trip to Supabase.
+"""
+import asyncio
+import bisect
+import itertools
+import json
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _coerce(value: str, sample: Any) -> Any:
+    if isinstance(sample, bool):
+        return value == "true"
+    if isinstance(sample, int):
+        return int(value)
+    if isinstance(sample, float):
+        return float(value)
+    return value
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {"users": [], "offchain_points": [], "referrals": [], "completed_tasks": [],
+                                             "lootbox_openings": []}
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+        self._points_by_user: Dict[int, dict] = {}
+        self._users_by_user: Dict[int, dict] = {}
+        # Снимки аирдропа: id -> (отсортированные user_id, строки в том же порядке)
+        self._snapshots: Dict[int, Tuple[List[int], List[dict]]] = {}
+        self.app = Starlette(routes=[
+            Route("/rest/v1/rpc/{fn}", self._rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self._table, methods=["GET", "POST", "PATCH", "DELETE"]),
+        ])
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.calls.values())
+
+    # --- данные ---
+
+    def add_user(self, user_id: int, **points: Any) -> dict:
+        user = {"id": next(self._ids), "user_id": user_id, "username": f"user{user_id}",
+                "first_name": "Bench", "photo_url": "", "wallet": None, "referral_count": 0}
+        self.tables["users"].append(user)
+        self._users_by_user[user_id] = user
+        row = {"user_id": user_id, "user_id_fk": user["id"], "points": 0, "tickets": 0, "hearts": 0,
+               "energy": 100, "max_energy": 100, "last_energy_update": _now(),
+               "last_claim_date": None, "claim_streak": 0}
+        row.update(points)
+        self.tables["offchain_points"].append(row)
+        self._points_by_user[user_id] = row
+        return user
+
+    def _insert(self, table: str, item: dict) -> Optional[dict]:
+        item = dict(item)
+        if table == "users":
+            if item["user_id"] in self._users_by_user:
+                return None
+            item.setdefault("id", next(self._ids))
+            item.setdefault("wallet", None)
+            item.setdefault("referral_count", 0)
+            self._users_by_user[item["user_id"]] = item
+        elif table == "offchain_points":
+            if item["user_id"] in self._points_by_user:
+                return None
+            if item.get("last_energy_update") == "now()":
+                item["last_energy_update"] = _now()
+            self._points_by_user[item["user_id"]] = item
+        elif table == "completed_tasks":
+            if any(t["user_id"] == item["user_id"] and t["task_id"] == item["task_id"] for t in self.tables[table]):
+                return None
+            item.setdefault("completed_at", _now())
+        elif table == "referrals":
+            if any(r["referral_id"] == item["referral_id"] for r in self.tables[table]):
+                return None
+        self.tables.setdefault(table, []).append(item)
+        return item
+
+    # --- PostgREST ---
+
+    def _referral_list(self) -> List[dict]:
+        # Представление referral_list: referrals, соединённые с users дважды
+        by_id = {u["id"]: u for u in self.tables["users"]}
+        rows = []
+        for r in self.tables["referrals"]:
+            referrer, user = by_id.get(r["referrer_id"]), by_id.get(r["referral_id"])
+            if referrer and user:
+                rows.append({"referrer_user_id": referrer["user_id"], "referral_id": r["referral_id"],
+                             "user_id": user["user_id"], "username": user["username"],
+                             "first_name": user["first_name"], "photo_url": user["photo_url"]})
+        return rows
+
+    def _airdrop_snapshot_rows(self, params) -> List[dict]:
+        # keyset-страница снимка по user_id без прохода по всем его строкам
+        filters = {k: v.split(".", 1) for k, v in params.items() if k not in _RESERVED_PARAMS}
+        ids, rows = self._snapshots.get(int(filters["snapshot_id"][1]), ([], []))
+        start = bisect.bisect_right(ids, int(filters["user_id"][1])) if "user_id" in filters else 0
+        return rows[start:start + int(params.get("limit", len(rows)))]
+
+    def _filter(self, rows: List[dict], params, paginate: bool = True) -> List[dict]:
+        filters = [(k, *v.split(".", 1)) for k, v in params.multi_items() if k not in _RESERVED_PARAMS]
+        # Частый случай: поиск по user_id через индекс
+        for column, op, value in filters:
+            if column == "user_id" and op == "eq" and rows is self.tables.get("offchain_points"):
+                row = self._points_by_user.get(int(value))
+                rows = [row] if row else []
+            elif column == "user_id" and op == "eq" and rows is self.tables.get("users"):
+                row = self._users_by_user.get(int(value))
+                rows = [row] if row else []
+        result = []
+        for row in rows:
+            for column, op, value in filters:
+                current = row.get(column)
+                if op == "is":
+                    ok = current is None if value == "null" else current is not None
+                elif current is None:
+                    ok = False
+                elif op == "in":
+                    ok = current in {_coerce(v, current) for v in value.strip("()").split(",") if v}
+                else:
+                    target = _coerce(value, current)
+                    ok = {"eq": current == target, "neq": current != target, "gt": current > target,
+                          "gte": current >= target, "lt": current < target, "lte": current <= target}[op]
+                if not ok:
+                    break
+            else:
+                result.append(row)
+        order = params.get("order")
+        if order:
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction.startswith("desc"))
+        if not paginate:
+            return result
+        offset = int(params.get("offset", 0))
+        if "limit" in params:
+            return result[offset:offset + int(params["limit"])]
+        return result[offset:]
+
+    @staticmethod
+    def _project(row: dict, select: Optional[str]) -> dict:
+        if not select or select == "*":
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in select.split(",")}
+
+    async def _table(self, request: Request) -> Response:
+        table = request.path_params["table"]
+        self.calls[f"{request.method} {table}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request.query_params
+        if table == "airdrop_snapshot_rows":
+            return JSONResponse([self._project(r, params.get("select")) for r in self._airdrop_snapshot_rows(params)])
+        rows = self._referral_list() if table == "referral_list" else self.tables.setdefault(table, [])
+        if request.method == "GET":
+            matched = self._filter(rows, params)
+            headers = {}
+            if "count=exact" in request.headers.get("prefer", ""):
+                total = len(self._filter(rows, params, paginate=False))
+                headers["content-range"] = f"0-{max(len(matched) - 1, 0)}/{total}"
+            return JSONResponse([self._project(r, params.get("select")) for r in matched], headers=headers)
+        body = json.loads(await request.body() or b"null")
+        if request.method == "POST":
+            upsert = "resolution=ignore-duplicates" in request.headers.get("prefer", "") or "on_conflict" in params
+            created = []
+            for item in body if isinstance(body, list) else [body]:
+                row = self._insert(table, item)
+                if row is None and not upsert:
+                    return JSONResponse({"code": "23505", "message": "duplicate key value violates unique constraint"},
+                                        status_code=409)
+                if row is not None:
+                    created.append(row)
+            return JSONResponse(created, status_code=201)
+        if request.method == "PATCH":
+            updated = self._filter(rows, params)
+            for row in updated:
+                row.update(body)
+            return JSONResponse(updated)
+        deleted = self._filter(rows, params)
+        self.tables[table] = [r for r in rows if r not in deleted]
+        return JSONResponse(deleted)
+
+    async def _rpc(self, request: Request) -> Response:
+        fn = request.path_params["fn"]
+        self.calls[f"RPC {fn}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = json.loads(await request.body() or b"{}")
+        handler = getattr(self, f"rpc_{fn}", None)
+        if handler is None:
+            return JSONResponse({"message": f"function {fn} does not exist"}, status_code=404)
+        return JSONResponse(handler(**params))
+
+    # --- функции из supabase/migrations ---
+
+    def rpc_login_user(self, p_user_id, p_username, p_first_name, p_photo_url):
+        self._insert("users", {"user_id": p_user_id, "username": p_username,
+                               "first_name": p_first_name, "photo_url": p_photo_url})
+        user = self._users_by_user[p_user_id]
+        self._insert("offchain_points", {"user_id": p_user_id, "user_id_fk": user["id"], "points": 0, "tickets": 0,
+                                         "hearts": 0, "energy": 100, "max_energy": 100,
+                                         "last_energy_update": _now(), "last_claim_date": None, "claim_streak": 0})
+        return [dict(self._points_by_user[p_user_id])]
+
+    def rpc_increment_balance(self, p_user_id, p_points=0, p_tickets=0):
+        row = self._points_by_user.get(p_user_id)
+        if row is None:
+            return []
+        row["points"] += p_points
+        row["tickets"] += p_tickets
+        return [{"points": row["points"], "tickets": row["tickets"]}]
+
+    def rpc_apply_taps(self, p_user_id, p_taps, p_regen_seconds):
+        row = self._points_by_user.get(p_user_id)
+        if row is None:
+            return []
+        now = datetime.now(timezone.utc)
+        last = (datetime.fromisoformat(row["last_energy_update"]) if row.get("last_energy_update")
+                else now - timedelta(seconds=p_regen_seconds))
+        available = row["energy"] if row["energy"] >= row["max_energy"] else min(
+            row["max_energy"], row["energy"] + max(0, int((now - last).total_seconds() // p_regen_seconds)))
+        applied = min(max(p_taps, 0), available)
+        anchor = now if available >= row["max_energy"] else last + timedelta(
+            seconds=(available - row["energy"]) * p_regen_seconds)
+        row.update(hearts=row["hearts"] + applied, energy=available - applied, last_energy_update=anchor.isoformat())
+        return [{"applied": applied, "hearts": row["hearts"], "energy": row["energy"],
+                 "last_energy_update": row["last_energy_update"]}]
+
+    def rpc_take_airdrop_snapshot(self, p_min_points):
+        # Копия представления airdrop_balances на момент вызова
+        rows = []
+        for user_id in sorted(self._points_by_user):
+            user, points = self._users_by_user.get(user_id), self._points_by_user[user_id]["points"]
+            if user and user["wallet"] and user["wallet"] != "mock_wallet" and points >= p_min_points:
+                rows.append({"user_id": user_id, "wallet": user["wallet"], "points": points})
+        snapshot_id = len(self._snapshots) + 1
+        self._snapshots[snapshot_id] = ([r["user_id"] for r in rows], rows)
+        return [{"snapshot_id": snapshot_id, "taken_at": _now(), "holders": len(rows),
+                 "points": sum(r["points"] for r in rows)}]
+
+    def rpc_claim_daily_tickets(self, p_user_id, p_max_streak=7):
+        row = self._points_by_user.get(p_user_id)
+        if row is None:
+            return []
+        now = datetime.now(timezone.utc)
+        last = datetime.fromisoformat(row["last_claim_date"]) if row["last_claim_date"] else None
+        if last and now - last < timedelta(hours=24):
+            return [{"claimed": False, "tickets": row["tickets"], "claim_streak": row["claim_streak"],
+                     "last_claim_date": row["last_claim_date"]}]
+        streak = min(row["claim_streak"] + 1, p_max_streak) if last and now - last < timedelta(hours=48) else 1
+        row.update(tickets=row["tickets"] + streak, claim_streak=streak, last_claim_date=now.isoformat())
+        return [{"claimed": True, "tickets": row["tickets"], "claim_streak": streak,
+                 "last_claim_date": row["last_claim_date"]}]
+
+    def rpc_complete_task(self, p_user_id, p_task_id, p_points):
+        row = self._points_by_user.get(p_user_id)
+        if row is None:
+            return []
+        task = self._insert("completed_tasks", {"user_id": p_user_id, "task_id": p_task_id})
+        if task is None:
+            existing = next(t for t in self.tables["completed_tasks"]
+                            if t["user_id"] == p_user_id and t["task_id"] == p_task_id)
+            return [{"completed": False, "points": row["points"], "completed_at": existing["completed_at"]}]
+        row["points"] += p_points
+        return [{"completed": True, "points": row["points"], "completed_at": task["completed_at"]}]
+
+    def rpc_open_lootboxes(self, p_user_id, p_lootbox_id, p_cost, p_points, p_tickets, p_rewards):
+        row = self._points_by_user.get(p_user_id)
+        if row is None:
+            return []
+        if row["tickets"] < p_cost:
+            return [{"opened": False, "points": row["points"], "tickets": row["tickets"]}]
+        row["tickets"] += p_tickets - p_cost
+        row["points"] += p_points
+        self.tables["lootbox_openings"].append({"user_id": p_user_id, "lootbox_id": p_lootbox_id, "cost": p_cost,
+                                                "points": p_points, "tickets": p_tickets, "rewards": p_rewards})
+        return [{"opened": True, "points": row["points"], "tickets": row["tickets"]}]
+
+    def rpc_credit_referral(self, p_referrer_user_id, p_referral_id, p_reward, p_max_referrals):
+        if any(r["referral_id"] == p_referral_id for r in self.tables["referrals"]):
+            return [{"status": "already_referred"}]
+        referrer = self._users_by_user.get(p_referrer_user_id)
+        if referrer is None:
+            return [{"status": "invalid_referrer"}]
+        row = self._points_by_user.get(p_referrer_user_id)
+        if row is None:
+            return [{"status": "referrer_without_points"}]
+        if referrer["referral_count"] >= p_max_referrals:
+            return [{"status": "limit_reached"}]
+        self._insert("referrals", {"referrer_id": referrer["id"], "referral_id": p_referral_id})
+        referrer["referral_count"] += 1
+        row["tickets"] += p_reward
+        return [{"status": "credited"}]
+
+    def rpc_credit_referrals(self, p_items, p_reward, p_max_referrals):
+        return [self._credit_referrals_row(item, p_reward, p_max_referrals) for item in p_items]
+
+    def _credit_referrals_row(self, item, p_reward, p_max_referrals):
+        referrer_user_id = item["referrer_user_id"]
+        status = self.rpc_credit_referral(referrer_user_id, item["referral_id"], p_reward, p_max_referrals)[0]["status"]
+        credited = status == "credited"
+        return {"referrer_user_id": referrer_user_id, "referral_id": item["referral_id"], "status": status,
+                "tickets": self._points_by_user[referrer_user_id]["tickets"] if credited else None,
+                "referral_count": self._users_by_user[referrer_user_id]["referral_count"] if credited else None}
+
+
+def install(fake: FakeSupabase) -> None:
+    """Routes the app's PostgREST clients to ``fake`` instead of the network."""
+    from app.core import database
+    from app.core.http import InstrumentedTransport
+    transport = InstrumentedTransport(httpx.ASGITransport(app=fake.app), "supabase")
+    for client in (database.supabase, database.supabase_service):
+        client.session._transport = transport
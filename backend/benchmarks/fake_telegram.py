@@ -0,0 +1,60 @@
+"""In-memory stand-in for the Telegram Bot API used by app/bot.py.
+
+Accepts POST /bot<token>/<method>, records every call in ``sent`` and
+answers like Telegram does. ``latency`` emulates the round trip;
+``rate_limit_every`` answers every N-th call with 429 and retry_after, as
+Telegram does during floods.
+"""
+import asyncio
+import json
+from collections import Counter
+from typing import List, Tuple
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: float = 0.01):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.sent: List[Tuple[str, dict]] = []
+        self._message_ids = 0
+        self.app = Starlette(routes=[Route("/bot{token}/{method}", self._method, methods=["POST"])])
+
+    async def _method(self, request: Request) -> JSONResponse:
+        method = request.path_params["method"]
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and sum(self.calls.values()) % self.rate_limit_every == 0:
+            return JSONResponse({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                 "parameters": {"retry_after": self.retry_after}}, status_code=429)
+        params = json.loads(await request.body() or b"{}")
+        self.sent.append((method, params))
+        if method == "sendMessage":
+            self._message_ids += 1
+            return JSONResponse({"ok": True, "result": {"message_id": self._message_ids,
+                                                        "chat": {"id": params["chat_id"]}, "text": params["text"]}})
+        return JSONResponse({"ok": True, "result": True})
+
+    def sent_count(self, method: str) -> int:
+        return sum(1 for m, _ in self.sent if m == method)
+
+
+def make_update(update_id: int, user_id: int, text: str = "/start") -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": "Bench"}
+    return {"update_id": update_id, "message": {"message_id": update_id, "from": user,
+                                                 "chat": {"id": user_id, "type": "private"}, "date": 0, "text": text}}
+
+
+def install(fake: FakeTelegram) -> None:
+    """Routes the app's Bot API client to ``fake`` instead of the network."""
+    from app.bot import bot_api
+    bot_api._transport = httpx.ASGITransport(app=fake.app)
+    bot_api._client = None
@@ -0,0 +1,52 @@
+"""In-memory stand-in for the toncenter v2 API used by app/utils/ton_api.py.
+
+Answers getAddressBalance with a balance derived from the address, so runs
+are reproducible. ``latency`` emulates the round trip and ``failure_rate``
+the share of requests answered with 503.
+"""
+import asyncio
+import hashlib
+import random
+from collections import Counter
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class FakeToncenter:
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls: Counter = Counter()
+        self._random = random.Random(seed)
+        # TONCENTER_URL обычно содержит префикс /api/v2
+        self.app = Starlette(routes=[
+            Route("/getAddressBalance", self._balance, methods=["GET"]),
+            Route("/{prefix:path}/getAddressBalance", self._balance, methods=["GET"]),
+        ])
+
+    @staticmethod
+    def balance_of(address: str) -> int:
+        return int.from_bytes(hashlib.sha256(address.encode()).digest()[:4], "big") * 1000
+
+    async def _balance(self, request: Request) -> JSONResponse:
+        self.calls["getAddressBalance"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            return JSONResponse({"ok": False, "error": "Service unavailable"}, status_code=503)
+        address = request.query_params.get("address")
+        if not address:
+            return JSONResponse({"ok": False, "error": "address is required"}, status_code=416)
+        return JSONResponse({"ok": True, "result": str(self.balance_of(address))})
+
+
+def install(fake: FakeToncenter) -> None:
+    """Routes the app's toncenter client to ``fake`` instead of the network."""
+    from app.utils.ton_api import ton_client
+    ton_client._transport = httpx.ASGITransport(app=fake.app)
+    ton_client._client = None
+    ton_client._cache.clear()
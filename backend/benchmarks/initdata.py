@@ -0,0 +1,23 @@
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+from urllib.parse import quote
+
+
+def make_init_data(bot_token: str, user_id: int, *, username: Optional[str] = None, first_name: str = "Bench",
+                   start_param: str = "", auth_date: Optional[int] = None) -> str:
+    """Builds Telegram WebApp initData signed with ``bot_token``, as the Mini App sends it."""
+    user = {"id": user_id, "first_name": first_name, "username": username or f"user{user_id}"}
+    params = {
+        "auth_date": str(auth_date if auth_date is not None else int(time.time())),
+        "query_id": f"AAH{user_id}",
+        "user": json.dumps(user, separators=(",", ":")),
+    }
+    if start_param:
+        params["start_param"] = start_param
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(params.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    params["hash"] = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    return "&".join(f"{k}={quote(v, safe='')}" for k, v in params.items())
@@ -0,0 +1,236 @@
+"""Offline load-test scenarios against the full ASGI app.
+
+Runs the app with its lifespan (tap aggregator, referral queue, leaderboard,
+bot workers) against benchmarks.fake_supabase, benchmarks.fake_toncenter and
+benchmarks.fake_telegram, signing
+initData for synthetic users with benchmarks.initdata. Prints throughput and
+p50/p95/p99 per endpoint for every scenario; --json also writes the numbers
+to a file so runs can be compared over time.
+
+Run from backend/:  python -m benchmarks.loadtest [--scenario NAME ...] [--users N] [--latency MS] [--json FILE]
+Scenarios: login_storm, tap_flood, claim_spike, referral_wave, wallet_connect, bot_start_spike, retry_storm
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.fake_supabase import FakeSupabase, install
+from benchmarks.fake_telegram import FakeTelegram, install as install_telegram, make_update
+from benchmarks.fake_toncenter import FakeToncenter, install as install_toncenter
+from benchmarks.initdata import make_init_data
+from benchmarks.stats import report, summarize
+from app.core import log
+from app.core.config import settings
+from app.core.idempotency import idempotency_store
+from app.main import app
+from app.services.referral_queue import referral_queue
+
+
+class LoadClient:
+    """Sends signed requests with bounded concurrency and records latency per endpoint."""
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self._headers: Dict[tuple, dict] = {}
+
+    def headers(self, user_id: int, start_param: str = "") -> dict:
+        key = (user_id, start_param)
+        headers = self._headers.get(key)
+        if headers is None:
+            init_data = make_init_data(settings.BOT_TOKEN, user_id, start_param=start_param)
+            headers = self._headers[key] = {"Authorization": f"tma {init_data}"}
+        return headers
+
+    async def request(self, endpoint: str, method: str, url: str, user_id: int, start_param: str = "",
+                      body: Optional[dict] = None, headers: Optional[dict] = None) -> httpx.Response:
+        headers = headers or self.headers(user_id, start_param)
+        async with self.semaphore:
+            start = time.perf_counter()
+            response = await self.client.request(method, url, headers=headers, json=body)
+            self.samples[endpoint].append(time.perf_counter() - start)
+        self.statuses[endpoint][response.status_code] += 1
+        return response
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.statuses.clear()
+
+
+SCENARIOS: Dict[str, Callable] = {}
+telegram = FakeTelegram()
+
+
+def scenario(fn):
+    SCENARIOS[fn.__name__] = fn
+    return fn
+
+
+@scenario
+async def login_storm(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    # Все пользователи открывают Mini App одновременно, затем возвращаются
+    await asyncio.gather(*(lc.request("POST /api/v1/auth/login (first)", "POST", "/api/v1/auth/login", u)
+                           for u in users))
+    await asyncio.gather(*(lc.request("POST /api/v1/auth/login (returning)", "POST", "/api/v1/auth/login", u)
+                           for u in users))
+    return f"{fake.round_trips} Supabase round trips"
+
+
+@scenario
+async def tap_flood(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    for user_id in users:
+        fake.add_user(user_id, energy=10**9, max_energy=10**9)
+    requests = []
+    for i in range(args.taps):
+        for user_id in users:
+            requests.append(lc.request("POST /api/v1/mini_tap", "POST", "/api/v1/mini_tap", user_id))
+            if i % 10 == 9:
+                requests.append(lc.request("GET /api/v1/update_energy/{user_id}", "GET",
+                                           f"/api/v1/update_energy/{user_id}", user_id))
+    await asyncio.gather(*requests)
+    return f"{fake.calls['RPC apply_taps']} apply_taps writes for {args.taps * len(users)} taps"
+
+
+@scenario
+async def claim_spike(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    # Полночь: все забирают ежедневную награду, повторная попытка отклоняется
+    for user_id in users:
+        fake.add_user(user_id)
+    url = "/api/v1/claim_daily_points/{user_id}"
+    await asyncio.gather(*(lc.request(f"POST {url}", "POST", url.format(user_id=u), u) for u in users))
+    await asyncio.gather(*(lc.request(f"POST {url} (repeat)", "POST", url.format(user_id=u), u) for u in users))
+    await asyncio.gather(*(lc.request(f"GET {url}", "GET", url.format(user_id=u), u) for u in users))
+    return ""
+
+
+@scenario
+async def referral_wave(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    # Каждый десятый пользователь приглашает остальных по ссылке ref_<id>
+    referrers = users[::10]
+    for user_id in referrers:
+        fake.add_user(user_id)
+    invited = [u for u in users if (u - users.start) % 10]
+    await asyncio.gather(*(lc.request("POST /api/v1/auth/login (ref_)", "POST", "/api/v1/auth/login", u,
+                                      start_param=f"ref_{referrers[(u - users.start) // 10]}") for u in invited))
+    start = time.perf_counter()
+    # Пара остаётся в _pending, пока её не зачислят или не отправят в dead-letter, в том числе
+    # пока воркер обрабатывает уже взятую из очереди пачку
+    while referral_queue._pending:
+        await asyncio.sleep(0.01)
+    drained = time.perf_counter() - start
+    await asyncio.gather(*(lc.request("GET /api/v1/referrals", "GET", f"/api/v1/referrals?user_id={u}", u)
+                           for u in referrers))
+    credited = referral_queue.stats()["statuses"].get("credited", 0)
+    return f"{credited} referrals credited, queue drained {drained * 1000:.0f} ms after the last login"
+
+
+@scenario
+async def wallet_connect(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    for user_id in users:
+        fake.add_user(user_id)
+    await asyncio.gather(*(lc.request("POST /api/v1/wallet/connect", "POST", "/api/v1/wallet/connect", u,
+                                      body={"wallet": f"EQ{u:046d}"}) for u in users))
+    return ""
+
+
+@scenario
+async def bot_start_spike(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    # Рекламная кампания: все пользователи одновременно нажимают /start в боте
+    headers = {"X-Telegram-Bot-Api-Secret-Token": settings.BOT_WEBHOOK_SECRET}
+    responses = await asyncio.gather(*(lc.request("POST /telegram/webhook", "POST", "/telegram/webhook", u,
+                                                  body=make_update(u, u, f"/start ref_{users.start}"), headers=headers)
+                                       for u in users))
+    # Отклонённые при полной очереди (503) Telegram доставил бы повторно
+    accepted = sum(1 for r in responses if r.status_code == 200)
+    start = time.perf_counter()
+    while telegram.sent_count("sendMessage") < accepted:
+        await asyncio.sleep(0.01)
+    drained = time.perf_counter() - start
+    return (f"{accepted} updates accepted, {len(users) - accepted} rejected as busy, "
+            f"replies done {drained * 1000:.0f} ms after the last update")
+
+
+@scenario
+async def retry_storm(lc: LoadClient, fake: FakeSupabase, users: range, args) -> str:
+    # Плохая сеть: клиент отправляет каждый запрос трижды подряд и ещё раз после ответа, с одним Idempotency-Key
+    for user_id in users:
+        fake.add_user(user_id)
+    stats = idempotency_store.stats()
+
+    async def attempts(endpoint: str, url: str, user_id: int, body: Optional[dict] = None) -> None:
+        headers = {**lc.headers(user_id), "Idempotency-Key": f"{endpoint} {user_id}"}
+        await asyncio.gather(*(lc.request(endpoint, "POST", url, user_id, body=body, headers=headers) for _ in range(3)))
+        await lc.request(f"{endpoint} (late retry)", "POST", url, user_id, body=body, headers=headers)
+
+    url = "/api/v1/claim_daily_points/{user_id}"
+    await asyncio.gather(*(attempts(f"POST {url}", url.format(user_id=u), u) for u in users))
+    await asyncio.gather(*(attempts("POST /api/v1/wallet/connect", "/api/v1/wallet/connect", u,
+                                    body={"wallet": f"EQ{u:046d}"}) for u in users))
+    after = idempotency_store.stats()
+    executed = after["executed"] - stats["executed"]
+    replayed = after["replayed"] - stats["replayed"]
+    coalesced = after["coalesced"] - stats["coalesced"]
+    return (f"{executed} executed, {coalesced} coalesced, {replayed} replayed; "
+            f"{fake.round_trips / (2 * len(users)):.1f} Supabase round trips per logical request")
+
+
+async def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--taps", type=int, default=10, help="taps per user in tap_flood")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=2.0, help="emulated Supabase round trip, ms")
+    parser.add_argument("--ton-latency", type=float, default=20.0, help="emulated toncenter round trip, ms")
+    parser.add_argument("--telegram-latency", type=float, default=30.0, help="emulated Bot API round trip, ms")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--log", action="store_true", help="keep application logging on")
+    args = parser.parse_args(argv)
+
+    if not args.log:
+        log.shutdown_logging()
+        logging.getLogger().setLevel(logging.WARNING)
+
+    fake = FakeSupabase(latency=args.latency / 1000)
+    install(fake)
+    install_toncenter(FakeToncenter(latency=args.ton_latency / 1000))
+    telegram.latency = args.telegram_latency / 1000
+    install_telegram(telegram)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            lc = LoadClient(client, args.concurrency)
+            for index, name in enumerate(args.scenario or SCENARIOS):
+                users = range(10_000_000 * (index + 1), 10_000_000 * (index + 1) + args.users)
+                lc.reset()
+                fake.calls.clear()
+                start = time.perf_counter()
+                note = await SCENARIOS[name](lc, fake, users, args)
+                elapsed = time.perf_counter() - start
+                print(f"== {name}: {elapsed:.2f} s{', ' + note if note else ''}")
+                results[name] = {}
+                for endpoint, samples in lc.samples.items():
+                    statuses = dict(lc.statuses[endpoint])
+                    extra = "" if set(statuses) == {200} else f"   statuses {statuses}"
+                    report(endpoint, samples, elapsed, extra)
+                    results[name][endpoint] = dict(summarize(samples, elapsed), statuses=statuses)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
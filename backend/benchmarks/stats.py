@@ -0,0 +1,31 @@
+from typing import Dict, List
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """Request count, throughput and latency percentiles in ms, as stored in --json results."""
+    p = percentiles(samples)
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(p["p50"] * 1000, 3),
+        "p95_ms": round(p["p95"] * 1000, 3),
+        "p99_ms": round(p["p99"] * 1000, 3),
+    }
+
+
+def report(name: str, samples: List[float], elapsed: float, extra: str = "") -> None:
+    """Prints throughput and latency percentiles (samples in seconds)."""
+    s = summarize(samples, elapsed)
+    print(f"{name:<34} {s['rps']:>9,.0f} req/s   p50 {s['p50_ms']:7.2f} ms   "
+          f"p95 {s['p95_ms']:7.2f} ms   p99 {s['p99_ms']:7.2f} ms{extra}")
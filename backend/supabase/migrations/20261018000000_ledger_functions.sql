@@ -0,0 +1,146 @@
+-- Атомарные операции с балансом offchain_points: проверка и изменение за один
+-- запрос. Вызываются из app/core/ledger.py через PostgREST RPC (service key).
+
+create unique index if not exists completed_tasks_user_task_key on completed_tasks (user_id, task_id);
+create unique index if not exists referrals_referral_id_key on referrals (referral_id);
+
+-- Начисление очков/билетов; возвращает новый баланс
+create or replace function increment_balance(p_user_id bigint, p_points integer default 0, p_tickets integer default 0)
+returns table (points integer, tickets integer)
+language sql
+as $$
+    update offchain_points o
+       set points = o.points + p_points,
+           tickets = o.tickets + p_tickets
+     where o.user_id = p_user_id
+    returning o.points, o.tickets;
+$$;
+
+-- Ежедневный бонус: раз в 24 часа, серия растёт, если прошло меньше 48 часов
+create or replace function claim_daily_tickets(p_user_id bigint, p_max_streak integer default 7)
+returns table (claimed boolean, tickets integer, claim_streak integer, last_claim_date timestamptz)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_row offchain_points%rowtype;
+    v_now timestamptz := now();
+    v_streak integer;
+begin
+    select * into v_row from offchain_points o where o.user_id = p_user_id for update;
+    if not found then
+        return;
+    end if;
+
+    if v_row.last_claim_date is not null and v_now - v_row.last_claim_date < interval '24 hours' then
+        return query select false, v_row.tickets, v_row.claim_streak, v_row.last_claim_date;
+        return;
+    end if;
+
+    if v_row.last_claim_date is not null and v_now - v_row.last_claim_date < interval '48 hours' then
+        v_streak := least(coalesce(v_row.claim_streak, 0) + 1, p_max_streak);
+    else
+        v_streak := 1;
+    end if;
+
+    return query
+        update offchain_points o
+           set tickets = o.tickets + v_streak,
+               claim_streak = v_streak,
+               last_claim_date = v_now
+         where o.user_id = p_user_id
+        returning true, o.tickets, o.claim_streak, o.last_claim_date;
+end;
+$$;
+
+-- Выполнение задания: отметка и начисление очков; повтор возвращает completed = false
+create or replace function complete_task(p_user_id bigint, p_task_id text, p_points integer)
+returns table (completed boolean, points integer, completed_at timestamptz)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_completed_at timestamptz;
+begin
+    perform 1 from offchain_points o where o.user_id = p_user_id for update;
+    if not found then
+        return;
+    end if;
+
+    insert into completed_tasks (user_id, task_id)
+    values (p_user_id, p_task_id)
+    on conflict (user_id, task_id) do nothing
+    returning completed_tasks.completed_at into v_completed_at;
+
+    if v_completed_at is null then
+        return query
+            select false, o.points, t.completed_at
+              from offchain_points o
+              join completed_tasks t on t.user_id = o.user_id and t.task_id = p_task_id
+             where o.user_id = p_user_id;
+        return;
+    end if;
+
+    return query
+        update offchain_points o
+           set points = o.points + p_points
+         where o.user_id = p_user_id
+        returning true, o.points, v_completed_at;
+end;
+$$;
+
+-- Зачисление реферала: проверки, лимит, запись и награда рефереру в одной транзакции
+create or replace function credit_referral(p_referrer_user_id bigint, p_referral_id bigint, p_reward integer, p_max_referrals integer)
+returns table (status text)
+language plpgsql
+as $$
+declare
+    v_referrer_id bigint;
+begin
+    if exists (select 1 from referrals r where r.referral_id = p_referral_id) then
+        return query select 'already_referred'::text;
+        return;
+    end if;
+
+    select u.id into v_referrer_id from users u where u.user_id = p_referrer_user_id;
+    if not found then
+        return query select 'invalid_referrer'::text;
+        return;
+    end if;
+
+    -- Блокируем строку реферера, чтобы параллельные зачисления не превысили лимит
+    perform 1 from offchain_points o where o.user_id = p_referrer_user_id for update;
+    if not found then
+        return query select 'referrer_without_points'::text;
+        return;
+    end if;
+
+    if (select count(*) from referrals r where r.referrer_id = v_referrer_id) >= p_max_referrals then
+        return query select 'limit_reached'::text;
+        return;
+    end if;
+
+    insert into referrals (referrer_id, referral_id)
+    values (v_referrer_id, p_referral_id)
+    on conflict (referral_id) do nothing;
+    if not found then
+        return query select 'already_referred'::text;
+        return;
+    end if;
+
+    update offchain_points o
+       set tickets = o.tickets + p_reward
+     where o.user_id = p_referrer_user_id;
+    return query select 'credited'::text;
+    return;
+end;
+$$;
+
+revoke execute on function increment_balance(bigint, integer, integer) from public, anon, authenticated;
+revoke execute on function claim_daily_tickets(bigint, integer) from public, anon, authenticated;
+revoke execute on function complete_task(bigint, text, integer) from public, anon, authenticated;
+revoke execute on function credit_referral(bigint, bigint, integer, integer) from public, anon, authenticated;
+grant execute on function increment_balance(bigint, integer, integer) to service_role;
+grant execute on function claim_daily_tickets(bigint, integer) to service_role;
+grant execute on function complete_task(bigint, text, integer) to service_role;
+grant execute on function credit_referral(bigint, bigint, integer, integer) to service_role;
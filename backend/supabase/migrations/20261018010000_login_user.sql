@@ -0,0 +1,36 @@
+-- Вход пользователя за один запрос: возвращает строку offchain_points, а при первом
+-- входе сначала создаёт users и offchain_points (идемпотентно); user_id_fk = users.id.
+
+create unique index if not exists users_user_id_key on users (user_id);
+create unique index if not exists offchain_points_user_id_key on offchain_points (user_id);
+
+create or replace function login_user(p_user_id bigint, p_username text, p_first_name text, p_photo_url text)
+returns setof offchain_points
+language plpgsql
+as $$
+declare
+    v_id bigint;
+begin
+    -- Обычно пользователь уже есть: одно чтение, без вставок и блокировок
+    return query select * from offchain_points o where o.user_id = p_user_id;
+    if found then
+        return;
+    end if;
+
+    insert into users (user_id, username, first_name, photo_url)
+    values (p_user_id, p_username, p_first_name, p_photo_url)
+    on conflict (user_id) do nothing;
+
+    select u.id into v_id from users u where u.user_id = p_user_id;
+
+    insert into offchain_points (user_id, user_id_fk, points, tickets, hearts, energy, max_energy,
+                                 last_energy_update, last_claim_date, claim_streak)
+    values (p_user_id, v_id, 0, 0, 0, 100, 100, now(), null, 0)
+    on conflict (user_id) do nothing;
+
+    return query select * from offchain_points o where o.user_id = p_user_id;
+end;
+$$;
+
+revoke execute on function login_user(bigint, text, text, text) from public, anon, authenticated;
+grant execute on function login_user(bigint, text, text, text) to service_role;
@@ -0,0 +1,23 @@
+-- Пакетное зачисление рефералов для фоновой очереди: один запрос на много
+-- пар (referrer, referral). Повтор пары безопасен — credit_referral вернёт
+-- already_referred.
+
+create or replace function credit_referrals(p_items jsonb, p_reward integer, p_max_referrals integer)
+returns table (referrer_user_id bigint, referral_id bigint, status text)
+language plpgsql
+as $$
+declare
+    v_item jsonb;
+begin
+    for v_item in select * from jsonb_array_elements(p_items) loop
+        referrer_user_id := (v_item->>'referrer_user_id')::bigint;
+        referral_id := (v_item->>'referral_id')::bigint;
+        select c.status into status
+          from credit_referral(referrer_user_id, referral_id, p_reward, p_max_referrals) c;
+        return next;
+    end loop;
+end;
+$$;
+
+revoke execute on function credit_referrals(jsonb, integer, integer) from public, anon, authenticated;
+grant execute on function credit_referrals(jsonb, integer, integer) to service_role;
@@ -0,0 +1,75 @@
+-- Счётчик рефералов у реферера вместо count(*) по referrals при каждом зачислении,
+-- и представление для списка рефералов одним запросом с keyset-пагинацией.
+
+alter table users add column if not exists referral_count integer not null default 0;
+
+update users u
+   set referral_count = c.n
+  from (select referrer_id, count(*) as n from referrals group by referrer_id) c
+ where c.referrer_id = u.id;
+
+create index if not exists referrals_referrer_id_idx on referrals (referrer_id, referral_id);
+
+create or replace view referral_list with (security_invoker = true) as
+select referrer.user_id as referrer_user_id,
+       r.referral_id,
+       u.user_id,
+       u.username,
+       u.first_name,
+       u.photo_url
+  from referrals r
+  join users referrer on referrer.id = r.referrer_id
+  join users u on u.id = r.referral_id;
+
+create or replace function credit_referral(p_referrer_user_id bigint, p_referral_id bigint, p_reward integer, p_max_referrals integer)
+returns table (status text)
+language plpgsql
+as $$
+declare
+    v_referrer_id bigint;
+    v_referral_count integer;
+begin
+    if exists (select 1 from referrals r where r.referral_id = p_referral_id) then
+        return query select 'already_referred'::text;
+        return;
+    end if;
+
+    -- Блокировка строки реферера сериализует зачисления и защищает лимит от гонок
+    select u.id, u.referral_count into v_referrer_id, v_referral_count
+      from users u
+     where u.user_id = p_referrer_user_id
+       for update;
+    if not found then
+        return query select 'invalid_referrer'::text;
+        return;
+    end if;
+
+    perform 1 from offchain_points o where o.user_id = p_referrer_user_id;
+    if not found then
+        return query select 'referrer_without_points'::text;
+        return;
+    end if;
+
+    if v_referral_count >= p_max_referrals then
+        return query select 'limit_reached'::text;
+        return;
+    end if;
+
+    insert into referrals (referrer_id, referral_id)
+    values (v_referrer_id, p_referral_id)
+    on conflict (referral_id) do nothing;
+    if not found then
+        return query select 'already_referred'::text;
+        return;
+    end if;
+
+    update users u
+       set referral_count = u.referral_count + 1
+     where u.id = v_referrer_id;
+    update offchain_points o
+       set tickets = o.tickets + p_reward
+     where o.user_id = p_referrer_user_id;
+    return query select 'credited'::text;
+    return;
+end;
+$$;
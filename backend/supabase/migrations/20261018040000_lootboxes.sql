@@ -0,0 +1,45 @@
+-- Открытие лутбоксов: награды выбирает сервер (app/services/lootbox.py), функция
+-- списывает билеты, начисляет награды и записывает исход в одной транзакции.
+
+create table if not exists lootbox_openings (
+    id bigint generated always as identity primary key,
+    user_id bigint not null,
+    lootbox_id text not null,
+    cost integer not null,
+    points integer not null,
+    tickets integer not null,
+    rewards jsonb not null,
+    opened_at timestamptz not null default now()
+);
+
+create index if not exists lootbox_openings_user_id_idx on lootbox_openings (user_id, opened_at);
+
+alter table lootbox_openings enable row level security;
+
+-- opened = false (баланс не изменён), если билетов меньше p_cost; пусто, если нет строки offchain_points
+create or replace function open_lootboxes(p_user_id bigint, p_lootbox_id text, p_cost integer,
+                                          p_points integer, p_tickets integer, p_rewards jsonb)
+returns table (opened boolean, points integer, tickets integer)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+    return query
+        update offchain_points o
+           set tickets = o.tickets - p_cost + p_tickets,
+               points = o.points + p_points
+         where o.user_id = p_user_id
+           and o.tickets >= p_cost
+        returning true, o.points, o.tickets;
+    if found then
+        insert into lootbox_openings (user_id, lootbox_id, cost, points, tickets, rewards)
+        values (p_user_id, p_lootbox_id, p_cost, p_points, p_tickets, p_rewards);
+        return;
+    end if;
+
+    return query select false, o.points, o.tickets from offchain_points o where o.user_id = p_user_id;
+end;
+$$;
+
+revoke execute on function open_lootboxes(bigint, text, integer, integer, integer, jsonb) from public, anon, authenticated;
+grant execute on function open_lootboxes(bigint, text, integer, integer, integer, jsonb) to service_role;
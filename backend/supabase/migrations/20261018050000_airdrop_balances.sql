@@ -0,0 +1,11 @@
+-- Снимок для аирдропа: балансы пользователей с подключённым кошельком одним запросом.
+-- Выгрузка читает представление страницами по user_id (keyset по offchain_points_user_id_key).
+
+create or replace view airdrop_balances with (security_invoker = true) as
+select o.user_id,
+       u.wallet,
+       o.points
+  from offchain_points o
+  join users u on u.id = o.user_id_fk
+ where u.wallet is not null
+   and u.wallet <> 'mock_wallet';
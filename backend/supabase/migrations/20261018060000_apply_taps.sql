@@ -0,0 +1,51 @@
+-- Запись накопленных тапов приращением: каждый экземпляр API передаёт только число
+-- своих тапов, а энергия пересчитывается по строке в БД под блокировкой. Так записи
+-- нескольких воркеров (или serverless-вызовов) складываются, а не затирают друг друга.
+
+-- Применяет до p_taps тапов, сколько позволяет энергия; возвращает новое состояние строки
+create or replace function apply_taps(p_user_id bigint, p_taps integer, p_regen_seconds integer)
+returns table (applied integer, hearts integer, energy integer, last_energy_update timestamptz)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_row offchain_points%rowtype;
+    v_now timestamptz := now();
+    v_last timestamptz;
+    v_available integer;
+    v_applied integer;
+    v_anchor timestamptz;
+begin
+    select * into v_row from offchain_points o where o.user_id = p_user_id for update;
+    if not found then
+        return;
+    end if;
+
+    -- Та же формула, что и в app/utils/energy.py: +1 каждые p_regen_seconds, не больше max_energy
+    v_last := coalesce(v_row.last_energy_update, v_now - make_interval(secs => p_regen_seconds));
+    if v_row.energy >= v_row.max_energy then
+        v_available := v_row.energy;
+    else
+        v_available := least(v_row.max_energy,
+                             v_row.energy + greatest(0, floor(extract(epoch from v_now - v_last) / p_regen_seconds)::integer));
+    end if;
+
+    v_applied := least(greatest(p_taps, 0), v_available);
+    if v_available >= v_row.max_energy then
+        v_anchor := v_now;
+    else
+        v_anchor := v_last + make_interval(secs => (v_available - v_row.energy) * p_regen_seconds);
+    end if;
+
+    return query
+        update offchain_points o
+           set hearts = o.hearts + v_applied,
+               energy = v_available - v_applied,
+               last_energy_update = v_anchor
+         where o.user_id = p_user_id
+        returning v_applied, o.hearts, o.energy, o.last_energy_update;
+end;
+$$;
+
+revoke execute on function apply_taps(bigint, integer, integer) from public, anon, authenticated;
+grant execute on function apply_taps(bigint, integer, integer) to service_role;
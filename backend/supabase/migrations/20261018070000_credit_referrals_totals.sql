@@ -0,0 +1,32 @@
+-- credit_referrals возвращает для зачисленной пары итоговые билеты и число рефералов
+-- реферера: очередь отправляет их клиенту снимком, а не приращением.
+
+drop function if exists credit_referrals(jsonb, integer, integer);
+
+create function credit_referrals(p_items jsonb, p_reward integer, p_max_referrals integer)
+returns table (referrer_user_id bigint, referral_id bigint, status text, tickets integer, referral_count integer)
+language plpgsql
+as $$
+declare
+    v_item jsonb;
+begin
+    for v_item in select * from jsonb_array_elements(p_items) loop
+        referrer_user_id := (v_item->>'referrer_user_id')::bigint;
+        referral_id := (v_item->>'referral_id')::bigint;
+        tickets := null;
+        referral_count := null;
+        select c.status into status
+          from credit_referral(referrer_user_id, referral_id, p_reward, p_max_referrals) c;
+        if status = 'credited' then
+            select o.tickets, u.referral_count into tickets, referral_count
+              from users u
+              join offchain_points o on o.user_id = u.user_id
+             where u.user_id = referrer_user_id;
+        end if;
+        return next;
+    end loop;
+end;
+$$;
+
+revoke execute on function credit_referrals(jsonb, integer, integer) from public, anon, authenticated;
+grant execute on function credit_referrals(jsonb, integer, integer) to service_role;
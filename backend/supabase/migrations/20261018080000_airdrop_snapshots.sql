@@ -0,0 +1,54 @@
+-- Снимок балансов для аирдропа на один момент времени: строки airdrop_balances копируются
+-- одним insert ... select (один снимок MVCC), и выгрузка читает страницами уже копию.
+-- Тапы и начисления во время выгрузки не сдвигают распределение, а возобновлённая
+-- выгрузка дочитывает тот же снимок.
+
+create table if not exists airdrop_snapshots (
+    id bigint generated always as identity primary key,
+    min_points integer not null,
+    holders integer not null default 0,
+    points bigint not null default 0,
+    taken_at timestamptz not null default now()
+);
+
+create table if not exists airdrop_snapshot_rows (
+    snapshot_id bigint not null references airdrop_snapshots (id) on delete cascade,
+    user_id bigint not null,
+    wallet text not null,
+    points integer not null,
+    primary key (snapshot_id, user_id)
+);
+
+alter table airdrop_snapshots enable row level security;
+alter table airdrop_snapshot_rows enable row level security;
+
+-- Копирует держателей с points >= p_min_points; возвращает id снимка, время и итоги
+create or replace function take_airdrop_snapshot(p_min_points integer)
+returns table (snapshot_id bigint, taken_at timestamptz, holders integer, points bigint)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_id bigint;
+begin
+    insert into airdrop_snapshots (min_points) values (p_min_points) returning id into v_id;
+
+    insert into airdrop_snapshot_rows (snapshot_id, user_id, wallet, points)
+    select v_id, b.user_id, b.wallet, b.points
+      from airdrop_balances b
+     where b.points >= p_min_points;
+
+    return query
+        update airdrop_snapshots s
+           set holders = t.holders,
+               points = t.points
+          from (select count(*)::integer as holders, coalesce(sum(r.points), 0)::bigint as points
+                  from airdrop_snapshot_rows r
+                 where r.snapshot_id = v_id) t
+         where s.id = v_id
+        returning s.id, s.taken_at, s.holders, s.points;
+end;
+$$;
+
+revoke execute on function take_airdrop_snapshot(integer) from public, anon, authenticated;
+grant execute on function take_airdrop_snapshot(integer) to service_role;
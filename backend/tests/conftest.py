@@ -0,0 +1,24 @@
+import pytest
+
+# Тесты работают офлайн на тех же заглушках, что и бенчмарки
+from benchmarks import _env  # noqa: F401
+
+
+@pytest.fixture(autouse=True, scope="session")
+def direct_logging():
+    # app.main при импорте запускает поток записи логов в stdout; в тестах записи собирает pytest
+    from app.core import log
+    log.shutdown_logging()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_supabase():
+    from benchmarks.fake_supabase import FakeSupabase, install
+    fake = FakeSupabase()
+    install(fake)
+    return fake
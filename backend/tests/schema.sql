@@ -0,0 +1,54 @@
+-- Исходные таблицы проекта Supabase, поверх которых применяются supabase/migrations;
+-- только столбцы, с которыми работает backend.
+
+do $$
+begin
+    if not exists (select 1 from pg_roles where rolname = 'anon') then
+        create role anon nologin;
+    end if;
+    if not exists (select 1 from pg_roles where rolname = 'authenticated') then
+        create role authenticated nologin;
+    end if;
+    if not exists (select 1 from pg_roles where rolname = 'service_role') then
+        create role service_role nologin;
+    end if;
+end;
+$$;
+
+create table users (
+    id bigint generated by default as identity primary key,
+    user_id bigint not null,
+    username text,
+    first_name text,
+    photo_url text,
+    wallet text,
+    created_at timestamptz not null default now()
+);
+
+create table offchain_points (
+    id bigint generated by default as identity primary key,
+    user_id bigint not null,
+    user_id_fk bigint references users (id),
+    points integer not null default 0,
+    tickets integer not null default 0,
+    hearts integer not null default 0,
+    energy integer not null default 100,
+    max_energy integer not null default 100,
+    last_energy_update timestamptz default now(),
+    last_claim_date timestamptz,
+    claim_streak integer not null default 0
+);
+
+create table referrals (
+    id bigint generated by default as identity primary key,
+    referrer_id bigint not null references users (id),
+    referral_id bigint not null,
+    created_at timestamptz not null default now()
+);
+
+create table completed_tasks (
+    id bigint generated by default as identity primary key,
+    user_id bigint not null,
+    task_id text not null,
+    completed_at timestamptz not null default now()
+);
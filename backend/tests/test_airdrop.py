@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from app.core.repository import points_repo
+from app.services.airdrop import AirdropSnapshot
+
+pytestmark = pytest.mark.anyio
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def holders(fake_supabase):
+    for user_id in range(1, 26):
+        user = fake_supabase.add_user(user_id, points=user_id * 10)
+        user["wallet"] = f"UQ{user_id}" if user_id % 5 else "mock_wallet"
+    return fake_supabase
+
+
+def snapshot(out_dir, **kw) -> AirdropSnapshot:
+    return AirdropSnapshot(str(out_dir), chunk_rows=kw.pop("chunk_rows", 4), page_size=3, min_points=30,
+                           units_per_point=2, **kw)
+
+
+def read_rows(out_dir, manifest) -> list:
+    return [json.loads(line) for c in manifest["chunks"] for line in (out_dir / c["file"]).read_text().splitlines()]
+
+
+async def test_export_lists_eligible_holders(holders, tmp_path):
+    manifest = await snapshot(tmp_path).run()
+
+    rows = read_rows(tmp_path, manifest)
+    assert [r["user_id"] for r in rows] == [u for u in range(3, 26) if u % 5]
+    assert all(r["amount"] == r["points"] * 2 for r in rows)
+    assert (manifest["rows"], manifest["points"]) == (manifest["snapshot"]["holders"], manifest["snapshot"]["points"])
+    assert manifest["snapshot"]["taken_at"]
+    assert holders.calls["RPC take_airdrop_snapshot"] == 1
+
+
+async def test_balance_changes_during_export_are_not_seen(holders, tmp_path, monkeypatch):
+    scan = points_repo.scan_snapshot
+    pages = 0
+
+    async def scan_while_tapping(*args):
+        nonlocal pages
+        pages += 1
+        # Между страницами баланс растёт у уже выгруженных и ещё не выгруженных пользователей
+        for row in holders.tables["offchain_points"]:
+            row["points"] += 1000
+        return await scan(*args)
+
+    monkeypatch.setattr(points_repo, "scan_snapshot", scan_while_tapping)
+    manifest = await snapshot(tmp_path).run()
+
+    assert pages > 1
+    assert {r["user_id"]: r["points"] for r in read_rows(tmp_path, manifest)} == {
+        u: u * 10 for u in range(3, 26) if u % 5}
+
+
+async def test_resume_reads_the_same_snapshot(holders, tmp_path, monkeypatch):
+    full = await snapshot(tmp_path / "full").run()
+    scan = points_repo.scan_snapshot
+    pages = 0
+
+    async def failing_scan(*args):
+        nonlocal pages
+        pages += 1
+        if pages > 3:
+            raise Interrupted()
+        return await scan(*args)
+
+    monkeypatch.setattr(points_repo, "scan_snapshot", failing_scan)
+    with pytest.raises(Interrupted):
+        await snapshot(tmp_path / "resumed").run()
+    monkeypatch.setattr(points_repo, "scan_snapshot", scan)
+    partial = json.loads((tmp_path / "resumed" / "manifest.json").read_text())
+    assert partial["chunks"] and not partial["complete"]
+
+    for row in holders.tables["offchain_points"]:
+        row["points"] += 1
+    resumed = await snapshot(tmp_path / "resumed").run()
+
+    assert resumed["snapshot"] == partial["snapshot"]
+    assert (resumed["sha256"], resumed["rows"], resumed["amount"]) == (full["sha256"], full["rows"], full["amount"])
+    assert holders.calls["RPC take_airdrop_snapshot"] == 2
+
+
+async def test_resume_with_other_parameters_is_rejected(holders, tmp_path):
+    await snapshot(tmp_path).run()
+    with pytest.raises(ValueError, match="other parameters"):
+        await snapshot(tmp_path, chunk_rows=5).run()
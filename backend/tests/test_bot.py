@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bot import BotApi, BotApiError, BotDispatcher, bot_dispatcher
+from app.core.config import settings
+from app.main import app
+from benchmarks.fake_telegram import FakeTelegram, install, make_update
+
+
+
+def make_api(fake: FakeTelegram) -> BotApi:
+    return BotApi("http://telegram", "123:abc", timeout=1.0, transport=httpx.ASGITransport(app=fake.app))
+
+
+@pytest.fixture
+def telegram():
+    return FakeTelegram()
+
+
+@pytest.mark.anyio
+async def test_without_workers_updates_are_handled_inline(telegram):
+    dispatcher = BotDispatcher(make_api(telegram), workers=2, queue_size=10)
+    assert await dispatcher.submit(make_update(1, 42, "/start ref_7"))
+
+    assert telegram.sent_count("sendMessage") == 1
+    assert telegram.sent[0][1]["chat_id"] == 42
+    assert dispatcher.stats()["processed"] == 1
+    await dispatcher.api.aclose()
+
+
+@pytest.mark.anyio
+async def test_duplicate_update_id_is_handled_once(telegram):
+    dispatcher = BotDispatcher(make_api(telegram), workers=2, queue_size=10)
+    await dispatcher.start()
+    try:
+        for _ in range(3):
+            assert await dispatcher.submit(make_update(1, 42))
+        assert await dispatcher.submit(make_update(2, 42))
+    finally:
+        await dispatcher.stop()
+
+    assert telegram.sent_count("sendMessage") == 2
+
+
+@pytest.mark.anyio
+async def test_full_queue_rejects_and_accepts_redelivery(telegram):
+    release = asyncio.Event()
+
+    async def slow(api, message, args):
+        await release.wait()
+
+    dispatcher = BotDispatcher(make_api(telegram), workers=1, queue_size=2)
+    dispatcher.commands["slow"] = slow
+    await dispatcher.start()
+    try:
+        assert await dispatcher.submit(make_update(1, 42, "/slow"))
+        await asyncio.sleep(0)  # воркер забирает первое обновление и ждёт
+        assert await dispatcher.submit(make_update(2, 42, "/slow"))
+        assert await dispatcher.submit(make_update(3, 42, "/slow"))
+        assert not await dispatcher.submit(make_update(4, 42, "/slow"))
+        assert dispatcher.stats()["rejected"] == 1
+
+        release.set()
+        await asyncio.wait_for(dispatcher._queue.join(), 1.0)
+        # Отклонённое обновление не запомнено — повторная доставка Telegram принимается
+        assert await dispatcher.submit(make_update(4, 42, "/slow"))
+    finally:
+        await dispatcher.stop()
+
+    assert dispatcher.stats()["processed"] == 4
+
+
+@pytest.mark.anyio
+async def test_handler_errors_are_counted(telegram):
+    async def broken(api, message, args):
+        raise RuntimeError("boom")
+
+    dispatcher = BotDispatcher(make_api(telegram), workers=1, queue_size=10)
+    dispatcher.commands["broken"] = broken
+    await dispatcher.submit(make_update(1, 42, "/broken"))
+    await dispatcher.submit(make_update(2, 42, "hello"))
+
+    assert (dispatcher.failed, dispatcher.processed) == (1, 0)
+    await dispatcher.api.aclose()
+
+
+@pytest.mark.anyio
+async def test_rate_limited_call_is_retried_once():
+    telegram = FakeTelegram(rate_limit_every=2, retry_after=0.01)
+    api = make_api(telegram)
+    try:
+        await api.send_message(42, "first")
+        await api.send_message(42, "second")
+    finally:
+        await api.aclose()
+
+    assert telegram.calls["sendMessage"] == 3
+    assert [params["text"] for _, params in telegram.sent] == ["first", "second"]
+
+
+@pytest.mark.anyio
+async def test_rate_limit_on_retry_raises():
+    telegram = FakeTelegram(rate_limit_every=1, retry_after=0.01)
+    api = make_api(telegram)
+    try:
+        with pytest.raises(BotApiError, match="429"):
+            await api.send_message(42, "hello")
+    finally:
+        await api.aclose()
+
+    assert telegram.calls["sendMessage"] == 2
+
+
+def test_webhook_route_checks_secret_and_reports_busy(telegram, monkeypatch):
+    install(telegram)
+    monkeypatch.setattr(settings, "BOT_WEBHOOK_SECRET", "secret")
+    client = TestClient(app)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "secret"}
+
+    assert client.post("/telegram/webhook", json=make_update(1, 42)).status_code == 403
+    assert client.post("/telegram/webhook", json=make_update(1, 42), headers=headers).json() == {"ok": True}
+    assert telegram.sent_count("sendMessage") == 1
+
+    async def busy(update):
+        return False
+
+    monkeypatch.setattr(bot_dispatcher, "submit", busy)
+    assert client.post("/telegram/webhook", json=make_update(2, 42), headers=headers).status_code == 503
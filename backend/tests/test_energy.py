@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.utils.energy import current_energy_batch, row_energy
+
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+REGEN = settings.ENERGY_REGEN_SECONDS
+
+
+def iso(seconds_ago: float) -> str:
+    return (NOW - timedelta(seconds=seconds_ago)).isoformat()
+
+
+ROWS = [
+    {"energy": 100, "max_energy": 100, "last_energy_update": iso(10 * REGEN)},
+    {"energy": 120, "max_energy": 100, "last_energy_update": iso(0)},
+    {"energy": 0, "max_energy": 100, "last_energy_update": iso(0)},
+    {"energy": 0, "max_energy": 100, "last_energy_update": iso(REGEN - 1)},
+    {"energy": 0, "max_energy": 100, "last_energy_update": iso(REGEN)},
+    {"energy": 40, "max_energy": 100, "last_energy_update": iso(7.5 * REGEN)},
+    {"energy": 40, "max_energy": 100, "last_energy_update": iso(7.5 * REGEN)},
+    {"energy": 95, "max_energy": 100, "last_energy_update": iso(1000 * REGEN)},
+    {"energy": 10, "max_energy": 100, "last_energy_update": iso(-5 * REGEN)},
+    {"energy": 10, "max_energy": 100, "last_energy_update": iso(3 * REGEN).replace("+00:00", "Z")},
+    {"energy": 10, "max_energy": 100, "last_energy_update": None},
+    {"energy": 10, "max_energy": 100, "last_energy_update": "now()"},
+    {"energy": 10, "max_energy": 100, "last_energy_update": "garbage"},
+    {"energy": 10, "max_energy": 100},
+]
+
+
+def test_batch_matches_current_energy_row_by_row():
+    assert current_energy_batch(ROWS, NOW) == [row_energy(row, NOW) for row in ROWS]
+
+
+def test_batch_matches_current_energy_over_time():
+    for step in range(0, 5 * REGEN, REGEN // 3 or 1):
+        now = NOW + timedelta(seconds=step)
+        assert current_energy_batch(ROWS, now) == [row_energy(row, now) for row in ROWS]
+
+
+def test_batch_of_nothing():
+    assert current_energy_batch([], NOW) == []
+
+
+@pytest.mark.parametrize("regen_seconds", [1, 60, 3600])
+def test_batch_honours_regen_seconds(regen_seconds):
+    row = {"energy": 0, "max_energy": 10_000, "last_energy_update": iso(7200)}
+    assert current_energy_batch([row], NOW, regen_seconds) == [7200 // regen_seconds]
+
+
+def test_admin_energy_reads_many_users(fake_supabase, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin")
+    fake_supabase.add_user(7101, energy=100)
+    fake_supabase.add_user(7102, energy=5, last_energy_update=datetime.now(timezone.utc).isoformat())
+    client = TestClient(app)
+
+    response = client.get("/api/v1/admin/energy", params={"user_id": [7101, 7102, 7103, 7101]},
+                          headers={"X-Admin-Token": "admin"})
+    assert response.status_code == 200
+    assert response.json() == {"energy": {"7101": 100, "7102": 5}}
+    assert fake_supabase.calls["GET offchain_points"] == 1
+
+    assert client.get("/api/v1/admin/energy", params={"user_id": [7101]}).status_code == 403
+    assert client.get("/api/v1/admin/energy", headers={"X-Admin-Token": "admin"}).json() == {"energy": {}}
+    too_many = {"user_id": list(range(settings.LEADERBOARD_MAX_LIMIT + 1))}
+    assert client.get("/api/v1/admin/energy", params=too_many, headers={"X-Admin-Token": "admin"}).status_code == 422
@@ -0,0 +1,84 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.etag import if_none_match
+from app.main import app
+from benchmarks.initdata import make_init_data
+
+
+def request_with(header: str) -> Request:
+    return Request({"type": "http", "headers": [(b"if-none-match", header.encode())]})
+
+
+@pytest.mark.parametrize("header, matched", [
+    ('W/"abc.1"', True),
+    ('"abc.1"', True),
+    ('W/"abc.0", W/"abc.1"', True),
+    ("*", True),
+    ('W/"abc.2"', False),
+    ("", False),
+])
+def test_if_none_match_compares_weakly(header, matched):
+    assert if_none_match(request_with(header), 'W/"abc.1"') is matched
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"tma {make_init_data(settings.BOT_TOKEN, user_id)}"}
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_claim_status_is_not_modified_until_claim(client, fake_supabase):
+    fake_supabase.add_user(9001)
+    url, headers = "/api/v1/claim_daily_points/9001", auth(9001)
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200 and first.json() == {"streak": 0, "nextClaimTimestamp": None}
+    tag = first.headers["ETag"]
+    reads = fake_supabase.calls["GET offchain_points"]
+
+    cached = client.get(url, headers={**headers, "If-None-Match": tag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == tag and not cached.content
+    assert fake_supabase.calls["GET offchain_points"] == reads
+
+    # Тап не меняет статус сбора — тег остаётся прежним
+    assert client.post("/api/v1/mini_tap", headers=headers).status_code == 200
+    assert client.get(url, headers={**headers, "If-None-Match": tag}).status_code == 304
+
+    assert client.post(url, headers=headers).status_code == 200
+    fresh = client.get(url, headers={**headers, "If-None-Match": tag})
+    assert fresh.status_code == 200 and fresh.json()["streak"] == 1
+    assert fresh.headers["ETag"] != tag
+    assert client.get(url, headers={**headers, "If-None-Match": fresh.headers["ETag"]}).status_code == 304
+
+
+def test_credited_referral_changes_referrals_etag(client, fake_supabase):
+    fake_supabase.add_user(9011)
+    fake_supabase.add_user(9012)
+    url, headers = "/api/v1/referrals?user_id=9011", auth(9011)
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200 and first.json()["referrals"] == []
+    tag = first.headers["ETag"]
+    assert client.get(url, headers={**headers, "If-None-Match": tag}).status_code == 304
+
+    registered = client.post("/api/v1/referrals/register", json={"referrer_id": 9011}, headers=auth(9012))
+    assert registered.status_code == 200
+    fresh = client.get(url, headers={**headers, "If-None-Match": tag})
+
+    assert fresh.status_code == 200 and len(fresh.json()["referrals"]) == 1
+    assert fresh.headers["ETag"] != tag
+
+
+def test_invite_link_is_not_modified(client):
+    url, headers = "/api/v1/referrals/invite-link?user_id=9021", auth(9021)
+    first = client.get(url, headers=headers)
+    tag = first.headers["ETag"]
+
+    cached = client.get(url, headers={**headers, "If-None-Match": tag})
+    assert cached.status_code == 304 and cached.headers["Cache-Control"] == first.headers["Cache-Control"]
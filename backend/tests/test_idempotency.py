@@ -0,0 +1,168 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.core.config import settings
+from app.core.idempotency import IdempotencyMiddleware, IdempotencyStore
+from app.main import app
+from benchmarks.initdata import make_init_data
+
+
+def auth(user_id: int, key: str = "") -> dict:
+    headers = {"Authorization": f"tma {make_init_data(settings.BOT_TOKEN, user_id)}"}
+    if key:
+        headers["Idempotency-Key"] = key
+    return headers
+
+
+class Handler:
+    """Counts calls; ``gate`` holds every call until it is set, ``failures`` answer 500 first."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.raises = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.started = asyncio.Event()
+
+    async def handle(self, request: Request) -> JSONResponse:
+        self.calls += 1
+        self.started.set()
+        await self.gate.wait()
+        if self.raises:
+            self.raises -= 1
+            raise RuntimeError("handler crashed")
+        if self.failures:
+            self.failures -= 1
+            return JSONResponse({"detail": "unavailable"}, status_code=500)
+        return JSONResponse({"call": self.calls, "body": (await request.body()).decode()})
+
+
+@pytest.fixture
+def handler():
+    return Handler()
+
+
+@pytest.fixture
+def store():
+    return IdempotencyStore(max_size=100, ttl=60.0, max_body=1024)
+
+
+@pytest.fixture
+async def client(handler, store):
+    inner = Starlette(routes=[Route("/spend", handler.handle, methods=["POST", "GET"])])
+    transport = httpx.ASGITransport(app=IdempotencyMiddleware(inner, store), raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.anyio
+async def test_repeat_gets_stored_response(client, handler, store):
+    first = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+    again = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json() == {"call": 1, "body": "1"}
+    assert again.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+    assert handler.calls == 1
+    assert (store.executed, store.replayed) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_key_is_scoped_to_user_and_ignored_without_it(client, handler):
+    await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+    other_user = await client.post("/spend", content=b"1", headers=auth(2, "k1"))
+    await client.post("/spend", content=b"1", headers=auth(1))
+    await client.post("/spend", content=b"1", headers={"Idempotency-Key": "k1"})
+    await client.get("/spend", headers=auth(1, "k1"))
+
+    assert other_user.json()["call"] == 2
+    assert handler.calls == 5
+
+
+@pytest.mark.anyio
+async def test_concurrent_repeats_are_coalesced(client, handler, store):
+    handler.gate.clear()
+    first = asyncio.create_task(client.post("/spend", content=b"1", headers=auth(1, "k1")))
+    await asyncio.wait_for(handler.started.wait(), 1.0)
+    second = asyncio.create_task(client.post("/spend", content=b"1", headers=auth(1, "k1")))
+    await asyncio.sleep(0.01)
+    assert store.in_flight and not second.done()
+
+    handler.gate.set()
+    first, second = await asyncio.gather(first, second)
+
+    assert second.json() == first.json() == {"call": 1, "body": "1"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert handler.calls == 1
+    assert (store.executed, store.coalesced) == (1, 1)
+    assert not store.in_flight
+
+
+@pytest.mark.anyio
+async def test_same_key_with_other_body_is_rejected(client, handler, store):
+    handler.gate.clear()
+    running = asyncio.create_task(client.post("/spend", content=b"1", headers=auth(1, "k1")))
+    await asyncio.wait_for(handler.started.wait(), 1.0)
+    while_running = await client.post("/spend", content=b"2", headers=auth(1, "k1"))
+    handler.gate.set()
+    await running
+    after = await client.post("/spend", content=b"2", headers=auth(1, "k1"))
+
+    for response in (while_running, after):
+        assert response.status_code == 422
+        assert response.json() == {"detail": "Idempotency-Key was used for a different request"}
+    assert handler.calls == 1
+    assert store.conflicts == 2
+
+
+@pytest.mark.anyio
+async def test_failed_request_is_not_stored(client, handler, store):
+    handler.failures = 1
+    failed = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+    retried = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+
+    assert failed.status_code == 500
+    assert retried.status_code == 200 and "Idempotent-Replayed" not in retried.headers
+    assert handler.calls == 2 and store.replayed == 0
+
+
+@pytest.mark.anyio
+async def test_crashed_handler_releases_the_key(client, handler, store):
+    handler.raises = 1
+    crashed = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+    retried = await client.post("/spend", content=b"1", headers=auth(1, "k1"))
+
+    assert crashed.status_code == 500
+    assert retried.status_code == 200 and handler.calls == 2
+    assert not store.in_flight and len(store.responses) == 1
+
+
+@pytest.mark.anyio
+async def test_invalid_key_is_rejected(client, handler):
+    response = await client.post("/spend", content=b"1", headers=auth(1, "x" * 256))
+
+    assert response.status_code == 400
+    assert handler.calls == 0
+
+
+def test_retried_add_credits_points_once(fake_supabase):
+    fake_supabase.add_user(9101, points=0)
+    client = TestClient(app)
+
+    first = client.post("/api/v1/add", json={}, headers=auth(9101, "add-1"))
+    again = client.post("/api/v1/add", json={}, headers=auth(9101, "add-1"))
+    other = client.post("/api/v1/add", json={}, headers=auth(9101, "add-2"))
+
+    assert first.json() == again.json() == {"points": {"points": 1000, "tickets": 0}}
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert other.json()["points"]["points"] == 2000
+    assert fake_supabase._points_by_user[9101]["points"] == 2000
+    assert fake_supabase.calls["RPC increment_balance"] == 2
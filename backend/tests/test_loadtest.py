@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks import loadtest
+from app.services.referral_queue import referral_queue
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_every_scenario_runs():
+    credited = referral_queue.stats()["statuses"].get("credited", 0)
+    argv = ["--users", "20", "--taps", "3", "--latency", "0", "--ton-latency", "0", "--telegram-latency", "0"]
+    results = await loadtest.main(argv)
+
+    assert set(results) == set(loadtest.SCENARIOS)
+    for name, endpoints in results.items():
+        assert endpoints, name
+        for endpoint, summary in endpoints.items():
+            # 503 — штатный отказ вебхука при полной очереди бота
+            assert all(status < 500 or status == 503 for status in summary["statuses"]), (name, endpoint)
+    # Каждый десятый из 20 пользователей приглашает остальных
+    # Очередь общая для всего процесса: считаем только зачисления этого прогона
+    assert referral_queue.stats()["statuses"].get("credited") - credited == 18
+    assert not referral_queue._pending
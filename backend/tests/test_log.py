@@ -0,0 +1,59 @@
+import logging
+import queue
+
+from app.core import log
+from app.core.config import settings
+from app.core.log import NonBlockingQueueHandler, RouteSampler, redact
+
+
+def make_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger("tests.log")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_message_is_fixed_when_logged():
+    handler = NonBlockingQueueHandler(queue.Queue(10))
+    logger = make_logger(handler)
+    items = ["a"]
+    logger.info("items %s", items)
+    items.append("b")
+
+    record = handler.queue.get_nowait()
+    assert record.getMessage() == "items ['a']"
+    assert record.args is None
+
+
+def test_full_queue_drops_records():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    logger = make_logger(handler)
+    for i in range(5):
+        logger.info("record %s", i)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_sampler_rates_apply_to_the_shared_sampler():
+    from app.main import sampler
+
+    try:
+        log.sampler.set_rates({"/api/v1/mini_tap": 0.0})
+        assert not sampler.sample("/api/v1/mini_tap")
+        assert sampler.sample("/api/v1/leaderboard/points")
+    finally:
+        log.sampler.set_rates(settings.LOG_SAMPLE_RATES)
+
+
+def test_longest_prefix_wins():
+    sampler = RouteSampler({"/api": 0.5, "/api/v1/admin": 1.0})
+    assert sampler.rate("/api/v1/admin/referrals/queue") == 1.0
+    assert sampler.rate("/api/v1/mini_tap") == 0.5
+    assert sampler.rate("/health") == 1.0
+
+
+def test_redact_masks_init_data():
+    assert redact("Authorization: tma query_id=1&user=%7B%7D&hash=abc") == "Authorization: tma [REDACTED]"
+    assert redact("GET /x?hash=abc&auth_date=1") == "GET /x?hash=[REDACTED]&auth_date=1"
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.lootbox import DEFAULT_CATALOG_PATH, LootboxEngine, load_catalog
+from app.utils.alias import AliasTable
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return load_catalog(DEFAULT_CATALOG_PATH)
+
+
+def test_fixed_seed_gives_same_draws(catalog):
+    first = LootboxEngine(catalog, max_batch=100, seed=42)
+    second = LootboxEngine(catalog, max_batch=100, seed=42)
+    draws = [first.draw(catalog["lootbox1"], 50) for _ in range(3)]
+
+    assert draws == [second.draw(catalog["lootbox1"], 50) for _ in range(3)]
+    assert draws != [LootboxEngine(catalog, max_batch=100, seed=43).draw(catalog["lootbox1"], 50) for _ in range(3)]
+
+
+@pytest.mark.parametrize("weights", [[600, 250, 100, 40, 9, 1], [0, 1, 3], [5, 0, 0, 5], [1]])
+def test_alias_frequencies_converge(weights):
+    draws = 200_000
+    counts = AliasTable(weights).counts(random.Random(7), draws)
+    total = sum(weights)
+
+    for weight, count in zip(weights, counts):
+        expected = draws * weight / total
+        if weight == 0:
+            assert count == 0
+        else:
+            # 5 стандартных отклонений биномиального распределения
+            sigma = (draws * weight / total * (1 - weight / total)) ** 0.5
+            assert abs(count - expected) <= 5 * sigma + 1
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1]])
+def test_alias_rejects_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+
+def test_draw_and_draw_many_agree():
+    table = AliasTable([3, 1, 6])
+    rng = random.Random(5)
+    single = [table.draw(rng) for _ in range(100)]
+    assert single == table.draw_many(random.Random(5), 100)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("count", [0, -1, 101])
+async def test_open_rejects_count_out_of_range(catalog, count):
+    engine = LootboxEngine(catalog, max_batch=100, seed=1)
+    with pytest.raises(HTTPException) as error:
+        await engine.open(1, "lootbox1", count)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_open_rejects_missing_lootbox(catalog):
+    engine = LootboxEngine(catalog, max_batch=100, seed=1)
+    with pytest.raises(HTTPException) as error:
+        await engine.open(1, "lootbox9", 1)
+    assert error.value.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_open_spends_tickets_and_credits_rewards(catalog, fake_supabase):
+    fake_supabase.add_user(1, points=0, tickets=12)
+    engine = LootboxEngine(catalog, max_batch=100, seed=3)
+    result = await engine.open(1, "lootbox2", 2)
+
+    assert len(result.rewards) == 2
+    assert result.points == sum(r.points for r in result.rewards)
+    assert result.tickets == 12 - 10 + sum(r.tickets for r in result.rewards)
+    opening = fake_supabase.tables["lootbox_openings"][0]
+    assert (opening["lootbox_id"], opening["cost"], sum(opening["rewards"].values())) == ("lootbox2", 10, 2)
+
+
+@pytest.mark.anyio
+async def test_open_with_too_few_tickets(catalog, fake_supabase):
+    fake_supabase.add_user(1, points=0, tickets=4)
+    engine = LootboxEngine(catalog, max_batch=100, seed=3)
+    with pytest.raises(HTTPException) as error:
+        await engine.open(1, "lootbox2", 1)
+
+    assert error.value.status_code == 400
+    assert fake_supabase._points_by_user[1]["tickets"] == 4
+    assert not fake_supabase.tables["lootbox_openings"]
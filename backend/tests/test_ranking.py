@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from app.utils.ranking import RankIndex, score_key, split_key
+
+# Наибольшие user_id: Telegram выдаёт до 52 значащих бит, в БД — bigint
+USER_IDS = [1, 777_000, (1 << 48) - 1, 1 << 48, (1 << 52) + 12345, (1 << 53) - 1, (1 << 63) - 1]
+
+
+@pytest.mark.parametrize("user_id", USER_IDS)
+@pytest.mark.parametrize("score", [0, 1, 10**9, 2**40])
+def test_split_key_round_trips(score, user_id):
+    assert split_key(score_key(score, user_id)) == (user_id, score)
+
+
+def test_keys_order_by_score_then_user_id():
+    rng = random.Random(5)
+    entries = [(rng.choice([0, 1, 5, 10**6]), user_id) for user_id in USER_IDS + [rng.getrandbits(52) for _ in range(200)]]
+
+    ordered = sorted(entries, key=lambda e: score_key(*e))
+
+    assert ordered == sorted(entries, key=lambda e: (-e[0], e[1]))
+
+
+def test_large_user_ids_rank_below_higher_scores():
+    index = RankIndex(score_key(score, user_id) for score, user_id in [(10, 1 << 52), (11, 5), (10, 7)])
+
+    assert [split_key(k) for k in index.slice(0, 3)] == [(5, 11), (7, 10), (1 << 52, 10)]
+    assert index.index(score_key(10, 1 << 52)) == 2
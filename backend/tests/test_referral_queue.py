@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.ledger import ledger
+from app.services.push import push_hub
+from app.services.referral_queue import REFERRAL_REWARD, ReferralQueue
+
+pytestmark = pytest.mark.anyio
+
+
+def make_queue(**kwargs) -> ReferralQueue:
+    options = dict(workers=1, batch_size=10, batch_wait=0.0, max_attempts=3, retry_delay=0.01, dead_letter_size=10)
+    return ReferralQueue(**{**options, **kwargs})
+
+
+async def test_without_workers_credits_inline(fake_supabase):
+    fake_supabase.add_user(1, tickets=0)
+    referral = fake_supabase.add_user(2)
+    queue = make_queue()
+
+    assert await queue.submit(2, 1, referral["id"])
+    assert fake_supabase._points_by_user[1]["tickets"] == REFERRAL_REWARD
+    assert queue.stats()["statuses"] == {"credited": 1}
+    assert not await queue.submit(2, 1, referral["id"])
+    assert fake_supabase.calls["RPC credit_referrals"] == 1
+
+
+async def test_referrer_gets_totals_not_deltas(fake_supabase):
+    fake_supabase.add_user(1, tickets=5)
+    referrals = [fake_supabase.add_user(100 + i) for i in range(2)]
+    subscriber = push_hub.subscribe(1)
+    try:
+        queue = make_queue()
+        for user in referrals:
+            await queue.submit(user["user_id"], 1, user["id"])
+        # Два зачисления до отправки сливаются в одно событие — в нём итог, а не последняя прибавка
+        assert await subscriber.next_events() == [
+            {"type": "referrals", "tickets": 5 + 2 * REFERRAL_REWARD, "referral_count": 2}]
+    finally:
+        push_hub.unsubscribe(subscriber)
+
+
+async def test_workers_credit_in_batches(fake_supabase):
+    fake_supabase.add_user(1, tickets=0)
+    referrals = [fake_supabase.add_user(100 + i) for i in range(5)]
+    queue = make_queue(batch_wait=0.01)
+    await queue.start()
+    try:
+        for user in referrals:
+            assert await queue.submit(user["user_id"], 1, user["id"])
+        await asyncio.wait_for(queue._queue.join(), 1.0)
+    finally:
+        await queue.stop()
+
+    assert fake_supabase._points_by_user[1]["tickets"] == 5 * REFERRAL_REWARD
+    assert fake_supabase.calls["RPC credit_referrals"] == 1
+
+
+async def test_jobs_missing_from_results_are_retried(fake_supabase, monkeypatch):
+    fake_supabase.add_user(1, tickets=0)
+    referrals = [fake_supabase.add_user(100 + i) for i in range(3)]
+    credit_referrals = ledger.credit_referrals
+    calls = 0
+
+    async def short_results(items, reward, max_referrals):
+        nonlocal calls
+        calls += 1
+        # Первый вызов обрабатывает только первую пару
+        return await credit_referrals(items[:1] if calls == 1 else items, reward, max_referrals)
+
+    monkeypatch.setattr(ledger, "credit_referrals", short_results)
+    queue = make_queue()
+    await queue.start()
+    try:
+        for user in referrals:
+            await queue.submit(user["user_id"], 1, user["id"])
+        for _ in range(100):
+            if not queue._pending:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+
+    assert not queue._pending
+    assert queue.retries == 2
+    assert queue.stats()["statuses"] == {"credited": 3}
+    assert fake_supabase._points_by_user[1]["tickets"] == 3 * REFERRAL_REWARD
+
+
+async def test_failing_jobs_go_to_dead_letters(fake_supabase, monkeypatch):
+    async def failing(items, reward, max_referrals):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(ledger, "credit_referrals", failing)
+    queue = make_queue()
+    assert await queue.submit(2, 1, 2)
+    for _ in range(100):
+        if queue.dead_letter:
+            break
+        await asyncio.sleep(0.01)
+
+    assert queue.dead_letters() == [{"referrer_user_id": 1, "referral_id": 2, "user_id": 2, "attempts": 3,
+                                     "error": "database unavailable"}]
+    assert not queue._pending
+
+
+def fail_first_calls(monkeypatch, times: int) -> None:
+    credit_referrals = ledger.credit_referrals
+    calls = 0
+
+    async def flaky(items, reward, max_referrals):
+        nonlocal calls
+        calls += 1
+        if calls <= times:
+            raise RuntimeError("database unavailable")
+        return await credit_referrals(items, reward, max_referrals)
+
+    monkeypatch.setattr(ledger, "credit_referrals", flaky)
+
+
+async def wait_for_retry(queue: ReferralQueue) -> None:
+    for _ in range(100):
+        if queue._retry_tasks:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("no retry scheduled")
+
+
+async def test_stop_drains_jobs_waiting_for_retry(fake_supabase, monkeypatch):
+    fake_supabase.add_user(1, tickets=0)
+    referral = fake_supabase.add_user(2)
+    fail_first_calls(monkeypatch, 1)
+    queue = make_queue(retry_delay=60.0)
+    await queue.start()
+    await queue.submit(2, 1, referral["id"])
+    await wait_for_retry(queue)
+
+    await queue.stop()
+
+    assert fake_supabase._points_by_user[1]["tickets"] == REFERRAL_REWARD
+    assert queue.stats()["statuses"] == {"credited": 1}
+    assert not queue.dead_letter and not queue._retry_tasks and not queue._pending
+
+
+async def test_stop_dead_letters_jobs_that_still_fail(fake_supabase, monkeypatch):
+    fail_first_calls(monkeypatch, 100)
+    queue = make_queue(retry_delay=60.0, max_attempts=10)
+    await queue.start()
+    await queue.submit(2, 1, 2)
+    await wait_for_retry(queue)
+
+    await queue.stop()
+
+    assert queue.dead_letters() == [{"referrer_user_id": 1, "referral_id": 2, "user_id": 2, "attempts": 2,
+                                     "error": "queue stopped during retry backoff"}]
+    assert not queue._retry_tasks and not queue._pending
+
+
+async def test_stop_without_workers_dead_letters_retries(fake_supabase, monkeypatch):
+    fail_first_calls(monkeypatch, 1)
+    queue = make_queue(retry_delay=60.0)
+    await queue.submit(2, 1, 2)
+    assert queue.stats()["retrying"] == 1
+
+    await queue.stop()
+
+    assert [job["error"] for job in queue.dead_letters()] == ["queue stopped during retry backoff"]
+    assert queue.stats()["retrying"] == 0
+
+
+async def test_stop_during_batch_wait_keeps_the_job(fake_supabase, monkeypatch):
+    fake_supabase.add_user(1, tickets=0)
+    referral = fake_supabase.add_user(2)
+    monkeypatch.setattr(settings, "REFERRAL_DRAIN_TIMEOUT", 0.01)
+    queue = make_queue(batch_wait=60.0)
+    await queue.start()
+    await queue.submit(2, 1, referral["id"])
+    await asyncio.sleep(0.01)
+
+    await queue.stop()
+
+    assert [job["error"] for job in queue.dead_letters()] == ["queue stopped before the job ran"]
+    assert fake_supabase._points_by_user[1]["tickets"] == 0
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+pytest.importorskip("tonutils.tonconnect")
+from app.storage import FileStorage, SQLiteStorage  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+def stored(path) -> dict:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT key, value FROM items"))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+async def test_items_survive_reopen(db_path):
+    storage = SQLiteStorage(db_path)
+    await storage.set_item("a", "1")
+    await storage.set_item("b", "2")
+    await storage.set_item("a", "3")
+    await storage.remove_item("b")
+    await storage.remove_item("missing")
+    storage.close()
+
+    reopened = SQLiteStorage(db_path)
+    try:
+        assert await reopened.get_item("a") == "3"
+        assert await reopened.get_item("b", "gone") == "gone"
+    finally:
+        reopened.close()
+
+
+async def test_concurrent_writes_to_one_key_commit_in_call_order(db_path):
+    storage = SQLiteStorage(db_path)
+    try:
+        for round_ in range(50):
+            await asyncio.gather(storage.set_item("k", f"first{round_}"), storage.set_item("k", f"second{round_}"),
+                                 storage.set_item("gone", "x"), storage.remove_item("gone"))
+            assert stored(db_path) == {"k": f"second{round_}"} == storage._data
+    finally:
+        storage.close()
+
+
+async def test_cancelled_caller_does_not_reorder_writes(db_path):
+    storage = SQLiteStorage(db_path)
+    try:
+        first = asyncio.create_task(storage.set_item("k", "old"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await storage.set_item("k", "new")
+    finally:
+        storage.close()
+    assert stored(db_path) == {"k": "new"}
+
+
+async def test_json_is_migrated_once(tmp_path):
+    legacy = tmp_path / "sessions.json"
+    legacy.write_text(json.dumps({"a": "1", "b": "2"}))
+
+    storage = FileStorage(str(legacy))
+    assert await storage.get_item("a") == "1" and await storage.get_item("b") == "2"
+    assert not legacy.exists() and (tmp_path / "sessions.json.migrated").exists()
+    await storage.set_item("a", "changed")
+    await storage.remove_item("b")
+    storage.close()
+
+    # Новый JSON не затирает записи, уже сохранённые в SQLite
+    legacy.write_text(json.dumps({"a": "stale", "c": "3"}))
+    storage = FileStorage(str(legacy))
+    try:
+        assert storage._data == {"a": "changed", "c": "3"}
+    finally:
+        storage.close()
+    assert stored(tmp_path / "sessions.sqlite3") == {"a": "changed", "c": "3"}
+
+
+async def test_empty_json_is_migrated(tmp_path):
+    legacy = tmp_path / "sessions.json"
+    legacy.write_text("")
+    storage = FileStorage(str(legacy))
+    try:
+        assert storage._data == {}
+        assert (tmp_path / "sessions.json.migrated").exists()
+    finally:
+        storage.close()
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.core.ledger import ledger
+from app.services.tap_aggregator import TapAggregator
+
+pytestmark = pytest.mark.anyio
+
+
+def make_aggregator(**kwargs) -> TapAggregator:
+    options = dict(flush_interval=0.01, max_pending=1000, state_ttl=60.0)
+    return TapAggregator(**{**options, **kwargs})
+
+
+@pytest.fixture
+def slow_apply(monkeypatch):
+    """Makes apply_taps wait 0.2 s; ``started`` is set when a write is in flight."""
+    apply_taps = ledger.apply_taps
+    started = asyncio.Event()
+
+    async def slow(*args):
+        started.set()
+        await asyncio.sleep(0.2)
+        return await apply_taps(*args)
+
+    monkeypatch.setattr(ledger, "apply_taps", slow)
+    return started
+
+
+async def test_without_task_taps_are_written_inline(fake_supabase):
+    fake_supabase.add_user(7001)
+    aggregator = make_aggregator()
+
+    for _ in range(3):
+        await aggregator.tap(7001)
+
+    assert fake_supabase._points_by_user[7001]["hearts"] == 3
+    assert fake_supabase.calls["RPC apply_taps"] == 3
+    assert not aggregator.pending_hearts()
+
+
+async def test_loop_writes_taps_in_one_call(fake_supabase):
+    fake_supabase.add_user(7002)
+    aggregator = make_aggregator(flush_interval=60.0)
+    await aggregator.start()
+    try:
+        for _ in range(3):
+            await aggregator.tap(7002)
+        assert aggregator.pending_hearts() == {7002: 3}
+        assert await aggregator.flush() == 1
+    finally:
+        await aggregator.stop()
+
+    assert fake_supabase._points_by_user[7002]["hearts"] == 3
+    assert fake_supabase.calls["RPC apply_taps"] == 1
+
+
+async def test_stop_during_flush_keeps_taps(fake_supabase, slow_apply):
+    fake_supabase.add_user(7003)
+    aggregator = make_aggregator()
+    await aggregator.start()
+    for _ in range(3):
+        await aggregator.tap(7003)
+
+    await asyncio.wait_for(slow_apply.wait(), 1.0)
+    await aggregator.stop()
+
+    assert aggregator.cached(7003).hearts == 3
+    assert fake_supabase._points_by_user[7003]["hearts"] == 3
+    assert not aggregator.pending_hearts()
+
+
+async def test_cancelled_flush_puts_taps_back(fake_supabase, slow_apply):
+    fake_supabase.add_user(7004)
+    aggregator = make_aggregator(flush_interval=60.0)
+    await aggregator.start()
+    try:
+        for _ in range(3):
+            await aggregator.tap(7004)
+
+        flush = asyncio.create_task(aggregator.flush())
+        await asyncio.wait_for(slow_apply.wait(), 1.0)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        assert aggregator.cached(7004).pending == 3
+        assert aggregator.pending_hearts() == {7004: 3}
+    finally:
+        await aggregator.stop()
+
+    assert fake_supabase._points_by_user[7004]["hearts"] == 3
+
+
+async def test_failed_write_is_retried(fake_supabase, monkeypatch):
+    fake_supabase.add_user(7005)
+    aggregator = make_aggregator(flush_interval=60.0)
+    apply_taps = ledger.apply_taps
+    calls = 0
+
+    async def flaky(*args):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("connection reset")
+        return await apply_taps(*args)
+
+    monkeypatch.setattr(ledger, "apply_taps", flaky)
+    await aggregator.start()
+    try:
+        await aggregator.tap(7005)
+        await aggregator.tap(7005)
+        assert await aggregator.flush() == 0
+        assert aggregator.pending_hearts() == {7005: 2}
+    finally:
+        await aggregator.stop()
+
+    assert fake_supabase._points_by_user[7005]["hearts"] == 2
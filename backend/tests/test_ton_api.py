@@ -0,0 +1,122 @@
+import httpx
+import pytest
+
+from app.utils import ton_api
+from app.utils.ton_api import CircuitBreaker, TonApiError, TonClient
+from benchmarks.fake_toncenter import FakeToncenter
+
+pytestmark = pytest.mark.anyio
+
+ADDRESS = "UQBvW8Z5huBkMJYdnfAEM5JqTNkuWX3diqYENkWsIL0XggGG"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ton_api.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def fake():
+    return FakeToncenter()
+
+
+@pytest.fixture
+async def client(fake, clock):
+    client = TonClient("http://toncenter/api/v2", "", timeout=1.0, cache_ttl=30.0, concurrency=4,
+                       breaker=CircuitBreaker(threshold=3, cooldown=10.0),
+                       transport=httpx.ASGITransport(app=fake.app))
+    yield client
+    await client.aclose()
+
+
+async def fail(client: TonClient, times: int) -> None:
+    for i in range(times):
+        with pytest.raises(TonApiError):
+            await client.get_balance(f"{ADDRESS}{i}")
+
+
+async def test_balance_is_cached_for_ttl(client, fake, clock):
+    assert await client.get_balance(ADDRESS) == FakeToncenter.balance_of(ADDRESS)
+    clock.now += 29
+    assert await client.get_balance(ADDRESS) == FakeToncenter.balance_of(ADDRESS)
+    assert fake.calls["getAddressBalance"] == 1
+
+    clock.now += 2
+    await client.get_balance(ADDRESS)
+    assert fake.calls["getAddressBalance"] == 2
+
+
+async def test_get_balances_deduplicates_and_maps_failures_to_none(client, fake):
+    balances = await client.get_balances([ADDRESS, ADDRESS, ""])
+    assert balances == {ADDRESS: FakeToncenter.balance_of(ADDRESS), "": None}
+    assert fake.calls["getAddressBalance"] == 2
+
+
+async def test_breaker_opens_after_threshold(client, fake):
+    fake.failure_rate = 1.0
+    await fail(client, 3)
+    assert fake.calls["getAddressBalance"] == 3
+
+    fake.failure_rate = 0.0
+    with pytest.raises(TonApiError, match="circuit is open"):
+        await client.get_balance(ADDRESS)
+    assert fake.calls["getAddressBalance"] == 3
+
+
+async def test_breaker_recovers_after_cooldown(client, fake, clock):
+    fake.failure_rate = 1.0
+    await fail(client, 3)
+    fake.failure_rate = 0.0
+    clock.now += 10
+
+    assert await client.get_balance(ADDRESS) == FakeToncenter.balance_of(ADDRESS)
+    assert client.breaker.opened_at is None and client.breaker.failures == 0
+    await client.get_balance(f"{ADDRESS}x")
+    assert fake.calls["getAddressBalance"] == 5
+
+
+async def test_failed_probe_opens_breaker_again(client, fake, clock):
+    fake.failure_rate = 1.0
+    await fail(client, 3)
+    clock.now += 10
+
+    await fail(client, 1)
+    assert fake.calls["getAddressBalance"] == 4
+    fake.failure_rate = 0.0
+    with pytest.raises(TonApiError, match="circuit is open"):
+        await client.get_balance(ADDRESS)
+    clock.now += 10
+    assert await client.get_balance(ADDRESS) == FakeToncenter.balance_of(ADDRESS)
+
+
+async def test_half_open_lets_exactly_one_probe_through(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+async def test_client_errors_do_not_trip_breaker(client, fake):
+    for _ in range(5):
+        with pytest.raises(TonApiError, match="416"):
+            await client.get_balance("")
+    assert client.breaker.failures == 0 and client.breaker.opened_at is None
+    assert await client.get_balance(ADDRESS) == FakeToncenter.balance_of(ADDRESS)
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.webhook import WebhookBatchTooLarge, WebhookProcessor, parse_events, webhook_processor
+from app.utils.cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def processor(clock):
+    processor = WebhookProcessor(max_events=5, dedup_size=100, dedup_window=600.0)
+    processor.seen = TTLCache(100, 600.0, clock)
+    return processor
+
+
+def test_parse_events_accepts_object_array_and_ndjson():
+    assert parse_events(b'{"user_id": 1}') == [{"user_id": 1}]
+    assert parse_events(b'[{"user_id": 1}, {"user_id": 2}]') == [{"user_id": 1}, {"user_id": 2}]
+    assert parse_events(b'{"user_id": 1}\n\n{"user_id": 2}\n') == [{"user_id": 1}, {"user_id": 2}]
+    assert parse_events(b"  ") == []
+    with pytest.raises(ValueError):
+        parse_events(b'[{"user_id": 1}')
+
+
+@pytest.mark.anyio
+async def test_batch_reads_rows_once_and_creates_missing(fake_supabase, processor):
+    fake_supabase.add_user(8001, points=5, tickets=2)
+    fake_supabase._insert("users", {"user_id": 8002, "username": "new"})
+
+    results = await processor.process([{"event_id": "a", "user_id": 8001}, {"event_id": "b", "user_id": 8002},
+                                       {"event_id": "c", "user_id": 8003}, {"event_id": "d"}, "junk"])
+
+    assert [r["status"] for r in results] == ["processed", "processed", "error", "error", "error"]
+    assert results[0] == {"status": "processed", "points": 5, "tickets": 2, "event_id": "a"}
+    assert results[2]["message"] == "Unknown user" and results[3]["message"] == "Missing user_id"
+    assert 8002 in fake_supabase._points_by_user
+    assert fake_supabase.calls["GET offchain_points"] == 1
+
+
+@pytest.mark.anyio
+async def test_duplicate_inside_window_repeats_first_result(fake_supabase, processor, clock):
+    fake_supabase.add_user(8011, points=5)
+    first = await processor.process([{"event_id": "e1", "user_id": 8011}])
+    fake_supabase._points_by_user[8011]["points"] = 50
+
+    clock.now += 599
+    again = await processor.process([{"event_id": "e1", "user_id": 8011}, {"id": "e2", "user_id": 8011},
+                                     {"id": "e2", "user_id": 8011}])
+
+    assert again[0] == {**first[0], "status": "duplicate"}
+    assert [r["status"] for r in again[1:]] == ["processed", "duplicate"]
+    assert again[2]["event_id"] == "e2"
+    assert processor.stats()["duplicates"] == 2
+
+
+@pytest.mark.anyio
+async def test_duplicate_outside_window_is_processed_again(fake_supabase, processor, clock):
+    fake_supabase.add_user(8021, points=5)
+    await processor.process([{"event_id": "e1", "user_id": 8021}])
+
+    clock.now += 601
+    again = await processor.process([{"event_id": "e1", "user_id": 8021}])
+
+    assert again[0]["status"] == "processed"
+    assert processor.duplicates == 0
+
+
+@pytest.mark.anyio
+async def test_failed_event_is_not_remembered(fake_supabase, processor):
+    assert (await processor.process([{"event_id": "e1", "user_id": 8031}]))[0]["status"] == "error"
+    fake_supabase.add_user(8031)
+
+    assert (await processor.process([{"event_id": "e1", "user_id": 8031}]))[0]["status"] == "processed"
+
+
+@pytest.mark.anyio
+async def test_oversized_batch_is_rejected(fake_supabase, processor):
+    with pytest.raises(WebhookBatchTooLarge):
+        await processor.process([{"user_id": 8041}] * 6)
+    assert not fake_supabase.calls
+
+
+def test_route_answers_413_for_oversized_batch(fake_supabase, monkeypatch):
+    monkeypatch.setattr(webhook_processor, "max_events", 2)
+    client = TestClient(app)
+
+    response = client.post("/webhook", content=json.dumps([{"user_id": 8051}] * 3))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "At most 2 events per request"}
+    assert client.post("/webhook", content=b"[{").status_code == 400
+
+
+def test_route_keeps_single_event_format(fake_supabase):
+    fake_supabase.add_user(8061, points=7)
+    client = TestClient(app)
+
+    single = client.post("/webhook", json={"user_id": 8061})
+    assert single.json() == {"status": "processed", "points": 7, "tickets": 0}
+    batch = client.post("/webhook", content=b'{"user_id": 8061}\n{"user_id": 8061}')
+    assert [r["status"] for r in batch.json()["results"]] == ["processed", "processed"]